@@ -1,13 +1,47 @@
-from flask import Flask, render_template, request, jsonify, session, redirect
+from flask import Flask, Response, render_template, request, jsonify, session, redirect, send_file
 from pymongo import MongoClient
 from dotenv import load_dotenv
 import os
+import logging
 import bcrypt
-import uuid
 from bson import ObjectId
 from werkzeug.utils import secure_filename
 from datetime import datetime, timedelta
 
+from backend.serializers import (
+    donor_stats, donor_feed_row, donation_history_row,
+    available_medicine_row, receiver_stats, receiver_request_row, EMPTY_RECEIVER_STATS,
+    admin_stat_queries, admin_stats, EMPTY_ADMIN_STATS,
+    admin_donation_row, admin_donation_counts, admin_request_row, admin_request_counts,
+    admin_activity_row, iso,
+)
+from backend.concurrency import count_all, run_parallel
+from backend.events import start_activity_watcher, event_stream, broker, REPLAY_LIMIT, SSE_RETRY_SECONDS
+from backend.invalidation import ensure_invalidation_indexes, start_invalidation_bus
+from backend.images import rendition_urls
+from backend.blobs import BlobStore, is_blob_path, blob_cache_headers, ensure_deletion_indexes
+from backend.reaper import start_reaper
+from backend.prescriptions import build_prescription_preview, ensure_prescription_indexes
+from backend.assets import use_built_templates, send_asset
+from backend.http_cache import CODE_VERSION, versions, conditional, touch_on_write, compress_response
+from backend.json_provider import FastJSONProvider
+from backend.shell_cache import dashboard_shells
+from backend.storage import get_storage
+from backend.telemetry import telemetry, mongo_listener
+from backend.logs import configure_logging, install_request_ids, fields, sampled
+from backend.profiler import install_profiler, profile_window
+from backend.metrics import pool_listener, render_metrics, start_metrics_sampler
+from backend.domain_counters import domain_counters, start_domain_counters
+from backend.health import liveness, readiness, readiness_client
+from backend.slow_queries import (
+    slow_query_listener, ensure_slow_query_collection, start_slow_query_recorder, slow_query_report,
+)
+from backend.uploads import UploadRequest, UploadTooLarge, UPLOAD_LIMITS, check_upload_size, MAX_CONTENT_LENGTH
+from backend.activity import (
+    record_activity, read_feed, parse_since, ensure_activity_indexes, backfill_activity,
+    donation_activity_data, request_activity_data,
+)
+
 
 
 # ---------------------------------------------------------------------
@@ -15,9 +49,16 @@ from datetime import datetime, timedelta
 # ---------------------------------------------------------------------
 load_dotenv()
 
+# JSON lines on stdout through a background writer (see backend/logs.py)
+configure_logging()
+log = logging.getLogger("app")
+
 app = Flask(__name__)
 app.secret_key ="cmrds_secret_key_2026"
 
+# jsonify() encodes ObjectId/datetime itself (orjson when installed)
+app.json = FastJSONProvider(app)
+
 UPLOAD_FOLDER = "static/medicine_images"
 # PROFILE_UPLOAD_FOLDER = "static/profile_images"
 
@@ -25,6 +66,14 @@ os.makedirs(UPLOAD_FOLDER, exist_ok=True)
 # os.makedirs(PROFILE_UPLOAD_FOLDER, exist_ok=True)
 
 app.config["UPLOAD_FOLDER"] = UPLOAD_FOLDER
+
+# Inline CSS/JS served as fingerprinted files once built (python -m backend.assets)
+if use_built_templates(app):
+    log.info("Using built templates and static assets")
+
+# Multipart uploads stream to disk with per endpoint size caps
+app.request_class = UploadRequest
+app.config["MAX_CONTENT_LENGTH"] = MAX_CONTENT_LENGTH
 # app.config["PROFILE_UPLOAD_FOLDER"] = PROFILE_UPLOAD_FOLDER
 
 # ---------------------------------------------------------------------
@@ -35,13 +84,23 @@ MONGO_URI = os.getenv("MONGO_URI")
 if not MONGO_URI:
     raise Exception("⚠ ERROR: MONGO_URI is missing in .env file!")
 
+# MONGO_TLS=false for a local mongod (benchmarks, query count checks)
+MONGO_TLS = os.getenv("MONGO_TLS", "true").lower() != "false"
+# pymongo rejects any tls* option, even False, on a connection without TLS
+MONGO_TLS_OPTIONS = {"tls": True, "tlsAllowInvalidCertificates": True} if MONGO_TLS else {"tls": False}
+
 client = MongoClient(
     MONGO_URI,
-    tls=True,
-    tlsAllowInvalidCertificates=True
+    **MONGO_TLS_OPTIONS,
+    # Attributes every command and its duration to the current request,
+    # feeds the connection pool metrics and records slow queries
+    event_listeners=[mongo_listener, pool_listener, slow_query_listener]
 )
 
-db = client["med_system"]
+db = client[os.getenv("MONGO_DB", "med_system")]
+
+# /readyz pings over a client of its own with short timeouts (backend/health.py)
+readiness_mongo = readiness_client(MONGO_URI, **MONGO_TLS_OPTIONS)
 
 # Collections
 donor_collection = db["donar"]
@@ -49,6 +108,71 @@ receiver_collection = db["receiver"]
 admin_collection = db["admin"]
 donated_medicine = db["donated_medicine"]  
 
+# Uploads, stored once per distinct content (see backend/blobs.py) in
+# local static folders or an S3 bucket (see backend/storage.py)
+storage = get_storage()
+medicine_store = BlobStore(db, "medicine_images", storage)
+profile_store = BlobStore(db, "profile_images", storage)
+prescription_store = BlobStore(db, "prescriptions", storage)
+
+
+@app.context_processor
+def upload_urls():
+    # code_version busts browser caches on deploys: the dashboard shells
+    # are rendered once per process (backend/shell_cache.py), so the
+    # value has to be fixed for the life of the code
+    return {"profile_image_url": profile_store.url_prefix(), "code_version": CODE_VERSION}
+
+
+# Request ids for log records, then per route latency, status, size and
+# Mongo command counts. Registered first so their after_request hooks
+# run last and see the final response.
+install_request_ids(app)
+telemetry.install(app)
+
+
+@app.before_request
+def limit_uploads():
+    """Enforce upload size caps before the view runs"""
+    check_upload_size(request)
+
+
+@app.before_request
+def private_uploads():
+    """Prescriptions are only served through /prescriptions/<name>"""
+    if request.path.startswith("/static/prescriptions/"):
+        return jsonify({"success": False, "message": "Not found"}), 404
+
+
+@app.errorhandler(413)
+def upload_too_large(e):
+    return jsonify({"success": False, "message": UploadTooLarge.description}), 413
+
+
+@app.route("/assets/<path:filename>")
+def asset(filename):
+    return send_asset(filename)
+
+
+# Conditional GETs must see this process' writes, and every response
+# is compressed when worth it
+app.after_request(touch_on_write)
+app.after_request(compress_response)
+
+
+@app.after_request
+def cache_blob_urls(response):
+    """Content addressed photos never change, so let browsers keep them;
+    prescriptions are never cached"""
+    if response.status_code in (200, 304) and request.path.startswith("/static/") and is_blob_path(request.path):
+        blob_cache_headers(response, request.path)
+    return response
+
+
+# Admin only ?__profile=1 sampling profiles. Registered last so its
+# after_request runs first and the other hooks see the profile response.
+install_profiler(app)
+
 # ---------------------------------------------------------------------
 # HOME
 # ---------------------------------------------------------------------
@@ -107,14 +231,22 @@ def register_user():
     hashed_pw = bcrypt.hashpw(password.encode("utf-8"), bcrypt.gensalt())
 
     # Insert user
-    collection.insert_one({
+    now = datetime.utcnow()
+    result = collection.insert_one({
         "username": username,
         "email": email,
         "password": hashed_pw,
         "user_type": user_type,
-        
+        "created_at": now,
+        "updated_at": now
     })
 
+    record_activity(
+        db, "registration",
+        {"email": email, "username": username, "user_type": user_type},
+        subject_id=result.inserted_id, created_at=now
+    )
+
     return jsonify({
         "success": True,
         "message": f"{user_type.capitalize()} registered successfully!"
@@ -183,6 +315,10 @@ def login_user():
 # ---------------------------------------------------------------------
 # DASHBOARDS
 # ---------------------------------------------------------------------
+# Only what the dashboard templates show
+DASHBOARD_USER_FIELDS = {"username": 1, "email": 1, "user_type": 1, "profile_image": 1, "profile_image_renditions": 1}
+
+
 @app.route("/donor/dashboard")
 def donor_dashboard():
 
@@ -191,17 +327,17 @@ def donor_dashboard():
 
     user_id = session["user"].get("_id")
     
-    user = donor_collection.find_one({"_id": ObjectId(user_id)})
+    user = donor_collection.find_one({"_id": ObjectId(user_id)}, DASHBOARD_USER_FIELDS)
     
     # Convert ObjectId to string for JSON serialization
     if user and "_id" in user:
         user["_id"] = str(user["_id"])
     
     # IMPORTANT: Ensure profile_image is in the user object
-    if "profile_image" not in user:
-        user["profile_image"] = None
+    user["profile_image"] = profile_thumb(user)
     
-    return render_template("donor_dashboard.html", user=user)
+    # Cached page shell with this user's values filled in
+    return dashboard_shells.render("donor_dashboard.html", user, "donor")
 
 
 
@@ -263,14 +399,18 @@ def submit_donation():
     # Image Upload Handling
     # -----------------------------
     file = request.files.get("image")
+    # Or the name of an image already uploaded straight to storage
+    image_name = request.form.get("image_name")
     filename = None
 
-    if file and file.filename != "":
-        ext = file.filename.rsplit(".", 1)[-1]
-        filename = f"{uuid.uuid4()}.{ext}"
-
-        filepath = os.path.join(app.config["UPLOAD_FOLDER"], filename)
-        file.save(filepath)
+    if (file and file.filename != "") or image_name:
+        image_blob = stored_upload(medicine_store, file, image_name)
+        if image_blob is None:
+            return jsonify({
+                "success": False,
+                "message": "Uploaded image not found"
+            }), 400
+        filename = image_blob["name"]
 
     # -----------------------------
     # Store in MongoDB
@@ -287,10 +427,29 @@ def submit_donation():
         "description": description,
         "image": filename,
         "status": "available",
-        "created_at": datetime.utcnow()
+        "created_at": datetime.utcnow(),
+        "updated_at": datetime.utcnow()
     }
 
-    donated_medicine.insert_one(donation_data)
+    result = donated_medicine.insert_one(donation_data)
+
+    # Thumb/card/full WebP renditions are built in the background
+    if filename:
+        donation_id = result.inserted_id
+        medicine_store.build_renditions(
+            image_blob,
+            lambda renditions: donated_medicine.update_one(
+                {"_id": donation_id},
+                {"$set": {"image_renditions": renditions, "updated_at": datetime.utcnow()}}
+            )
+        )
+
+    record_activity(
+        db, "donation", user,
+        subject_id=result.inserted_id,
+        data=donation_activity_data(donation_data),
+        created_at=donation_data["created_at"]
+    )
 
     return jsonify({
         "success": True,
@@ -300,6 +459,7 @@ def submit_donation():
 # GET DONOR DASHBOARD STATS
 # ---------------------------------------------------------------------
 @app.route("/get_donor_stats", methods=["GET"])
+@conditional("donated_medicine")
 def get_donor_stats():
     """Get donor dashboard statistics"""
     if not session.get("user") or session["user"]["user_type"] != "donor":
@@ -309,35 +469,11 @@ def get_donor_stats():
     email = user["email"]
     
     # Get all donations by this donor
-    all_donations = list(donated_medicine.find({"email": email}))
-    
-    # Calculate statistics
-    total_donated = len(all_donations)
-    
-    # Successful donations (status: completed, collected, or delivered)
-    successful = len([d for d in all_donations if d.get("status") in ["completed", "collected", "delivered"]])
-    
-    # Pending donations (status: available, pending, or approved)
-    pending = len([d for d in all_donations if d.get("status") in ["available", "pending", "approved"]])
-    
-    # Lives impacted - calculate based on medicine quantity for successful donations
-    lives_impacted = sum([d.get("quantity", 0) for d in all_donations if d.get("status") in ["completed", "collected", "delivered"]])
-    
-    # If no donations yet, set default values
-    if total_donated == 0:
-        total_donated = 0
-        successful = 0
-        pending = 0
-        lives_impacted = 0
+    all_donations = list(donated_medicine.find({"email": email}, {"status": 1, "quantity": 1}))
     
     return jsonify({
         "success": True,
-        "stats": {
-            "total_donated": total_donated,
-            "successful": successful,
-            "pending": pending,
-            "lives_impacted": lives_impacted
-        }
+        "stats": donor_stats(all_donations)
     })
     
 # GET RECENT ACTIVITY
@@ -350,58 +486,19 @@ def get_recent_activity():
     
     user = session["user"]
     email = user["email"]
+    since = parse_since(request.args.get("since"))
     
-    # Get last 10 donations sorted by created_at (newest first)
-    recent_donations = donated_medicine.find(
-        {"email": email}
-    ).sort("created_at", -1).limit(10)
-    
-    activities = []
-    
-    for donation in recent_donations:
-        medicine_name = donation.get("medicineName", "Medicine")
-        quantity = donation.get("quantity", 0)
-        expiry_date = donation.get("expiryDate", "N/A")
-        status = donation.get("status", "available")
-        created_at = donation.get("created_at")
-        
-        # Handle case when created_at is None
-        if not created_at:
-            created_at = datetime.utcnow()
-        
-        # Calculate time ago
-        time_diff = datetime.utcnow() - created_at
-        
-        if time_diff < timedelta(minutes=1):
-            time_ago = "Just now"
-        elif time_diff < timedelta(hours=1):
-            minutes = int(time_diff.total_seconds() / 60)
-            time_ago = f"{minutes} minute{'s' if minutes > 1 else ''} ago"
-        elif time_diff < timedelta(days=1):
-            hours = int(time_diff.total_seconds() / 3600)
-            time_ago = f"{hours} hour{'s' if hours > 1 else ''} ago"
-        elif time_diff < timedelta(days=7):
-            days = time_diff.days
-            time_ago = f"{days} day{'s' if days > 1 else ''} ago"
-        elif time_diff < timedelta(days=30):
-            weeks = time_diff.days // 7
-            time_ago = f"{weeks} week{'s' if weeks > 1 else ''} ago"
-        else:
-            time_ago = created_at.strftime("%b %d, %Y")
-        
-        # Simple activity object - just the essential data
-        activities.append({
-            "id": str(donation.get("_id")),
-            "medicine_name": medicine_name,
-            "quantity": quantity,
-            "expiry_date": expiry_date,
-            "status": status,
-            "time_ago": time_ago
-        })
+    # Last 10 donations of this donor from the activity feed (newest first),
+    # or only the ones newer than ?since= when polling incrementally
+    recent_donations = read_feed(db, 10, since=since, actor_email=email, activity_type="donation")
+    
+    now = datetime.utcnow()
+    activities = [donor_feed_row(activity, now) for activity in recent_donations]
     
     return jsonify({
         "success": True,
-        "activities": activities
+        "activities": activities,
+        "latest": iso(recent_donations[0]["created_at"]) if recent_donations else iso(since)
     })
     
     
@@ -409,6 +506,7 @@ def get_recent_activity():
 # GET ALL DONATIONS FOR DONOR
 # ---------------------------------------------------------------------
 @app.route("/get_all_donations", methods=["GET"])
+@conditional("donated_medicine", ttl=60)
 def get_all_donations():
     """Get all donations for the donor (for history page)"""
     if not session.get("user") or session["user"]["user_type"] != "donor":
@@ -422,45 +520,8 @@ def get_all_donations():
         {"email": email}
     ).sort("created_at", -1)
     
-    donations = []
-    
-    for donation in all_donations:
-        medicine_name = donation.get("medicineName", "Medicine")
-        quantity = donation.get("quantity", 0)
-        expiry_date = donation.get("expiryDate", "N/A")
-        status = donation.get("status", "available")
-        created_at = donation.get("created_at", datetime.utcnow())
-        
-        # Calculate time ago
-        time_diff = datetime.utcnow() - created_at
-        if time_diff < timedelta(minutes=1):
-            time_ago = "Just now"
-        elif time_diff < timedelta(hours=1):
-            minutes = int(time_diff.total_seconds() / 60)
-            time_ago = f"{minutes} minute{'s' if minutes > 1 else ''} ago"
-        elif time_diff < timedelta(days=1):
-            hours = int(time_diff.total_seconds() / 3600)
-            time_ago = f"{hours} hour{'s' if hours > 1 else ''} ago"
-        elif time_diff < timedelta(days=7):
-            days = time_diff.days
-            time_ago = f"{days} day{'s' if days > 1 else ''} ago"
-        else:
-            time_ago = created_at.strftime("%b %d, %Y")
-        
-        donations.append({
-            "id": str(donation.get("_id")),
-            "medicine_name": medicine_name,
-            "manufacturer": donation.get("manufacturer", ""),
-            "quantity": quantity,
-            "expiry_date": expiry_date,
-            "category": donation.get("category", ""),
-            "condition": donation.get("condition", ""),
-            "description": donation.get("description", ""),
-            "status": status,
-            "image": donation.get("image", ""),
-            "time_ago": time_ago,
-            "created_at": created_at.isoformat() if created_at else None
-        })
+    now = datetime.utcnow()
+    donations = [donation_history_row(donation, now) for donation in all_donations]
     
     return jsonify({
         "success": True,
@@ -472,10 +533,130 @@ PROFILE_FOLDER = "static/profile_images"
 os.makedirs(PROFILE_FOLDER, exist_ok=True)
 
 ALLOWED_EXTENSIONS = {"png", "jpg", "jpeg", "gif"}
+PRESCRIPTION_EXTENSIONS = {"png", "jpg", "jpeg", "pdf"}
 
 def allowed_file(filename):
     return "." in filename and filename.rsplit(".", 1)[1].lower() in ALLOWED_EXTENSIONS
 
+
+def stored_upload(store, file, uploaded_name):
+    """Blob for a file sent with the form, or for one the browser already
+    uploaded straight to storage (see /uploads/presign) and names instead"""
+    if file and file.filename != "":
+        return store.put(file, file.filename.rsplit(".", 1)[-1])
+    return store.adopt(uploaded_name)
+
+
+def build_profile_renditions(collection, user_id, blob):
+    """WebP renditions of a new profile image, stored on the user once ready"""
+    profile_store.build_renditions(
+        blob,
+        lambda renditions: collection.update_one(
+            # Skip if the image was replaced again in the meantime
+            {"_id": ObjectId(user_id), "profile_image": blob["name"]},
+            {"$set": {"profile_image_renditions": renditions, "updated_at": datetime.utcnow()}}
+        )
+    )
+
+
+def profile_thumb(user):
+    """Filename to show as the avatar: the thumb rendition when available"""
+    renditions = user.get("profile_image_renditions") or {}
+    return renditions.get("thumb", user.get("profile_image"))
+
+
+# ---------------------------------------------------------------------
+# DIRECT UPLOADS
+# ---------------------------------------------------------------------
+UPLOAD_KINDS = {
+    # kind: (store, endpoint whose size cap applies, allowed extensions)
+    "medicine_image": (medicine_store, "submit_donation", ALLOWED_EXTENSIONS),
+    "profile_image": (profile_store, "upload_profile", ALLOWED_EXTENSIONS),
+    "prescription": (prescription_store, "request_medicine", PRESCRIPTION_EXTENSIONS),
+}
+
+
+@app.route("/uploads/presign", methods=["POST"])
+def presign_upload():
+    """Let the browser upload a file straight to storage.
+
+    The client sends the file's SHA-256, size and name, PUTs the file to
+    the returned upload URL (skipped when it already exists) and then
+    submits the form with the returned name instead of the file. When
+    upload is null and exists is false, post the file with the form.
+    """
+    if "user" not in session:
+        return jsonify({"success": False, "message": "Not logged in"}), 401
+
+    data = request.get_json(silent=True) or {}
+
+    kind = UPLOAD_KINDS.get(data.get("kind"))
+    if not kind:
+        return jsonify({"success": False, "message": "Invalid upload kind"}), 400
+    store, endpoint, extensions = kind
+
+    filename = data.get("filename") or ""
+    ext = filename.rsplit(".", 1)[1].lower() if "." in filename else ""
+    if ext not in extensions:
+        return jsonify({"success": False, "message": "Invalid file type"}), 400
+
+    try:
+        size = int(data.get("size"))
+    except (TypeError, ValueError):
+        return jsonify({"success": False, "message": "Invalid file size"}), 400
+    if size <= 0 or size > UPLOAD_LIMITS[endpoint]:
+        return jsonify({"success": False, "message": UploadTooLarge.description}), 413
+
+    upload = store.presign(
+        data.get("sha256") or "",
+        ext,
+        size,
+        data.get("content_type") or "application/octet-stream"
+    )
+    if upload is None:
+        return jsonify({"success": False, "message": "Invalid file hash"}), 400
+
+    return jsonify({"success": True, **upload})
+
+
+# ---------------------------------------------------------------------
+# PRESCRIPTION FILES
+# ---------------------------------------------------------------------
+@app.route("/prescriptions/<name>")
+def prescription_file(name):
+    """A prescription or its preview, for admins and the receiver who sent it"""
+    
+    if not session.get("user") or session["user"]["user_type"] not in ("admin", "receiver"):
+        return jsonify({"success": False, "message": "Unauthorized"}), 403
+    
+    # Content addressed, or a prescription_<uuid>.<ext> from before the blob store
+    legacy = not is_blob_path(name)
+    if legacy and (not name or secure_filename(name) != name):
+        return jsonify({"success": False, "message": "Not found"}), 404
+    
+    if session["user"]["user_type"] == "receiver" or legacy:
+        query = {"$or": [{"prescription": name}, {"prescription_renditions.preview": name}]}
+        if session["user"]["user_type"] == "receiver":
+            query["receiver_email"] = session["user"]["email"]
+        own_request = db["requests_medicine"].find_one(query, {"_id": 1})
+        if not own_request:
+            return jsonify({"success": False, "message": "Not found"}), 404
+    
+    key = prescription_store.key(name)
+    url = storage.presigned_download(key)
+    if url:
+        # S3: a GET URL that expires in minutes, never a public one
+        response = redirect(url)
+    else:
+        path = storage.local_path(key)
+        if not os.path.exists(path):
+            return jsonify({"success": False, "message": "Not found"}), 404
+        response = send_file(os.path.abspath(path), conditional=False)
+    
+    response.headers["Cache-Control"] = "private, no-store"
+    return response
+
+
 @app.route("/upload_profile", methods=["POST"])
 def upload_profile():
 
@@ -483,11 +664,13 @@ def upload_profile():
         return jsonify({"success": False, "message": "Not logged in"}), 401
 
     file = request.files.get("profileImage")
+    # Or the name of an image already uploaded straight to storage
+    uploaded_name = request.form.get("profileImageName")
 
-    if not file or file.filename == "":
+    if (not file or file.filename == "") and not uploaded_name:
         return jsonify({"success": False, "message": "No file selected"}), 400
 
-    if not allowed_file(file.filename):
+    if not allowed_file(file.filename if file and file.filename else uploaded_name):
         return jsonify({"success": False, "message": "Invalid image type. Allowed: png, jpg, jpeg, gif"}), 400
 
     try:
@@ -498,44 +681,43 @@ def upload_profile():
         old_user = donor_collection.find_one({"_id": ObjectId(user_id)})
         old_image = old_user.get("profile_image") if old_user else None
         
-        # Generate unique filename
-        ext = file.filename.rsplit(".", 1)[1].lower()
-        unique_name = f"{user_id}_{uuid.uuid4().hex}.{ext}"
-
-        # Save new file
-        path = os.path.join(PROFILE_FOLDER, unique_name)
-        file.save(path)
+        # Store the file under its content hash
+        blob = stored_upload(profile_store, file, uploaded_name)
+        if blob is None:
+            return jsonify({"success": False, "message": "Uploaded image not found"}), 400
+        unique_name = blob["name"]
 
         # Update database with new image
         donor_collection.update_one(
             {"_id": ObjectId(user_id)},
-            {"$set": {"profile_image": unique_name}}
+            {
+                "$set": {"profile_image": unique_name, "updated_at": datetime.utcnow()},
+                "$unset": {"profile_image_renditions": ""}
+            }
         )
 
-        # Delete old image file if it exists and is not the default
+        # Thumb/card/full WebP renditions are built in the background
+        build_profile_renditions(donor_collection, user_id, blob)
+
+        # Drop the reference to the old image, unless it is the default
         if old_image and old_image != "default.png":
-            old_path = os.path.join(PROFILE_FOLDER, old_image)
-            if os.path.exists(old_path):
-                try:
-                    os.remove(old_path)
-                    print(f"✅ Deleted old profile image: {old_image}")
-                except Exception as e:
-                    print(f"⚠ Could not delete old image: {e}")
+            if profile_store.release(old_image, old_user.get("profile_image_renditions")):
+                log.info("Queued old profile image for deletion", extra=sampled(role="donor", image=old_image))
 
         # Update session with new profile image
         session["user"]["profile_image"] = unique_name
         session.modified = True
 
-        print(f"✅ Profile image uploaded successfully: {unique_name}")
+        log.info("Profile image uploaded", extra=sampled(role="donor", image=unique_name))
 
         return jsonify({
             "success": True, 
             "filename": unique_name,
-            "filepath": f"/static/profile_images/{unique_name}"
+            "filepath": profile_store.url(unique_name)
         })
         
     except Exception as e:
-        print(f"❌ Error uploading profile image: {str(e)}")
+        log.exception("Error uploading profile image")
         return jsonify({"success": False, "message": "Server error during upload"}), 500
 
 
@@ -554,17 +736,16 @@ def delete_profile_image():
         user = donor_collection.find_one({"_id": ObjectId(user_id)})
         old_image = user.get("profile_image") if user else None
         
-        # Delete the image file if it exists and is not default
+        # Drop the reference to the image; the reaper removes the file
+        # once the last reference is gone
         if old_image and old_image != "default.png":
-            old_path = os.path.join(PROFILE_FOLDER, old_image)
-            if os.path.exists(old_path):
-                os.remove(old_path)
-                print(f"✅ Deleted profile image: {old_image}")
+            if profile_store.release(old_image, user.get("profile_image_renditions")):
+                log.info("Queued profile image for deletion", extra=sampled(role="donor", image=old_image))
         
         # Update database - remove profile_image field
         donor_collection.update_one(
             {"_id": ObjectId(user_id)},
-            {"$unset": {"profile_image": ""}}
+            {"$unset": {"profile_image": "", "profile_image_renditions": ""}, "$set": {"updated_at": datetime.utcnow()}}
         )
         
         # Update session
@@ -578,7 +759,7 @@ def delete_profile_image():
         })
         
     except Exception as e:
-        print(f"❌ Error deleting profile image: {str(e)}")
+        log.exception("Error deleting profile image")
         return jsonify({"success": False, "message": "Server error during deletion"}), 500
 
 
@@ -593,17 +774,17 @@ def receiver_dashboard():
     user_id = session["user"].get("_id")
     
     # Get fresh user data from database
-    user = receiver_collection.find_one({"_id": ObjectId(user_id)})
+    user = receiver_collection.find_one({"_id": ObjectId(user_id)}, DASHBOARD_USER_FIELDS)
     
     # Convert ObjectId to string for JSON serialization
     if user and "_id" in user:
         user["_id"] = str(user["_id"])
     
-    # Ensure profile_image is in the user object
-    if "profile_image" not in user:
-        user["profile_image"] = None
+    # Ensure profile_image is in the user object (thumb rendition if ready)
+    user["profile_image"] = profile_thumb(user)
     
-    return render_template("receiver_dashboard.html", user=user)
+    # Cached page shell with this user's values filled in
+    return dashboard_shells.render("receiver_dashboard.html", user, "receiver")
 
 
 # ========== RECEIVER DASHBOARD BACKEND ROUTES ==========
@@ -612,6 +793,7 @@ def receiver_dashboard():
 # GET AVAILABLE MEDICINES FOR RECEIVER (FROM DONORS)
 # ---------------------------------------------------------------------
 @app.route("/get_available_medicines", methods=["GET"])
+@conditional("donated_medicine", ttl=60)
 def get_available_medicines():
     """Get all available medicines donated by donors for receivers to browse"""
     
@@ -622,46 +804,8 @@ def get_available_medicines():
         # Get all medicines with status 'available'
         available_medicines = donated_medicine.find({"status": "available"}).sort("created_at", -1)
         
-        medicines = []
-        for medicine in available_medicines:
-            # Calculate days until expiry
-            expiry_date = medicine.get("expiryDate")
-            days_until_expiry = None
-            expiry_status = "safe"
-            
-            if expiry_date:
-                try:
-                    expiry = datetime.strptime(expiry_date, "%Y-%m-%d")
-                    today = datetime.now()
-                    days_until_expiry = (expiry - today).days
-                    
-                    if days_until_expiry < 0:
-                        expiry_status = "expired"
-                    elif days_until_expiry <= 30:
-                        expiry_status = "expiring_soon"
-                    elif days_until_expiry <= 90:
-                        expiry_status = "moderate"
-                    else:
-                        expiry_status = "safe"
-                except:
-                    expiry_status = "unknown"
-            
-            medicines.append({
-                "id": str(medicine.get("_id")),
-                "medicine_name": medicine.get("medicineName", "Unknown"),
-                "manufacturer": medicine.get("manufacturer", "Unknown"),
-                "quantity": medicine.get("quantity", 0),
-                "expiry_date": expiry_date,
-                "days_until_expiry": days_until_expiry,
-                "expiry_status": expiry_status,
-                "category": medicine.get("category", "other"),
-                "condition": medicine.get("condition", "good"),
-                "description": medicine.get("description", ""),
-                "image": medicine.get("image", ""),
-                "donor_username": medicine.get("username", "Anonymous"),
-                "donor_email": medicine.get("email", ""),
-                "created_at": medicine.get("created_at").isoformat() if medicine.get("created_at") else None
-            })
+        today = datetime.now()
+        medicines = [available_medicine_row(medicine, today) for medicine in available_medicines]
         
         return jsonify({
             "success": True,
@@ -669,7 +813,7 @@ def get_available_medicines():
         })
         
     except Exception as e:
-        print(f"❌ Error fetching available medicines: {str(e)}")
+        log.exception("Error fetching available medicines")
         return jsonify({"success": False, "message": "Server error"}), 500
 
 
@@ -715,14 +859,14 @@ def request_medicine():
                 "message": "Invalid quantity"
             }), 400
         
-        # Handle prescription upload
-        PRESCRIPTION_FOLDER = "static/prescriptions"
-        os.makedirs(PRESCRIPTION_FOLDER, exist_ok=True)
-        
-        if prescription_file and prescription_file.filename != "":
+        # Handle prescription upload, sent with the form or already
+        # uploaded straight to storage and referenced by name
+        prescription_name = request.form.get("prescription_name")
+        if (prescription_file and prescription_file.filename != "") or prescription_name:
             # Validate file type
-            allowed_extensions = {"png", "jpg", "jpeg", "pdf"}
-            ext = prescription_file.filename.rsplit(".", 1)[1].lower() if "." in prescription_file.filename else ""
+            allowed_extensions = PRESCRIPTION_EXTENSIONS
+            source_name = prescription_file.filename if prescription_file and prescription_file.filename else prescription_name
+            ext = source_name.rsplit(".", 1)[1].lower() if "." in source_name else ""
             
             if ext not in allowed_extensions:
                 return jsonify({
@@ -730,10 +874,14 @@ def request_medicine():
                     "message": "Invalid file type. Allowed: PNG, JPG, JPEG, PDF"
                 }), 400
             
-            # Generate unique filename
-            prescription_filename = f"prescription_{uuid.uuid4().hex}.{ext}"
-            filepath = os.path.join(PRESCRIPTION_FOLDER, prescription_filename)
-            prescription_file.save(filepath)
+            # Store the file under its content hash
+            prescription_blob = stored_upload(prescription_store, prescription_file, prescription_name)
+            if prescription_blob is None:
+                return jsonify({
+                    "success": False,
+                    "message": "Uploaded prescription not found"
+                }), 400
+            prescription_filename = prescription_blob["name"]
         
         # Get receiver info from session
         receiver = session["user"]
@@ -760,7 +908,18 @@ def request_medicine():
         
         result = requests_medicine.insert_one(request_data)
         
-        print(f"✅ Medicine request submitted successfully. Request ID: {result.inserted_id}")
+        # Preview for the review queue and reuse check, in the background
+        if prescription_filename:
+            build_prescription_preview(prescription_store, requests_medicine, result.inserted_id, prescription_blob)
+        
+        record_activity(
+            db, "request", receiver,
+            subject_id=result.inserted_id,
+            data=request_activity_data(request_data),
+            created_at=request_data["created_at"]
+        )
+        
+        log.info("Medicine request submitted", extra=sampled(medicine_request_id=str(result.inserted_id)))
         
         return jsonify({
             "success": True,
@@ -769,7 +928,7 @@ def request_medicine():
         })
         
     except Exception as e:
-        print(f"❌ Error submitting medicine request: {str(e)}")
+        log.exception("Error submitting medicine request")
         return jsonify({"success": False, "message": "Server error during request submission"}), 500
 
 
@@ -777,6 +936,7 @@ def request_medicine():
 # GET RECEIVER STATISTICS
 # ---------------------------------------------------------------------
 @app.route("/get_receiver_stats", methods=["GET"])
+@conditional("requests_medicine")
 def get_receiver_stats():
     """Get receiver dashboard statistics"""
     
@@ -790,55 +950,18 @@ def get_receiver_stats():
         requests_medicine = db["requests_medicine"]
         
         # Get all requests by this receiver
-        all_requests = list(requests_medicine.find({"receiver_email": email}))
-        
-        # Calculate statistics
-        total_requests = len(all_requests)
-        
-        # Pending requests
-        pending = len([r for r in all_requests if r.get("status") == "pending"])
-        
-        # Approved requests (ready for pickup)
-        approved = len([r for r in all_requests if r.get("status") == "approved"])
-        
-        # Completed requests (medicines received)
-        completed = len([r for r in all_requests if r.get("status") == "completed"])
-        
-        # Cancelled requests
-        cancelled = len([r for r in all_requests if r.get("status") == "cancelled"])
-        
-        # Total medicines received (sum of quantities for completed requests)
-        medicines_received = sum([r.get("quantity", 0) for r in all_requests if r.get("status") == "completed"])
-        
-        # Upcoming pickups (approved requests)
-        upcoming_pickups = approved
+        all_requests = list(requests_medicine.find({"receiver_email": email}, {"status": 1, "quantity": 1}))
         
         return jsonify({
             "success": True,
-            "stats": {
-                "total_requests": total_requests,
-                "pending": pending,
-                "approved": approved,
-                "completed": completed,
-                "cancelled": cancelled,
-                "medicines_received": medicines_received,
-                "upcoming_pickups": upcoming_pickups
-            }
+            "stats": receiver_stats(all_requests)
         })
         
     except Exception as e:
-        print(f"❌ Error fetching receiver stats: {str(e)}")
+        log.exception("Error fetching receiver stats")
         return jsonify({
             "success": True, 
-            "stats": {
-                "total_requests": 0,
-                "pending": 0,
-                "approved": 0,
-                "completed": 0,
-                "cancelled": 0,
-                "medicines_received": 0,
-                "upcoming_pickups": 0
-            }
+            "stats": EMPTY_RECEIVER_STATS
         })
 
 
@@ -846,6 +969,7 @@ def get_receiver_stats():
 # GET RECEIVER REQUESTS HISTORY
 # ---------------------------------------------------------------------
 @app.route("/get_receiver_requests", methods=["GET"])
+@conditional("requests_medicine", ttl=60)
 def get_receiver_requests():
     """Get all medicine requests made by the receiver from requests_medicine collection"""
     
@@ -863,43 +987,8 @@ def get_receiver_requests():
             {"receiver_email": email}
         ).sort("created_at", -1)
         
-        requests = []
-        for req in all_requests:
-            # Calculate time ago
-            created_at = req.get("created_at")
-            time_ago = "Recently"
-            
-            if created_at:
-                time_diff = datetime.utcnow() - created_at
-                if time_diff < timedelta(minutes=1):
-                    time_ago = "Just now"
-                elif time_diff < timedelta(hours=1):
-                    minutes = int(time_diff.total_seconds() / 60)
-                    time_ago = f"{minutes} minute{'s' if minutes > 1 else ''} ago"
-                elif time_diff < timedelta(days=1):
-                    hours = int(time_diff.total_seconds() / 3600)
-                    time_ago = f"{hours} hour{'s' if hours > 1 else ''} ago"
-                elif time_diff < timedelta(days=7):
-                    days = time_diff.days
-                    time_ago = f"{days} day{'s' if days > 1 else ''} ago"
-                else:
-                    time_ago = created_at.strftime("%b %d, %Y")
-            
-            requests.append({
-                "id": str(req.get("_id")),
-                "medicine_name": req.get("medicine_name", "Unknown"),
-                "dosage": req.get("dosage", ""),
-                "quantity": req.get("quantity", 0),
-                "urgency": req.get("urgency", "normal"),
-                "preferred_location": req.get("preferred_location", ""),
-                "status": req.get("status", "pending"),
-                "donor_username": req.get("donor_username", "Pending"),
-                "donor_email": req.get("donor_email"),
-                "prescription": req.get("prescription"),
-                "additional_notes": req.get("additional_notes", ""),
-                "created_at": created_at.isoformat() if created_at else None,
-                "time_ago": time_ago
-            })
+        now = datetime.utcnow()
+        requests = [receiver_request_row(req, now) for req in all_requests]
         
         return jsonify({
             "success": True,
@@ -907,7 +996,7 @@ def get_receiver_requests():
         })
         
     except Exception as e:
-        print(f"❌ Error fetching receiver requests: {str(e)}")
+        log.exception("Error fetching receiver requests")
         return jsonify({"success": False, "message": "Server error"}), 500
 
 
@@ -959,7 +1048,13 @@ def cancel_request():
             }
         )
         
-        print(f"✅ Request cancelled successfully. Request ID: {request_id}")
+        record_activity(
+            db, "request_status", session["user"],
+            subject_id=request_id,
+            data={"medicine_name": medicine_request.get("medicine_name"), "status": "cancelled", "previous_status": "pending"}
+        )
+        
+        log.info("Medicine request cancelled", extra=sampled(medicine_request_id=request_id))
         
         return jsonify({
             "success": True,
@@ -967,7 +1062,7 @@ def cancel_request():
         })
         
     except Exception as e:
-        print(f"❌ Error cancelling request: {str(e)}")
+        log.exception("Error cancelling request")
         return jsonify({"success": False, "message": "Server error"}), 500
 
 
@@ -982,11 +1077,13 @@ def receiver_upload_profile():
         return jsonify({"success": False, "message": "Not logged in"}), 401
 
     file = request.files.get("profileImage")
+    # Or the name of an image already uploaded straight to storage
+    uploaded_name = request.form.get("profileImageName")
 
-    if not file or file.filename == "":
+    if (not file or file.filename == "") and not uploaded_name:
         return jsonify({"success": False, "message": "No file selected"}), 400
 
-    if not allowed_file(file.filename):
+    if not allowed_file(file.filename if file and file.filename else uploaded_name):
         return jsonify({"success": False, "message": "Invalid image type. Allowed: png, jpg, jpeg, gif"}), 400
 
     try:
@@ -996,44 +1093,43 @@ def receiver_upload_profile():
         old_user = receiver_collection.find_one({"_id": ObjectId(user_id)})
         old_image = old_user.get("profile_image") if old_user else None
         
-        # Generate unique filename
-        ext = file.filename.rsplit(".", 1)[1].lower()
-        unique_name = f"{user_id}_{uuid.uuid4().hex}.{ext}"
-
-        # Save new file
-        path = os.path.join(PROFILE_FOLDER, unique_name)
-        file.save(path)
+        # Store the file under its content hash
+        blob = stored_upload(profile_store, file, uploaded_name)
+        if blob is None:
+            return jsonify({"success": False, "message": "Uploaded image not found"}), 400
+        unique_name = blob["name"]
 
         # Update database with new image
         receiver_collection.update_one(
             {"_id": ObjectId(user_id)},
-            {"$set": {"profile_image": unique_name}}
+            {
+                "$set": {"profile_image": unique_name, "updated_at": datetime.utcnow()},
+                "$unset": {"profile_image_renditions": ""}
+            }
         )
 
-        # Delete old image file if it exists
+        # Thumb/card/full WebP renditions are built in the background
+        build_profile_renditions(receiver_collection, user_id, blob)
+
+        # Drop the reference to the old image, unless it is the default
         if old_image and old_image != "default.png":
-            old_path = os.path.join(PROFILE_FOLDER, old_image)
-            if os.path.exists(old_path):
-                try:
-                    os.remove(old_path)
-                    print(f"✅ Deleted old profile image: {old_image}")
-                except Exception as e:
-                    print(f"⚠ Could not delete old image: {e}")
+            if profile_store.release(old_image, old_user.get("profile_image_renditions")):
+                log.info("Queued old profile image for deletion", extra=sampled(role="receiver", image=old_image))
 
         # Update session
         session["user"]["profile_image"] = unique_name
         session.modified = True
 
-        print(f"✅ Receiver profile image uploaded successfully: {unique_name}")
+        log.info("Profile image uploaded", extra=sampled(role="receiver", image=unique_name))
 
         return jsonify({
             "success": True, 
             "filename": unique_name,
-            "filepath": f"/static/profile_images/{unique_name}"
+            "filepath": profile_store.url(unique_name)
         })
         
     except Exception as e:
-        print(f"❌ Error uploading profile image: {str(e)}")
+        log.exception("Error uploading profile image")
         return jsonify({"success": False, "message": "Server error during upload"}), 500
 
 
@@ -1054,17 +1150,16 @@ def receiver_delete_profile_image():
         user = receiver_collection.find_one({"_id": ObjectId(user_id)})
         old_image = user.get("profile_image") if user else None
         
-        # Delete the image file if it exists
+        # Drop the reference to the image; the reaper removes the file
+        # once the last reference is gone
         if old_image and old_image != "default.png":
-            old_path = os.path.join(PROFILE_FOLDER, old_image)
-            if os.path.exists(old_path):
-                os.remove(old_path)
-                print(f"✅ Deleted receiver profile image: {old_image}")
+            if profile_store.release(old_image, user.get("profile_image_renditions")):
+                log.info("Queued profile image for deletion", extra=sampled(role="receiver", image=old_image))
         
         # Update database - remove profile_image field
         receiver_collection.update_one(
             {"_id": ObjectId(user_id)},
-            {"$unset": {"profile_image": ""}}
+            {"$unset": {"profile_image": "", "profile_image_renditions": ""}, "$set": {"updated_at": datetime.utcnow()}}
         )
         
         # Update session
@@ -1078,7 +1173,7 @@ def receiver_delete_profile_image():
         })
         
     except Exception as e:
-        print(f"❌ Error deleting receiver profile image: {str(e)}")
+        log.exception("Error deleting receiver profile image")
         return jsonify({"success": False, "message": "Server error during deletion"}), 500
 
 
@@ -1090,17 +1185,48 @@ try:
     # Create requests_medicine collection if it doesn't exist
     if "requests_medicine" not in db.list_collection_names():
         db.create_collection("requests_medicine")
-        print("✅ Created requests_medicine collection")
+        log.info("Created requests_medicine collection")
     else:
-        print("✅ requests_medicine collection already exists")
+        log.debug("requests_medicine collection already exists")
     
     # Create prescriptions folder if it doesn't exist
     PRESCRIPTION_FOLDER = "static/prescriptions"
     os.makedirs(PRESCRIPTION_FOLDER, exist_ok=True)
-    print("✅ Prescriptions folder ready")
+    log.debug("Prescriptions folder ready")
+    
+    # Activity feed indexes, and a one time backfill from existing data
+    ensure_activity_indexes(db)
+    backfilled = backfill_activity(db)
+    if backfilled:
+        log.info("Backfilled activity entries", extra=fields(count=backfilled))
+    
+    # Push activity to connected dashboards (see /<role>/events)
+    start_activity_watcher(db)
+    
+    # Turn database changes into cache invalidation events
+    ensure_invalidation_indexes(db)
+    start_invalidation_bus(db)
+    
+    # Collection versions behind the ETags of the list endpoints
+    versions.start(db)
+    
+    # Near duplicate lookup for prescription hashes
+    ensure_prescription_indexes(db)
+    
+    # Commands over SLOW_QUERY_MS go to the capped slow_queries collection
+    ensure_slow_query_collection(db)
+    start_slow_query_recorder(db)
+    
+    # Donation/request gauges for /metrics, kept current by the bus
+    start_domain_counters(db)
+    start_metrics_sampler()
+    
+    # Remove replaced/deleted upload files in the background
+    ensure_deletion_indexes(db)
+    start_reaper(db, storage)
     
 except Exception as e:
-    print(f"⚠ Error setting up collections: {e}")
+    log.exception("Error setting up collections")
 
 
 # ========== ADMIN DASHBOARD BACKEND ROUTES ==========
@@ -1118,17 +1244,17 @@ def admin_dashboard():
     user_id = session["user"].get("_id")
     
     # Get fresh user data from database
-    user = admin_collection.find_one({"_id": ObjectId(user_id)})
+    user = admin_collection.find_one({"_id": ObjectId(user_id)}, DASHBOARD_USER_FIELDS)
     
     # Convert ObjectId to string for JSON serialization
     if user and "_id" in user:
         user["_id"] = str(user["_id"])
     
-    # Ensure profile_image is in the user object
-    if "profile_image" not in user:
-        user["profile_image"] = None
+    # Ensure profile_image is in the user object (thumb rendition if ready)
+    user["profile_image"] = profile_thumb(user)
     
-    return render_template("admin_dashboard.html", user=user)
+    # Cached page shell with this user's values filled in
+    return dashboard_shells.render("admin_dashboard.html", user, "admin")
 
 
 # Add to your Flask app (or appropriate backend file)
@@ -1194,10 +1320,116 @@ def log_admin_action(action, request_id):
     })
 
     
+# ---------------------------------------------------------------------
+# ROUTE TELEMETRY
+# ---------------------------------------------------------------------
+@app.route("/admin/route_stats", methods=["GET"])
+def admin_route_stats():
+    """Latency, status codes, sizes and Mongo commands per route, for this process"""
+    
+    if not session.get("user") or session["user"]["user_type"] != "admin":
+        return jsonify({"success": False, "message": "Unauthorized"}), 403
+    
+    return jsonify({"success": True, "pid": os.getpid(), "routes": telemetry.snapshot()})
+
+
+# ---------------------------------------------------------------------
+# WORKER PROFILE
+# ---------------------------------------------------------------------
+@app.route("/admin/profile", methods=["GET"])
+def admin_profile():
+    """Collapsed stacks of the requests this worker serves for ?seconds
+    (see backend/profiler.py); blocks for the length of the window"""
+    
+    if not session.get("user") or session["user"]["user_type"] != "admin":
+        return jsonify({"success": False, "message": "Unauthorized"}), 403
+    
+    response = profile_window(app, request.args)
+    if response is None:
+        return jsonify({"success": False, "message": "A profile is already running on this worker"}), 409
+    
+    log.info("Worker profile taken", extra=fields(pid=os.getpid(), seconds=response.headers["X-Profile-Seconds"]))
+    return response
+
+
+# ---------------------------------------------------------------------
+# SLOW QUERIES
+# ---------------------------------------------------------------------
+@app.route("/admin/slow_queries", methods=["GET"])
+def admin_slow_queries():
+    """Slow query shapes of the last ?hours (default 24), most total time first.
+    Optional ?route=GET%20/get_medicines and ?collection=donated_medicine filters."""
+    
+    if not session.get("user") or session["user"]["user_type"] != "admin":
+        return jsonify({"success": False, "message": "Unauthorized"}), 403
+    
+    try:
+        hours = min(float(request.args.get("hours", 24)), 24 * 30)
+        limit = min(int(request.args.get("limit", 100)), 500)
+    except ValueError:
+        return jsonify({"success": False, "message": "Invalid hours or limit"}), 400
+    
+    try:
+        report = slow_query_report(
+            db,
+            since=datetime.utcnow() - timedelta(hours=hours),
+            route=request.args.get("route"),
+            collection=request.args.get("collection"),
+            limit=limit
+        )
+        return jsonify({"success": True, "hours": hours, "slow_queries": report})
+        
+    except Exception:
+        log.exception("Error fetching slow queries")
+        return jsonify({"success": False, "message": "Server error"}), 500
+
+
+# ---------------------------------------------------------------------
+# PROMETHEUS METRICS
+# ---------------------------------------------------------------------
+@app.route("/metrics", methods=["GET"])
+def metrics():
+    """Prometheus scrape endpoint (all gunicorn workers, see backend/metrics.py)"""
+    
+    token = os.getenv("METRICS_TOKEN")
+    if token and request.headers.get("Authorization") != f"Bearer {token}":
+        return jsonify({"success": False, "message": "Unauthorized"}), 401
+    
+    exposition = render_metrics(domain_counters.snapshot())
+    if exposition is None:
+        return jsonify({"success": False, "message": "prometheus_client is not installed"}), 503
+    
+    body, content_type = exposition
+    return app.response_class(body, mimetype=content_type)
+
+
+# ---------------------------------------------------------------------
+# HEALTH CHECKS (see backend/health.py)
+# ---------------------------------------------------------------------
+@app.route("/healthz", methods=["GET"])
+def healthz():
+    """Liveness probe: answers without touching any dependency"""
+    response = jsonify(liveness())
+    response.headers["Cache-Control"] = "no-store"
+    return response
+
+
+@app.route("/readyz", methods=["GET"])
+def readyz():
+    """Readiness probe: Mongo, upload folders, executors and caches, cached briefly"""
+    result, cached = readiness.get(readiness_mongo, storage)
+    response = jsonify(result)
+    response.status_code = 200 if result["status"] == "ready" else 503
+    response.headers["Cache-Control"] = "no-store"
+    response.headers["X-Readiness-Cached"] = "1" if cached else "0"
+    return response
+
+
 # ---------------------------------------------------------------------
 # GET ADMIN DASHBOARD STATISTICS
 # ---------------------------------------------------------------------
 @app.route("/get_admin_stats", methods=["GET"])
+@conditional("donar", "receiver", "admin", "donated_medicine", "requests_medicine", ttl=60)
 def get_admin_stats():
     """Get admin dashboard statistics"""
     
@@ -1205,96 +1437,35 @@ def get_admin_stats():
         return jsonify({"success": False, "message": "Unauthorized"}), 403
     
     try:
-        # Count total users
-        total_donors = donor_collection.count_documents({})
-        total_receivers = receiver_collection.count_documents({})
-        total_admins = admin_collection.count_documents({})
-        total_users = total_donors + total_receivers + total_admins
-        
-        # Count active users (users with activity in last 30 days)
-        thirty_days_ago = datetime.utcnow() - timedelta(days=30)
-        
-        # This is a simplified version - you may need to track last_login in your user collections
-        active_donors = donor_collection.count_documents({})  # Replace with actual active logic
-        active_receivers = receiver_collection.count_documents({})
-        active_users = active_donors + active_receivers
-        
-        # Count pending medicine requests
-        requests_medicine = db["requests_medicine"]
-        pending_requests = requests_medicine.count_documents({"status": "pending"})
-        
-        # Count completed transactions
-        completed_donations = donated_medicine.count_documents({"status": "completed"})
-        completed_requests = requests_medicine.count_documents({"status": "completed"})
-        completed_total = completed_donations + completed_requests
-        
-        # Count pending verifications
-        # This assumes you have a verification field in user collections
-        pending_verifications = 0
-        pending_verifications += donor_collection.count_documents({"verified": {"$ne": True}})
-        pending_verifications += receiver_collection.count_documents({"verified": {"$ne": True}})
-        
-        # Count today's registrations
-        today_start = datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0)
-        today_donors = donor_collection.count_documents({"created_at": {"$gte": today_start}})
-        today_receivers = receiver_collection.count_documents({"created_at": {"$gte": today_start}})
-        today_registrations = today_donors + today_receivers
-        
-        # Count donors and receivers separately for role management
-        total_donors_count = donor_collection.count_documents({})
-        total_receivers_count = receiver_collection.count_documents({})
-        
-        # Count suspended/blocked users
-        suspended_donors = donor_collection.count_documents({"status": "suspended"})
-        suspended_receivers = receiver_collection.count_documents({"status": "suspended"})
-        suspended_total = suspended_donors + suspended_receivers
-        
-        # Count blocked users
-        blocked_donors = donor_collection.count_documents({"status": "blocked"})
-        blocked_receivers = receiver_collection.count_documents({"status": "blocked"})
-        blocked_total = blocked_donors + blocked_receivers
+        # All counts are independent, so issue them concurrently
+        counts = count_all(db, admin_stat_queries(datetime.utcnow()))
         
         return jsonify({
             "success": True,
-            "stats": {
-                "total_users": total_users,
-                "active_users": active_users,
-                "pending_requests": pending_requests,
-                "completed_total": completed_total,
-                "total_donors": total_donors_count,
-                "total_receivers": total_receivers_count,
-                "total_admins": total_admins,
-                "pending_verifications": pending_verifications,
-                "today_registrations": today_registrations,
-                "suspended_users": suspended_total,
-                "blocked_users": blocked_total
-            }
+            "stats": admin_stats(counts)
         })
         
     except Exception as e:
-        print(f"❌ Error fetching admin stats: {str(e)}")
+        log.exception("Error fetching admin stats")
         return jsonify({
             "success": True,
-            "stats": {
-                "total_users": 0,
-                "active_users": 0,
-                "pending_requests": 0,
-                "completed_total": 0,
-                "total_donors": 0,
-                "total_receivers": 0,
-                "total_admins": 1,
-                "pending_verifications": 0,
-                "today_registrations": 0,
-                "suspended_users": 0,
-                "blocked_users": 0
-            }
+            "stats": EMPTY_ADMIN_STATS
         })
 
 
 # ---------------------------------------------------------------------
 # GET ALL USERS (FOR USER MANAGEMENT)
 # ---------------------------------------------------------------------
+def counts_by(collection, field):
+    """{value: number of documents} for every value of field"""
+    return {
+        row["_id"]: row["count"]
+        for row in collection.aggregate([{"$group": {"_id": f"${field}", "count": {"$sum": 1}}}])
+    }
+
+
 @app.route("/get_all_users", methods=["GET"])
+@conditional("donar", "receiver", "admin", "donated_medicine", "requests_medicine", ttl=60)
 def get_all_users():
     """Get all users (donors, receivers, admins) for admin dashboard"""
     
@@ -1302,8 +1473,20 @@ def get_all_users():
         return jsonify({"success": False, "message": "Unauthorized"}), 403
     
     try:
+        # Users and per user counts in five queries, whatever the number
+        # of users (not one count_documents per user)
+        results = run_parallel({
+            "donors": lambda: list(donor_collection.find({})),
+            "receivers": lambda: list(receiver_collection.find({})),
+            "admins": lambda: list(admin_collection.find({})),
+            "donations_count": lambda: counts_by(donated_medicine, "email"),
+            "requests_count": lambda: counts_by(db["requests_medicine"], "receiver_email"),
+        })
+        donations_count = results["donations_count"]
+        requests_count = results["requests_count"]
+        
         # Get all donors
-        donors = donor_collection.find({})
+        donors = results["donors"]
         donor_list = []
         for donor in donors:
             donor_list.append({
@@ -1316,14 +1499,13 @@ def get_all_users():
                 "profile_image": donor.get("profile_image"),
                 "created_at": donor.get("created_at").isoformat() if donor.get("created_at") else None,
                 "last_active": donor.get("last_active", None),
-                "donations_count": donated_medicine.count_documents({"email": donor.get("email")})
+                "donations_count": donations_count.get(donor.get("email"), 0)
             })
         
         # Get all receivers
-        receivers = receiver_collection.find({})
+        receivers = results["receivers"]
         receiver_list = []
         for receiver in receivers:
-            requests_medicine = db["requests_medicine"]
             receiver_list.append({
                 "id": str(receiver.get("_id")),
                 "username": receiver.get("username", "Unknown"),
@@ -1334,11 +1516,11 @@ def get_all_users():
                 "profile_image": receiver.get("profile_image"),
                 "created_at": receiver.get("created_at").isoformat() if receiver.get("created_at") else None,
                 "last_active": receiver.get("last_active", None),
-                "requests_count": requests_medicine.count_documents({"receiver_email": receiver.get("email")})
+                "requests_count": requests_count.get(receiver.get("email"), 0)
             })
         
         # Get all admins
-        admins = admin_collection.find({})
+        admins = results["admins"]
         admin_list = []
         for admin in admins:
             admin_list.append({
@@ -1371,7 +1553,7 @@ def get_all_users():
         })
         
     except Exception as e:
-        print(f"❌ Error fetching users: {str(e)}")
+        log.exception("Error fetching users")
         return jsonify({"success": False, "message": "Server error"}), 500
 
 
@@ -1379,6 +1561,7 @@ def get_all_users():
 # GET ALL MEDICINE DONATIONS (FROM DONORS)
 # ---------------------------------------------------------------------
 @app.route("/get_all_donations_admin", methods=["GET"])
+@conditional("donated_medicine", ttl=60)
 def get_all_donations_admin():
     """Get all medicine donations for admin view"""
     
@@ -1389,64 +1572,17 @@ def get_all_donations_admin():
         # Get all donations
         all_donations = donated_medicine.find({}).sort("created_at", -1)
         
-        donations = []
-        for donation in all_donations:
-            # Calculate time ago
-            created_at = donation.get("created_at")
-            time_ago = "Recently"
-            
-            if created_at:
-                time_diff = datetime.utcnow() - created_at
-                if time_diff < timedelta(minutes=1):
-                    time_ago = "Just now"
-                elif time_diff < timedelta(hours=1):
-                    minutes = int(time_diff.total_seconds() / 60)
-                    time_ago = f"{minutes} minute{'s' if minutes > 1 else ''} ago"
-                elif time_diff < timedelta(days=1):
-                    hours = int(time_diff.total_seconds() / 3600)
-                    time_ago = f"{hours} hour{'s' if hours > 1 else ''} ago"
-                elif time_diff < timedelta(days=7):
-                    days = time_diff.days
-                    time_ago = f"{days} day{'s' if days > 1 else ''} ago"
-                else:
-                    time_ago = created_at.strftime("%b %d, %Y")
-            
-            donations.append({
-                "id": str(donation.get("_id")),
-                "medicine_name": donation.get("medicineName", "Unknown"),
-                "manufacturer": donation.get("manufacturer", ""),
-                "quantity": donation.get("quantity", 0),
-                "expiry_date": donation.get("expiryDate", "N/A"),
-                "category": donation.get("category", "other"),
-                "condition": donation.get("condition", "good"),
-                "status": donation.get("status", "available"),
-                "donor_username": donation.get("username", "Anonymous"),
-                "donor_email": donation.get("email", ""),
-                "image": donation.get("image", ""),
-                "created_at": created_at.isoformat() if created_at else None,
-                "time_ago": time_ago
-            })
-        
-        # Count by status
-        available_count = len([d for d in donations if d["status"] == "available"])
-        claimed_count = len([d for d in donations if d["status"] in ["pending", "approved"]])
-        completed_count = len([d for d in donations if d["status"] == "completed"])
-        expired_count = len([d for d in donations if d["status"] == "expired"])
+        now = datetime.utcnow()
+        donations = [admin_donation_row(donation, now) for donation in all_donations]
         
         return jsonify({
             "success": True,
             "donations": donations,
-            "counts": {
-                "total": len(donations),
-                "available": available_count,
-                "claimed": claimed_count,
-                "completed": completed_count,
-                "expired": expired_count
-            }
+            "counts": admin_donation_counts(donations)
         })
         
     except Exception as e:
-        print(f"❌ Error fetching donations: {str(e)}")
+        log.exception("Error fetching donations")
         return jsonify({"success": False, "message": "Server error"}), 500
 
 
@@ -1454,6 +1590,7 @@ def get_all_donations_admin():
 # GET ALL MEDICINE REQUESTS (FROM RECEIVERS)
 # ---------------------------------------------------------------------
 @app.route("/get_all_requests_admin", methods=["GET"])
+@conditional("requests_medicine", ttl=60)
 def get_all_requests_admin():
     """Get all medicine requests for admin view"""
     
@@ -1466,77 +1603,17 @@ def get_all_requests_admin():
         # Get all requests
         all_requests = requests_medicine.find({}).sort("created_at", -1)
         
-        requests = []
-        for req in all_requests:
-            # Calculate time ago
-            created_at = req.get("created_at")
-            time_ago = "Recently"
-            
-            if created_at:
-                time_diff = datetime.utcnow() - created_at
-                if time_diff < timedelta(minutes=1):
-                    time_ago = "Just now"
-                elif time_diff < timedelta(hours=1):
-                    minutes = int(time_diff.total_seconds() / 60)
-                    time_ago = f"{minutes} minute{'s' if minutes > 1 else ''} ago"
-                elif time_diff < timedelta(days=1):
-                    hours = int(time_diff.total_seconds() / 3600)
-                    time_ago = f"{hours} hour{'s' if hours > 1 else ''} ago"
-                elif time_diff < timedelta(days=7):
-                    days = time_diff.days
-                    time_ago = f"{days} day{'s' if days > 1 else ''} ago"
-                else:
-                    time_ago = created_at.strftime("%b %d, %Y")
-            
-            # Get urgency color
-            urgency_color = "normal"
-            if req.get("urgency") == "immediate":
-                urgency_color = "danger"
-            elif req.get("urgency") == "urgent":
-                urgency_color = "warning"
-            elif req.get("urgency") == "low":
-                urgency_color = "success"
-            
-            requests.append({
-                "id": str(req.get("_id")),
-                "medicine_name": req.get("medicine_name", "Unknown"),
-                "dosage": req.get("dosage", ""),
-                "quantity": req.get("quantity", 0),
-                "urgency": req.get("urgency", "normal"),
-                "urgency_color": urgency_color,
-                "preferred_location": req.get("preferred_location", ""),
-                "status": req.get("status", "pending"),
-                "receiver_username": req.get("receiver_username", "Unknown"),
-                "receiver_email": req.get("receiver_email", ""),
-                "receiver_id": req.get("receiver_id", ""),
-                "prescription": req.get("prescription"),
-                "additional_notes": req.get("additional_notes", ""),
-                "donor_username": req.get("donor_username"),
-                "donor_email": req.get("donor_email"),
-                "created_at": created_at.isoformat() if created_at else None,
-                "time_ago": time_ago
-            })
-        
-        # Count by status
-        pending_count = len([r for r in requests if r["status"] == "pending"])
-        approved_count = len([r for r in requests if r["status"] == "approved"])
-        completed_count = len([r for r in requests if r["status"] == "completed"])
-        cancelled_count = len([r for r in requests if r["status"] == "cancelled"])
+        now = datetime.utcnow()
+        requests = [admin_request_row(req, now) for req in all_requests]
         
         return jsonify({
             "success": True,
             "requests": requests,
-            "counts": {
-                "total": len(requests),
-                "pending": pending_count,
-                "approved": approved_count,
-                "completed": completed_count,
-                "cancelled": cancelled_count
-            }
+            "counts": admin_request_counts(requests)
         })
         
     except Exception as e:
-        print(f"❌ Error fetching requests: {str(e)}")
+        log.exception("Error fetching requests")
         return jsonify({"success": False, "message": "Server error"}), 500
 
 
@@ -1551,125 +1628,23 @@ def get_recent_activity_admin():
         return jsonify({"success": False, "message": "Unauthorized"}), 403
     
     try:
-        activities = []
+        since = parse_since(request.args.get("since"))
         
-        # Get recent donations (last 5)
-        recent_donations = donated_medicine.find({}).sort("created_at", -1).limit(5)
-        for donation in recent_donations:
-            created_at = donation.get("created_at")
-            time_ago = "Recently"
-            
-            if created_at:
-                time_diff = datetime.utcnow() - created_at
-                if time_diff < timedelta(hours=1):
-                    minutes = int(time_diff.total_seconds() / 60)
-                    time_ago = f"{minutes} min ago"
-                elif time_diff < timedelta(days=1):
-                    hours = int(time_diff.total_seconds() / 3600)
-                    time_ago = f"{hours} hour{'s' if hours > 1 else ''} ago"
-                else:
-                    days = time_diff.days
-                    time_ago = f"{days} day{'s' if days > 1 else ''} ago"
-            
-            activities.append({
-                "type": "donation",
-                "icon": "fa-donate",
-                "icon_color": "orange",
-                "title": "New Medicine Donation",
-                "description": f"{donation.get('username', 'Someone')} donated {donation.get('quantity')} units of {donation.get('medicineName')}",
-                "time_ago": time_ago,
-                "created_at": created_at.isoformat() if created_at else None
-            })
+        # 10 most recent platform activities, or only the ones newer
+        # than ?since= when polling incrementally
+        recent = read_feed(db, 10, since=since)
         
-        # Get recent requests (last 5)
-        requests_medicine = db["requests_medicine"]
-        recent_requests = requests_medicine.find({}).sort("created_at", -1).limit(5)
-        for req in recent_requests:
-            created_at = req.get("created_at")
-            time_ago = "Recently"
-            
-            if created_at:
-                time_diff = datetime.utcnow() - created_at
-                if time_diff < timedelta(hours=1):
-                    minutes = int(time_diff.total_seconds() / 60)
-                    time_ago = f"{minutes} min ago"
-                elif time_diff < timedelta(days=1):
-                    hours = int(time_diff.total_seconds() / 3600)
-                    time_ago = f"{hours} hour{'s' if hours > 1 else ''} ago"
-                else:
-                    days = time_diff.days
-                    time_ago = f"{days} day{'s' if days > 1 else ''} ago"
-            
-            activities.append({
-                "type": "request",
-                "icon": "fa-prescription",
-                "icon_color": "blue",
-                "title": "New Medicine Request",
-                "description": f"{req.get('receiver_username', 'Someone')} requested {req.get('quantity')} units of {req.get('medicine_name')}",
-                "time_ago": time_ago,
-                "created_at": created_at.isoformat() if created_at else None
-            })
-        
-        # Get recent user registrations (last 5)
-        recent_donors = donor_collection.find({}).sort("created_at", -1).limit(3)
-        for donor in recent_donors:
-            created_at = donor.get("created_at")
-            if created_at:
-                time_diff = datetime.utcnow() - created_at
-                if time_diff < timedelta(hours=24):
-                    time_ago = "Today"
-                else:
-                    days = time_diff.days
-                    time_ago = f"{days} day{'s' if days > 1 else ''} ago"
-            else:
-                time_ago = "Recently"
-            
-            activities.append({
-                "type": "registration",
-                "icon": "fa-user-plus",
-                "icon_color": "green",
-                "title": "New Donor Registration",
-                "description": f"{donor.get('username')} joined as a donor",
-                "time_ago": time_ago,
-                "created_at": created_at.isoformat() if created_at else None
-            })
-        
-        recent_receivers = receiver_collection.find({}).sort("created_at", -1).limit(3)
-        for receiver in recent_receivers:
-            created_at = receiver.get("created_at")
-            if created_at:
-                time_diff = datetime.utcnow() - created_at
-                if time_diff < timedelta(hours=24):
-                    time_ago = "Today"
-                else:
-                    days = time_diff.days
-                    time_ago = f"{days} day{'s' if days > 1 else ''} ago"
-            else:
-                time_ago = "Recently"
-            
-            activities.append({
-                "type": "registration",
-                "icon": "fa-user-plus",
-                "icon_color": "teal",
-                "title": "New Receiver Registration",
-                "description": f"{receiver.get('username')} joined as a receiver",
-                "time_ago": time_ago,
-                "created_at": created_at.isoformat() if created_at else None
-            })
-        
-        # Sort all activities by created_at (newest first)
-        activities.sort(key=lambda x: x.get("created_at", ""), reverse=True)
-        
-        # Return only the 10 most recent activities
-        activities = activities[:10]
+        now = datetime.utcnow()
+        activities = [admin_activity_row(activity, now) for activity in recent]
         
         return jsonify({
             "success": True,
-            "activities": activities
+            "activities": activities,
+            "latest": iso(recent[0]["created_at"]) if recent else iso(since)
         })
         
     except Exception as e:
-        print(f"❌ Error fetching recent activity: {str(e)}")
+        log.exception("Error fetching recent activity")
         return jsonify({"success": False, "message": "Server error"}), 500
 
 
@@ -1707,13 +1682,24 @@ def update_user_status():
             return jsonify({"success": False, "message": "Invalid user type"}), 400
         
         # Update user status
-        result = collection.update_one(
+        updated_user = collection.find_one_and_update(
             {"_id": ObjectId(user_id)},
-            {"$set": {"status": new_status, "updated_at": datetime.utcnow()}}
+            {"$set": {"status": new_status, "updated_at": datetime.utcnow()}},
+            projection={"email": 1, "username": 1, "status": 1}
         )
         
-        if result.modified_count > 0:
-            print(f"✅ User {user_id} status updated to {new_status}")
+        if updated_user:
+            record_activity(
+                db, "user_status",
+                {"email": updated_user.get("email"), "username": updated_user.get("username"), "user_type": user_type},
+                subject_id=user_id,
+                data={
+                    "status": new_status,
+                    "previous_status": updated_user.get("status", "active"),
+                    "changed_by": session["user"]["username"]
+                }
+            )
+            log.info("User status updated", extra=fields(user_id=user_id, status=new_status))
             return jsonify({
                 "success": True,
                 "message": f"User status updated to {new_status}"
@@ -1725,7 +1711,7 @@ def update_user_status():
             }), 404
         
     except Exception as e:
-        print(f"❌ Error updating user status: {str(e)}")
+        log.exception("Error updating user status")
         return jsonify({"success": False, "message": "Server error"}), 500
 
 
@@ -1760,13 +1746,20 @@ def verify_user():
             return jsonify({"success": False, "message": "Only donors and receivers can be verified"}), 400
         
         # Update user verification status
-        result = collection.update_one(
+        verified_user = collection.find_one_and_update(
             {"_id": ObjectId(user_id)},
-            {"$set": {"verified": True, "verified_at": datetime.utcnow(), "updated_at": datetime.utcnow()}}
+            {"$set": {"verified": True, "verified_at": datetime.utcnow(), "updated_at": datetime.utcnow()}},
+            projection={"email": 1, "username": 1, "verified": 1}
         )
         
-        if result.modified_count > 0:
-            print(f"✅ User {user_id} verified successfully")
+        if verified_user:
+            record_activity(
+                db, "user_verified",
+                {"email": verified_user.get("email"), "username": verified_user.get("username"), "user_type": user_type},
+                subject_id=user_id,
+                data={"was_verified": verified_user.get("verified", False), "changed_by": session["user"]["username"]}
+            )
+            log.info("User verified", extra=fields(user_id=user_id))
             return jsonify({
                 "success": True,
                 "message": "User verified successfully"
@@ -1778,7 +1771,7 @@ def verify_user():
             }), 404
         
     except Exception as e:
-        print(f"❌ Error verifying user: {str(e)}")
+        log.exception("Error verifying user")
         return jsonify({"success": False, "message": "Server error"}), 500
 
 
@@ -1806,13 +1799,19 @@ def verify_prescription():
         requests_medicine = db["requests_medicine"]
         
         # Update request status
-        result = requests_medicine.update_one(
+        verified_request = requests_medicine.find_one_and_update(
             {"_id": ObjectId(request_id)},
-            {"$set": {"prescription_verified": True, "prescription_verified_at": datetime.utcnow(), "updated_at": datetime.utcnow()}}
+            {"$set": {"prescription_verified": True, "prescription_verified_at": datetime.utcnow(), "updated_at": datetime.utcnow()}},
+            projection={"receiver_email": 1, "receiver_username": 1, "medicine_name": 1}
         )
         
-        if result.modified_count > 0:
-            print(f"✅ Prescription for request {request_id} verified")
+        if verified_request:
+            record_activity(
+                db, "prescription_verified", request_owner(verified_request),
+                subject_id=request_id,
+                data={"medicine_name": verified_request.get("medicine_name"), "changed_by": session["user"]["username"]}
+            )
+            log.info("Prescription verified", extra=fields(medicine_request_id=request_id))
             return jsonify({
                 "success": True,
                 "message": "Prescription verified successfully"
@@ -1824,13 +1823,22 @@ def verify_prescription():
             }), 404
         
     except Exception as e:
-        print(f"❌ Error verifying prescription: {str(e)}")
+        log.exception("Error verifying prescription")
         return jsonify({"success": False, "message": "Server error"}), 500
 
 
 # ---------------------------------------------------------------------
 # APPROVE/REJECT MEDICINE REQUEST
 # ---------------------------------------------------------------------
+def request_owner(medicine_request):
+    """Activity actor for a medicine request: the receiver who made it"""
+    return {
+        "email": medicine_request.get("receiver_email"),
+        "username": medicine_request.get("receiver_username"),
+        "user_type": "receiver"
+    }
+
+
 @app.route("/update_request_status", methods=["POST"])
 def update_request_status():
     """Update medicine request status (approve/reject)"""
@@ -1853,13 +1861,24 @@ def update_request_status():
         requests_medicine = db["requests_medicine"]
         
         # Update request status
-        result = requests_medicine.update_one(
+        updated_request = requests_medicine.find_one_and_update(
             {"_id": ObjectId(request_id)},
-            {"$set": {"status": new_status, "updated_at": datetime.utcnow()}}
+            {"$set": {"status": new_status, "updated_at": datetime.utcnow()}},
+            projection={"receiver_email": 1, "receiver_username": 1, "medicine_name": 1, "status": 1}
         )
         
-        if result.modified_count > 0:
-            print(f"✅ Request {request_id} status updated to {new_status}")
+        if updated_request:
+            record_activity(
+                db, "request_status", request_owner(updated_request),
+                subject_id=request_id,
+                data={
+                    "medicine_name": updated_request.get("medicine_name"),
+                    "status": new_status,
+                    "previous_status": updated_request.get("status"),
+                    "changed_by": session["user"]["username"]
+                }
+            )
+            log.info("Medicine request status updated", extra=fields(medicine_request_id=request_id, status=new_status))
             return jsonify({
                 "success": True,
                 "message": f"Request {new_status} successfully"
@@ -1871,7 +1890,7 @@ def update_request_status():
             }), 404
         
     except Exception as e:
-        print(f"❌ Error updating request status: {str(e)}")
+        log.exception("Error updating request status")
         return jsonify({"success": False, "message": "Server error"}), 500
 
 
@@ -1886,11 +1905,13 @@ def admin_upload_profile():
         return jsonify({"success": False, "message": "Not logged in"}), 401
 
     file = request.files.get("profileImage")
+    # Or the name of an image already uploaded straight to storage
+    uploaded_name = request.form.get("profileImageName")
 
-    if not file or file.filename == "":
+    if (not file or file.filename == "") and not uploaded_name:
         return jsonify({"success": False, "message": "No file selected"}), 400
 
-    if not allowed_file(file.filename):
+    if not allowed_file(file.filename if file and file.filename else uploaded_name):
         return jsonify({"success": False, "message": "Invalid image type. Allowed: png, jpg, jpeg, gif"}), 400
 
     try:
@@ -1900,44 +1921,43 @@ def admin_upload_profile():
         old_user = admin_collection.find_one({"_id": ObjectId(user_id)})
         old_image = old_user.get("profile_image") if old_user else None
         
-        # Generate unique filename
-        ext = file.filename.rsplit(".", 1)[1].lower()
-        unique_name = f"{user_id}_{uuid.uuid4().hex}.{ext}"
-
-        # Save new file
-        path = os.path.join(PROFILE_FOLDER, unique_name)
-        file.save(path)
+        # Store the file under its content hash
+        blob = stored_upload(profile_store, file, uploaded_name)
+        if blob is None:
+            return jsonify({"success": False, "message": "Uploaded image not found"}), 400
+        unique_name = blob["name"]
 
         # Update database with new image
         admin_collection.update_one(
             {"_id": ObjectId(user_id)},
-            {"$set": {"profile_image": unique_name}}
+            {
+                "$set": {"profile_image": unique_name, "updated_at": datetime.utcnow()},
+                "$unset": {"profile_image_renditions": ""}
+            }
         )
 
-        # Delete old image file if it exists
+        # Thumb/card/full WebP renditions are built in the background
+        build_profile_renditions(admin_collection, user_id, blob)
+
+        # Drop the reference to the old image, unless it is the default
         if old_image and old_image != "default.png":
-            old_path = os.path.join(PROFILE_FOLDER, old_image)
-            if os.path.exists(old_path):
-                try:
-                    os.remove(old_path)
-                    print(f"✅ Deleted old admin profile image: {old_image}")
-                except Exception as e:
-                    print(f"⚠ Could not delete old admin image: {e}")
+            if profile_store.release(old_image, old_user.get("profile_image_renditions")):
+                log.info("Queued old profile image for deletion", extra=sampled(role="admin", image=old_image))
 
         # Update session
         session["user"]["profile_image"] = unique_name
         session.modified = True
 
-        print(f"✅ Admin profile image uploaded successfully: {unique_name}")
+        log.info("Profile image uploaded", extra=sampled(role="admin", image=unique_name))
 
         return jsonify({
             "success": True, 
             "filename": unique_name,
-            "filepath": f"/static/profile_images/{unique_name}"
+            "filepath": profile_store.url(unique_name)
         })
         
     except Exception as e:
-        print(f"❌ Error uploading admin profile image: {str(e)}")
+        log.exception("Error uploading admin profile image")
         return jsonify({"success": False, "message": "Server error during upload"}), 500
 
 
@@ -1958,17 +1978,16 @@ def admin_delete_profile_image():
         user = admin_collection.find_one({"_id": ObjectId(user_id)})
         old_image = user.get("profile_image") if user else None
         
-        # Delete the image file if it exists
+        # Drop the reference to the image; the reaper removes the file
+        # once the last reference is gone
         if old_image and old_image != "default.png":
-            old_path = os.path.join(PROFILE_FOLDER, old_image)
-            if os.path.exists(old_path):
-                os.remove(old_path)
-                print(f"✅ Deleted admin profile image: {old_image}")
+            if profile_store.release(old_image, user.get("profile_image_renditions")):
+                log.info("Queued profile image for deletion", extra=sampled(role="admin", image=old_image))
         
         # Update database - remove profile_image field
         admin_collection.update_one(
             {"_id": ObjectId(user_id)},
-            {"$unset": {"profile_image": ""}}
+            {"$unset": {"profile_image": "", "profile_image_renditions": ""}, "$set": {"updated_at": datetime.utcnow()}}
         )
         
         # Update session
@@ -1982,13 +2001,20 @@ def admin_delete_profile_image():
         })
         
     except Exception as e:
-        print(f"❌ Error deleting admin profile image: {str(e)}")
+        log.exception("Error deleting admin profile image")
         return jsonify({"success": False, "message": "Server error during deletion"}), 500
 
 
 # ---------------------------------------------------------------------
 # GET USER DETAILS BY ID
 # ---------------------------------------------------------------------
+USER_DETAIL_FIELDS = {
+    "username": 1, "email": 1, "status": 1, "verified": 1, "profile_image": 1,
+    "created_at": 1, "last_active": 1, "phone": 1, "address": 1, "city": 1,
+    "state": 1, "pincode": 1,
+}
+
+
 @app.route("/get_user_details", methods=["GET"])
 def get_user_details():
     """Get detailed information about a specific user"""
@@ -2013,28 +2039,18 @@ def get_user_details():
         else:
             return jsonify({"success": False, "message": "Invalid user type"}), 400
         
-        user = collection.find_one({"_id": ObjectId(user_id)})
+        user = collection.find_one({"_id": ObjectId(user_id)}, USER_DETAIL_FIELDS)
         
         if not user:
             return jsonify({"success": False, "message": "User not found"}), 404
         
-        # Get user activity
-        user_details = {
-            "id": str(user.get("_id")),
-            "username": user.get("username"),
-            "email": user.get("email"),
-            "user_type": user_type,
-            "status": user.get("status", "active"),
-            "verified": user.get("verified", False),
-            "profile_image": user.get("profile_image"),
-            "created_at": user.get("created_at").isoformat() if user.get("created_at") else None,
-            "last_active": user.get("last_active"),
-            "phone": user.get("phone"),
-            "address": user.get("address"),
-            "city": user.get("city"),
-            "state": user.get("state"),
-            "pincode": user.get("pincode")
-        }
+        # Projected document as stored; the JSON provider encodes the
+        # ObjectId and datetimes
+        user_details = dict.fromkeys(USER_DETAIL_FIELDS)
+        user_details.update({"status": "active", "verified": False})
+        user_details.update(user)
+        user_details["id"] = user_details.pop("_id")
+        user_details["user_type"] = user_type
         
         # Get user-specific statistics
         if user_type == "donor":
@@ -2051,7 +2067,7 @@ def get_user_details():
         })
         
     except Exception as e:
-        print(f"❌ Error fetching user details: {str(e)}")
+        log.exception("Error fetching user details")
         return jsonify({"success": False, "message": "Server error"}), 500
 
 
@@ -2073,7 +2089,7 @@ def generate_report():
         # This is a placeholder for actual report generation
         # You can implement PDF/Excel generation here
         
-        print(f"📊 Generating {report_type} report for {date_range} date range")
+        log.info("Generating report", extra=fields(report_type=report_type, date_range=date_range))
         
         return jsonify({
             "success": True,
@@ -2082,7 +2098,7 @@ def generate_report():
         })
         
     except Exception as e:
-        print(f"❌ Error generating report: {str(e)}")
+        log.exception("Error generating report")
         return jsonify({"success": False, "message": "Server error"}), 500
     
     
@@ -2093,6 +2109,7 @@ def generate_report():
 # ------------------------------------------------------------
 
 @app.route("/get_medicines")
+@conditional("donated_medicine")
 def get_medicines():
 
     keyword = request.args.get("keyword", "").strip()
@@ -2117,7 +2134,8 @@ def get_medicines():
             "category": med.get("category"),
             "quantity": med.get("quantity"),
             "expiryDate": med.get("expiryDate"),
-            "image": med.get("image")
+            "image": med.get("image"),
+            "image_urls": rendition_urls(medicine_store.url_prefix(), med.get("image"), med.get("image_renditions"))
         })
 
     return jsonify(data)
@@ -2211,6 +2229,65 @@ def get_medicines():
 
     return jsonify(result)
 
+# ---------------------------------------------------------------------
+# LIVE DASHBOARD EVENTS (SERVER-SENT EVENTS)
+# ---------------------------------------------------------------------
+def dashboard_events(user_type):
+    """Stream activity events for the logged in user's dashboard"""
+    
+    if not session.get("user") or session["user"]["user_type"] != user_type:
+        return jsonify({"success": False, "message": "Unauthorized"}), 403
+    
+    user = dict(session["user"])
+    
+    # Each stream holds a worker thread; over the cap the dashboard
+    # retries later instead of starving ordinary requests
+    subscriber = broker.subscribe()
+    if subscriber is None:
+        return Response(
+            f"retry: {SSE_RETRY_SECONDS * 1000}\n\n",
+            status=503,
+            mimetype="text/event-stream",
+            headers={"Retry-After": str(SSE_RETRY_SECONDS), "Cache-Control": "no-store"}
+        )
+    
+    # Replay what was missed while reconnecting (EventSource sends the
+    # last event id, which is the activity's created_at). Read after
+    # subscribing, so an activity written in between is not lost;
+    # event_stream drops the ones that arrive twice.
+    since = parse_since(request.headers.get("Last-Event-ID") or request.args.get("since"))
+    try:
+        missed = read_feed(db, REPLAY_LIMIT, since=since)[::-1] if since else []
+    except Exception:
+        broker.unsubscribe(subscriber)
+        raise
+    
+    response = Response(
+        event_stream(user, subscriber, missed, since),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+    # The generator's finally never runs if the stream is closed before
+    # its first frame
+    response.call_on_close(lambda: broker.unsubscribe(subscriber))
+    return response
+
+
+@app.route("/donor/events")
+def donor_events():
+    return dashboard_events("donor")
+
+
+@app.route("/receiver/events")
+def receiver_events():
+    return dashboard_events("receiver")
+
+
+@app.route("/admin/events")
+def admin_events():
+    return dashboard_events("admin")
+
+
 # ---------------------------------------------------------------------
 # LOGOUT
 # ---------------------------------------------------------------------
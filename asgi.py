@@ -0,0 +1,388 @@
+"""
+Async (ASGI) entry point.
+
+    uvicorn asgi:app --workers 2
+
+The dashboard JSON endpoints (stats, recent activity and the list views)
+are served by Quart on top of the Motor async driver, so one worker keeps
+many dashboard fetches in flight instead of one per thread. Every other
+route - pages, login, uploads and status changes - is passed through to
+the Flask app in app.py. Both servers use the same secret key, so the
+session cookie works on either, and the JSON payloads come from the same
+builders in backend/serializers.py.
+
+The async routes get the same request handling as their Flask twins,
+through the same helpers: X-Request-ID and request ids in log records,
+telemetry with Server-Timing (Motor reports to the same command
+listeners), weak ETags and 304s (@conditional, same collections and
+ttl), and gzip/brotli compression. The ?profile= sampler is the one
+exception: it samples request threads, and async requests all run on
+the event loop thread, so profile these endpoints under app.py.
+"""
+import asyncio
+import logging
+from datetime import datetime
+from functools import wraps
+
+from asgiref.wsgi import WsgiToAsgi
+from motor.motor_asyncio import AsyncIOMotorClient
+from quart import Quart, g, jsonify, make_response, request, session
+
+import app as sync_app
+from backend.serializers import (
+    donor_stats, donor_feed_row, donation_history_row,
+    available_medicine_row, receiver_stats, receiver_request_row, EMPTY_RECEIVER_STATS,
+    admin_stat_queries, admin_stats, EMPTY_ADMIN_STATS,
+    admin_donation_row, admin_donation_counts, admin_request_row, admin_request_counts,
+    admin_activity_row, iso,
+)
+from backend.activity import ACTIVITY_COLLECTION, feed_query, parse_since
+from backend.http_cache import COMPRESS_MIMETYPES, compress_body, etag_value
+from backend.logs import REQUEST_ID_HEADER, current_request_id, end_request_id, start_request_id
+from backend.metrics import cache_lookup
+from backend.slow_queries import slow_query_listener
+from backend.telemetry import UNMATCHED_ROUTE, mongo_listener, telemetry
+
+log = logging.getLogger(__name__)
+
+
+async_app = Quart(__name__, static_folder=None)
+async_app.secret_key = sync_app.app.secret_key
+
+mongo = {}
+
+
+# ---------------------------------------------------------------------
+# CONNECT TO MONGODB (MOTOR)
+# ---------------------------------------------------------------------
+@async_app.before_serving
+async def connect_mongo():
+    # Motor binds to the running event loop, so connect once serving starts
+    client = AsyncIOMotorClient(
+        sync_app.MONGO_URI,
+        **sync_app.MONGO_TLS_OPTIONS,
+        # Commands count towards the request's Server-Timing and slow
+        # query log as under app.py (Motor's executor keeps contextvars)
+        event_listeners=[mongo_listener, slow_query_listener]
+    )
+    mongo["client"] = client
+    mongo["db"] = client[sync_app.db.name]
+
+
+@async_app.after_serving
+async def close_mongo():
+    client = mongo.pop("client", None)
+    if client:
+        client.close()
+
+
+# ---------------------------------------------------------------------
+# REQUEST HOOKS (the Flask app's, see install_request_ids, telemetry,
+# compress_response)
+# ---------------------------------------------------------------------
+@async_app.before_request
+async def start_request():
+    g.request_id_token = start_request_id(request.headers.get(REQUEST_ID_HEADER))
+    g.telemetry_token = telemetry.start(
+        request.method, request.url_rule.rule if request.url_rule else UNMATCHED_ROUTE
+    )
+
+
+@async_app.after_request
+async def finish_request(response):
+    # Compressed first, so telemetry records the size sent
+    response.vary.add("Accept-Encoding")
+    if (
+        response.status_code == 200
+        and "Content-Encoding" not in response.headers
+        and response.mimetype in COMPRESS_MIMETYPES
+    ):
+        compressed = compress_body(await response.get_data(), request.accept_encodings)
+        if compressed:
+            response.set_data(compressed[0])
+            response.headers["Content-Encoding"] = compressed[1]
+
+    size = len(await response.get_data())
+    response.headers["Server-Timing"] = telemetry.finish(request.endpoint, response.status_code, size)
+    response.headers[REQUEST_ID_HEADER] = current_request_id()
+    return response
+
+
+@async_app.teardown_request
+async def end_request(exc=None):
+    token = g.pop("telemetry_token", None)
+    if token is not None:
+        telemetry.end(token)
+    token = g.pop("request_id_token", None)
+    if token is not None:
+        end_request_id(token)
+
+
+def conditional(*collections, ttl=None):
+    """backend.http_cache.conditional for async views"""
+
+    def decorator(view):
+        @wraps(view)
+        async def wrapper(*args, **kwargs):
+            etag = etag_value(request.path, request.query_string, session.get("user") or {}, collections, ttl)
+            hit = request.if_none_match.contains_weak(etag)
+            cache_lookup("etag", hit)
+            if hit:
+                response = async_app.response_class("", status=304)
+            else:
+                response = await make_response(await view(*args, **kwargs))
+                if response.status_code != 200:
+                    return response
+            response.set_etag(etag, weak=True)
+            response.headers["Cache-Control"] = "private, no-cache"
+            return response
+
+        return wrapper
+
+    return decorator
+
+
+def collection(name):
+    return mongo["db"][name]
+
+
+def logged_in_as(user_type):
+    user = session.get("user")
+    if not user or user.get("user_type") != user_type:
+        return None
+    return user
+
+
+async def read_feed(limit, since=None, actor_email=None, activity_type=None):
+    return await collection(ACTIVITY_COLLECTION).find(
+        feed_query(since, actor_email, activity_type)
+    ).sort("created_at", -1).limit(limit).to_list(length=None)
+
+
+def unauthorized():
+    return jsonify({"success": False, "message": "Unauthorized"}), 403
+
+
+# ---------------------------------------------------------------------
+# DONOR
+# ---------------------------------------------------------------------
+@async_app.route("/get_donor_stats", methods=["GET"])
+@conditional("donated_medicine")
+async def get_donor_stats():
+    user = logged_in_as("donor")
+    if not user:
+        return unauthorized()
+
+    all_donations = await collection("donated_medicine").find(
+        {"email": user["email"]}, {"status": 1, "quantity": 1}
+    ).to_list(length=None)
+
+    return jsonify({"success": True, "stats": donor_stats(all_donations)})
+
+
+@async_app.route("/get_recent_activity", methods=["GET"])
+async def get_recent_activity():
+    user = logged_in_as("donor")
+    if not user:
+        return unauthorized()
+
+    since = parse_since(request.args.get("since"))
+    recent_donations = await read_feed(10, since=since, actor_email=user["email"], activity_type="donation")
+
+    now = datetime.utcnow()
+    return jsonify({
+        "success": True,
+        "activities": [donor_feed_row(activity, now) for activity in recent_donations],
+        "latest": iso(recent_donations[0]["created_at"]) if recent_donations else iso(since)
+    })
+
+
+@async_app.route("/get_all_donations", methods=["GET"])
+@conditional("donated_medicine", ttl=60)
+async def get_all_donations():
+    user = logged_in_as("donor")
+    if not user:
+        return unauthorized()
+
+    all_donations = await collection("donated_medicine").find(
+        {"email": user["email"]}
+    ).sort("created_at", -1).to_list(length=None)
+
+    now = datetime.utcnow()
+    return jsonify({
+        "success": True,
+        "donations": [donation_history_row(donation, now) for donation in all_donations]
+    })
+
+
+# ---------------------------------------------------------------------
+# RECEIVER
+# ---------------------------------------------------------------------
+@async_app.route("/get_available_medicines", methods=["GET"])
+@conditional("donated_medicine", ttl=60)
+async def get_available_medicines():
+    if not logged_in_as("receiver"):
+        return unauthorized()
+
+    try:
+        available_medicines = await collection("donated_medicine").find(
+            {"status": "available"}
+        ).sort("created_at", -1).to_list(length=None)
+
+        today = datetime.now()
+        return jsonify({
+            "success": True,
+            "medicines": [available_medicine_row(medicine, today) for medicine in available_medicines]
+        })
+
+    except Exception:
+        log.exception("Error fetching available medicines")
+        return jsonify({"success": False, "message": "Server error"}), 500
+
+
+@async_app.route("/get_receiver_stats", methods=["GET"])
+@conditional("requests_medicine")
+async def get_receiver_stats():
+    user = logged_in_as("receiver")
+    if not user:
+        return unauthorized()
+
+    try:
+        all_requests = await collection("requests_medicine").find(
+            {"receiver_email": user["email"]}, {"status": 1, "quantity": 1}
+        ).to_list(length=None)
+
+        return jsonify({"success": True, "stats": receiver_stats(all_requests)})
+
+    except Exception:
+        log.exception("Error fetching receiver stats")
+        return jsonify({"success": True, "stats": EMPTY_RECEIVER_STATS})
+
+
+@async_app.route("/get_receiver_requests", methods=["GET"])
+@conditional("requests_medicine", ttl=60)
+async def get_receiver_requests():
+    user = logged_in_as("receiver")
+    if not user:
+        return unauthorized()
+
+    try:
+        all_requests = await collection("requests_medicine").find(
+            {"receiver_email": user["email"]}
+        ).sort("created_at", -1).to_list(length=None)
+
+        now = datetime.utcnow()
+        return jsonify({
+            "success": True,
+            "requests": [receiver_request_row(req, now) for req in all_requests]
+        })
+
+    except Exception:
+        log.exception("Error fetching receiver requests")
+        return jsonify({"success": False, "message": "Server error"}), 500
+
+
+# ---------------------------------------------------------------------
+# ADMIN
+# ---------------------------------------------------------------------
+@async_app.route("/get_admin_stats", methods=["GET"])
+@conditional("donar", "receiver", "admin", "donated_medicine", "requests_medicine", ttl=60)
+async def get_admin_stats():
+    if not logged_in_as("admin"):
+        return unauthorized()
+
+    try:
+        queries = admin_stat_queries(datetime.utcnow())
+        results = await asyncio.gather(*[
+            collection(collection_name).count_documents(query)
+            for collection_name, query in queries.values()
+        ])
+        counts = dict(zip(queries.keys(), results))
+
+        return jsonify({"success": True, "stats": admin_stats(counts)})
+
+    except Exception:
+        log.exception("Error fetching admin stats")
+        return jsonify({"success": True, "stats": EMPTY_ADMIN_STATS})
+
+
+@async_app.route("/get_all_donations_admin", methods=["GET"])
+@conditional("donated_medicine", ttl=60)
+async def get_all_donations_admin():
+    if not logged_in_as("admin"):
+        return unauthorized()
+
+    try:
+        all_donations = await collection("donated_medicine").find({}).sort("created_at", -1).to_list(length=None)
+
+        now = datetime.utcnow()
+        donations = [admin_donation_row(donation, now) for donation in all_donations]
+
+        return jsonify({
+            "success": True,
+            "donations": donations,
+            "counts": admin_donation_counts(donations)
+        })
+
+    except Exception:
+        log.exception("Error fetching donations")
+        return jsonify({"success": False, "message": "Server error"}), 500
+
+
+@async_app.route("/get_all_requests_admin", methods=["GET"])
+@conditional("requests_medicine", ttl=60)
+async def get_all_requests_admin():
+    if not logged_in_as("admin"):
+        return unauthorized()
+
+    try:
+        all_requests = await collection("requests_medicine").find({}).sort("created_at", -1).to_list(length=None)
+
+        now = datetime.utcnow()
+        requests = [admin_request_row(req, now) for req in all_requests]
+
+        return jsonify({
+            "success": True,
+            "requests": requests,
+            "counts": admin_request_counts(requests)
+        })
+
+    except Exception:
+        log.exception("Error fetching requests")
+        return jsonify({"success": False, "message": "Server error"}), 500
+
+
+@async_app.route("/get_recent_activity_admin", methods=["GET"])
+async def get_recent_activity_admin():
+    if not logged_in_as("admin"):
+        return unauthorized()
+
+    try:
+        since = parse_since(request.args.get("since"))
+        recent = await read_feed(10, since=since)
+
+        now = datetime.utcnow()
+        return jsonify({
+            "success": True,
+            "activities": [admin_activity_row(activity, now) for activity in recent],
+            "latest": iso(recent[0]["created_at"]) if recent else iso(since)
+        })
+
+    except Exception:
+        log.exception("Error fetching recent activity")
+        return jsonify({"success": False, "message": "Server error"}), 500
+
+
+# ---------------------------------------------------------------------
+# ASGI DISPATCH
+# ---------------------------------------------------------------------
+ASYNC_PATHS = {rule.rule for rule in async_app.url_map.iter_rules()}
+flask_asgi = WsgiToAsgi(sync_app.app)
+
+
+async def app(scope, receive, send):
+    if scope["type"] == "http" and scope["path"] not in ASYNC_PATHS:
+        await flask_asgi(scope, receive, send)
+    else:
+        # Async routes plus lifespan events (Mongo connect / close)
+        await async_app(scope, receive, send)
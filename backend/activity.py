@@ -0,0 +1,179 @@
+import logging
+from datetime import datetime
+
+from pymongo import ASCENDING, DESCENDING
+
+from backend.events import activity_recorded
+from backend.logs import fields
+
+log = logging.getLogger(__name__)
+
+
+# ---------------------------------------------------------------------
+# ACTIVITY FEED
+# ---------------------------------------------------------------------
+# Append-only log of everything that shows up in the dashboard feeds.
+# Write handlers call record_activity(); feeds are one indexed range
+# read on created_at (optionally narrowed to one actor) instead of
+# querying and merging several collections per request.
+#
+# {
+#     "type": "donation" | "request" | "registration" | "request_status"
+#             | "user_status" | "user_verified" | "prescription_verified",
+#     "actor_email", "actor_type", "actor_username",   # who it concerns
+#     "subject_id": str,                               # donation/request/user id
+#     "data": {...},                                   # snapshot for rendering
+#     "created_at": datetime
+# }
+
+ACTIVITY_COLLECTION = "activity"
+
+
+def ensure_activity_indexes(db):
+    activity = db[ACTIVITY_COLLECTION]
+    activity.create_index([("created_at", DESCENDING)])
+    activity.create_index([("actor_email", ASCENDING), ("created_at", DESCENDING)])
+
+
+def record_activity(db, activity_type, actor, subject_id=None, data=None, created_at=None):
+    """Append one activity. A failure here never fails the write it describes."""
+    activity = {
+        "type": activity_type,
+        "actor_email": actor.get("email"),
+        "actor_type": actor.get("user_type"),
+        "actor_username": actor.get("username"),
+        "subject_id": str(subject_id) if subject_id else None,
+        "data": data or {},
+        "created_at": created_at or datetime.utcnow()
+    }
+    try:
+        db[ACTIVITY_COLLECTION].insert_one(activity)
+        activity_recorded(activity)
+    except Exception as e:
+        log.warning("Could not record activity", exc_info=True, extra=fields(activity_type=activity_type))
+
+
+def parse_since(value):
+    """Parse the ?since= ISO timestamp of incremental feed polls"""
+    if not value:
+        return None
+    try:
+        return datetime.fromisoformat(value.replace("Z", "+00:00")).replace(tzinfo=None)
+    except ValueError:
+        return None
+
+
+def feed_query(since=None, actor_email=None, activity_type=None):
+    query = {}
+    if actor_email:
+        query["actor_email"] = actor_email
+    if activity_type:
+        query["type"] = activity_type
+    if since:
+        query["created_at"] = {"$gt": since}
+    return query
+
+
+def read_feed(db, limit, since=None, actor_email=None, activity_type=None):
+    """Newest first activities, optionally only those newer than since"""
+    return list(
+        db[ACTIVITY_COLLECTION]
+        .find(feed_query(since, actor_email, activity_type))
+        .sort("created_at", DESCENDING)
+        .limit(limit)
+    )
+
+
+# ---------------------------------------------------------------------
+# BACKFILL
+# ---------------------------------------------------------------------
+def backfill_activity(db, batch_size=1000):
+    """Build the feed from existing documents the first time it is created"""
+    activity = db[ACTIVITY_COLLECTION]
+    if activity.estimated_document_count() > 0:
+        return 0
+
+    def donation_activities():
+        for donation in db["donated_medicine"].find({}):
+            yield {
+                "type": "donation",
+                "actor_email": donation.get("email"),
+                "actor_type": "donor",
+                "actor_username": donation.get("username"),
+                "subject_id": str(donation["_id"]),
+                "data": donation_activity_data(donation),
+                "created_at": donation.get("created_at") or donation["_id"].generation_time.replace(tzinfo=None)
+            }
+
+    def request_activities():
+        for req in db["requests_medicine"].find({}):
+            yield {
+                "type": "request",
+                "actor_email": req.get("receiver_email"),
+                "actor_type": "receiver",
+                "actor_username": req.get("receiver_username"),
+                "subject_id": str(req["_id"]),
+                "data": request_activity_data(req),
+                "created_at": req.get("created_at") or req["_id"].generation_time.replace(tzinfo=None)
+            }
+
+    def registration_activities(collection_name, user_type):
+        for user in db[collection_name].find({}, {"password": 0}):
+            yield {
+                "type": "registration",
+                "actor_email": user.get("email"),
+                "actor_type": user_type,
+                "actor_username": user.get("username"),
+                "subject_id": str(user["_id"]),
+                "data": {},
+                "created_at": user.get("created_at") or user["_id"].generation_time.replace(tzinfo=None)
+            }
+
+    sources = [
+        donation_activities(),
+        request_activities(),
+        registration_activities("donar", "donor"),
+        registration_activities("receiver", "receiver"),
+    ]
+
+    inserted = 0
+    batch = []
+    for source in sources:
+        for doc in source:
+            batch.append(doc)
+            if len(batch) >= batch_size:
+                activity.insert_many(batch, ordered=False)
+                inserted += len(batch)
+                batch = []
+    if batch:
+        activity.insert_many(batch, ordered=False)
+        inserted += len(batch)
+
+    return inserted
+
+
+# Enough of the document for the dashboards to render its list row
+# from the pushed event (backend/events.py event_row)
+def donation_activity_data(donation):
+    return {
+        "medicine_name": donation.get("medicineName"),
+        "manufacturer": donation.get("manufacturer"),
+        "quantity": donation.get("quantity"),
+        "expiry_date": donation.get("expiryDate"),
+        "category": donation.get("category"),
+        "condition": donation.get("condition"),
+        "image": donation.get("image"),
+        "status": donation.get("status", "available")
+    }
+
+
+def request_activity_data(req):
+    return {
+        "medicine_name": req.get("medicine_name"),
+        "dosage": req.get("dosage"),
+        "quantity": req.get("quantity"),
+        "urgency": req.get("urgency"),
+        "preferred_location": req.get("preferred_location"),
+        "prescription": req.get("prescription"),
+        "status": req.get("status", "pending")
+    }
@@ -0,0 +1,196 @@
+import gzip
+import hashlib
+import json
+import logging
+import mimetypes
+import os
+import re
+
+from flask import request, send_from_directory
+from jinja2 import ChoiceLoader, FileSystemLoader
+from werkzeug.security import safe_join
+
+from backend.blobs import immutable_cache_headers
+
+try:
+    import brotli
+except ImportError:  # .br files are skipped, gzip is always built
+    brotli = None
+
+try:
+    import rcssmin
+    import rjsmin
+except ImportError:  # fall back to the whitespace minifiers below
+    rcssmin = rjsmin = None
+
+log = logging.getLogger(__name__)
+
+
+# ---------------------------------------------------------------------
+# STATIC ASSET BUILD
+# ---------------------------------------------------------------------
+#   python -m backend.assets
+#
+# Moves the inline <style>/<script> blocks of every template into
+# minified, fingerprinted files under static/assets/ (plus .gz and .br
+# precompressed copies) and writes the rewritten templates, which only
+# link to them, to templates/dist/. Blocks containing Jinja stay inline,
+# so page data is passed to the scripts through small inline blocks.
+#
+# When the build output exists the app renders templates/dist/ first
+# and serves /assets/<name> with one year immutable caching; a file's
+# name changes whenever its content does. Re-run the build after
+# editing a template.
+
+TEMPLATE_FOLDER = "templates"
+DIST_FOLDER = os.path.join(TEMPLATE_FOLDER, "dist")
+ASSET_FOLDER = os.path.join("static", "assets")
+MANIFEST_PATH = os.path.join(ASSET_FOLDER, "manifest.json")
+ASSET_URL = "/assets"
+
+# Smaller blocks cost more as a request than inline
+MIN_ASSET_SIZE = 512
+
+INLINE_BLOCK = re.compile(r"<(style|script)(\s[^>]*)?>(.*?)</\1\s*>", re.S | re.I)
+JINJA_SYNTAX = re.compile(r"\{\{|\{%|\{#")
+SCRIPT_TYPES = {"", "text/javascript", "application/javascript", "module"}
+
+
+def minify_css(css):
+    if rcssmin:
+        return rcssmin.cssmin(css)
+    css = re.sub(r"/\*.*?\*/", "", css, flags=re.S)
+    css = re.sub(r"\s+", " ", css)
+    css = re.sub(r"\s*([{};,>])\s*", r"\1", css)
+    return css.replace(";}", "}").strip()
+
+
+def minify_js(js):
+    if rjsmin:
+        return rjsmin.jsmin(js)
+    # Conservative: indentation, blank lines and whole line // comments
+    lines = []
+    for line in js.splitlines():
+        stripped = line.strip()
+        if not stripped or stripped.startswith("//"):
+            continue
+        lines.append(stripped)
+    return "\n".join(lines)
+
+
+def write_asset(content, ext):
+    """Write content (and its precompressed copies); returns the file name"""
+    data = content.encode("utf-8")
+    name = f"{hashlib.sha256(data).hexdigest()[:16]}.{ext}"
+    path = os.path.join(ASSET_FOLDER, name)
+
+    if not os.path.exists(path):
+        with open(path, "wb") as f:
+            f.write(data)
+        with open(path + ".gz", "wb") as f:
+            # mtime=0 keeps rebuilds byte identical
+            f.write(gzip.compress(data, compresslevel=9, mtime=0))
+        if brotli:
+            with open(path + ".br", "wb") as f:
+                f.write(brotli.compress(data, quality=11))
+    return name
+
+
+def block_type(tag, attrs):
+    if tag == "style":
+        return "css"
+    kind = re.search(r"""type\s*=\s*["']?([^"'\s>]+)""", attrs)
+    return "js" if (kind.group(1).lower() if kind else "") in SCRIPT_TYPES else None
+
+
+def extract_blocks(html, assets):
+    """html with its static inline blocks replaced by links to asset files"""
+
+    def replace(match):
+        tag, attrs, body = match.group(1).lower(), match.group(2) or "", match.group(3)
+        kind = block_type(tag, attrs)
+        if kind is None or JINJA_SYNTAX.search(body) or len(body.strip()) < MIN_ASSET_SIZE:
+            return match.group(0)
+
+        if kind == "css":
+            name = write_asset(minify_css(body), "css")
+            tag_html = f'<link rel="stylesheet" href="{ASSET_URL}/{name}"{attrs}>'
+        else:
+            name = write_asset(minify_js(body), "js")
+            tag_html = f'<script src="{ASSET_URL}/{name}"{attrs}></script>'
+        assets.append(name)
+        return tag_html
+
+    return INLINE_BLOCK.sub(replace, html)
+
+
+def build():
+    os.makedirs(ASSET_FOLDER, exist_ok=True)
+    os.makedirs(DIST_FOLDER, exist_ok=True)
+
+    manifest = {}
+    for filename in sorted(os.listdir(TEMPLATE_FOLDER)):
+        source = os.path.join(TEMPLATE_FOLDER, filename)
+        if not filename.endswith(".html") or not os.path.isfile(source):
+            continue
+
+        with open(source, encoding="utf-8") as f:
+            html = f.read()
+
+        assets = []
+        with open(os.path.join(DIST_FOLDER, filename), "w", encoding="utf-8") as f:
+            f.write(extract_blocks(html, assets))
+
+        manifest[filename] = {
+            "source_sha256": hashlib.sha256(html.encode("utf-8")).hexdigest(),
+            "assets": assets
+        }
+        print(f"✅ {filename}: {len(html) // 1024} KB, {len(assets)} assets extracted")
+
+    with open(MANIFEST_PATH, "w") as f:
+        json.dump(manifest, f, indent=2)
+    return manifest
+
+
+# ---------------------------------------------------------------------
+# SERVING
+# ---------------------------------------------------------------------
+def use_built_templates(app):
+    """Render templates/dist/ first when the asset build has been run"""
+    if not os.path.exists(MANIFEST_PATH):
+        return False
+
+    with open(MANIFEST_PATH) as f:
+        manifest = json.load(f)
+    for filename, entry in manifest.items():
+        source = os.path.join(TEMPLATE_FOLDER, filename)
+        if os.path.exists(source):
+            with open(source, "rb") as f:
+                if hashlib.sha256(f.read()).hexdigest() != entry["source_sha256"]:
+                    log.warning("%s changed since the asset build, run: python -m backend.assets", filename)
+
+    app.jinja_loader = ChoiceLoader([FileSystemLoader(DIST_FOLDER), app.jinja_loader])
+    return True
+
+
+def send_asset(filename):
+    """Serve a built asset, precompressed when the client accepts it"""
+    mimetype = mimetypes.guess_type(filename)[0]
+    response = None
+
+    for encoding, suffix in (("br", ".br"), ("gzip", ".gz")):
+        path = safe_join(ASSET_FOLDER, filename + suffix)
+        if request.accept_encodings[encoding] and path and os.path.exists(path):
+            response = send_from_directory(ASSET_FOLDER, filename + suffix, mimetype=mimetype)
+            response.headers["Content-Encoding"] = encoding
+            break
+
+    if response is None:
+        response = send_from_directory(ASSET_FOLDER, filename, mimetype=mimetype)
+
+    response.vary.add("Accept-Encoding")
+    return immutable_cache_headers(response)
+
+
+if __name__ == "__main__":
+    build()
@@ -0,0 +1,325 @@
+import logging
+import os
+import re
+import shutil
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+from pymongo import ASCENDING, ReturnDocument, UpdateOne
+
+from backend.images import make_renditions, remove_metadata, submit_image_task
+from backend.metrics import cache_lookup, upload_stored
+from backend.uploads import HashingFile, STAGING_FOLDER
+
+log = logging.getLogger(__name__)
+
+
+# ---------------------------------------------------------------------
+# CONTENT ADDRESSED UPLOADS
+# ---------------------------------------------------------------------
+# Uploaded files are named by the SHA-256 of their bytes, so a file
+# uploaded many times is stored once. Each stored file has a document
+# in the blobs collection counting the records that point at it:
+#
+# {
+#     "_id": "<bucket>/<sha256>.<ext>",
+#     "bucket": "medicine_images" | "profile_images" | "prescriptions",
+#     "name": "<sha256>.<ext>",
+#     "refs": int,
+#     "size": int,
+#     "renditions": {...},      # set once the WebP renditions exist
+#     "phash": str,             # prescriptions: hash of the content
+#     "deleting": datetime,     # claimed by the reaper, files being removed
+#     "created_at", "updated_at"
+# }
+#
+# A name never changes content, so photo URLs can be cached forever by
+# anyone. Prescriptions are medical records: never stored by browsers
+# or shared caches.
+# The bytes live in the configured storage backend (backend/storage.py)
+# under the key "<bucket>/<name>", the same as the blob _id.
+#
+# The reaper (backend/reaper.py) claims a blob before deleting its files
+# by setting "deleting" while refs <= 0. A reference added after that
+# finds the mark: put() waits for the reaper to finish and stores the
+# bytes again, since the copy in storage may be gone.
+
+BLOBS_COLLECTION = "blobs"
+DELETION_QUEUE_COLLECTION = "deletion_queue"
+DELETION_GRACE = timedelta(seconds=int(os.getenv("DELETION_GRACE_SECONDS", "60")))
+CHUNK_SIZE = 64 * 1024
+IMMUTABLE_MAX_AGE = 365 * 24 * 3600
+# Longest wait for the reaper to finish with a blob referenced again
+DELETION_WAIT_SECONDS = float(os.getenv("DELETION_WAIT_SECONDS", "10"))
+
+BLOB_NAME = re.compile(r"^[0-9a-f]{64}(_[a-z]+)?\.[A-Za-z0-9]+$")
+
+# Photos shown to other users: cached publicly (blob_cache_headers) and
+# stored without their metadata, so they only come in through the form
+# (put), never as direct uploads
+IMAGE_BUCKETS = ("medicine_images", "profile_images")
+
+
+class BlobStore:
+    """Reference counted, deduplicated files in one storage bucket"""
+
+    def __init__(self, db, bucket, storage):
+        self.db = db
+        self.blobs = db[BLOBS_COLLECTION]
+        self.bucket = bucket
+        self.storage = storage
+
+    def key(self, name):
+        return f"{self.bucket}/{name}"
+
+    def url_prefix(self):
+        return self.storage.url_prefix(self.bucket)
+
+    def url(self, name):
+        return self.storage.url(self.key(name))
+
+    def add_reference(self, name, size):
+        # Count the reference before the file is in place, so a
+        # concurrent release of the last reference cannot remove it
+        now = datetime.utcnow()
+        return self.blobs.find_one_and_update(
+            {"_id": self.key(name)},
+            {
+                "$inc": {"refs": 1},
+                "$set": {"updated_at": now, "size": size},
+                "$setOnInsert": {"bucket": self.bucket, "name": name, "created_at": now}
+            },
+            upsert=True,
+            return_document=ReturnDocument.AFTER
+        )
+
+    def wait_for_reaper(self, name):
+        """Until the reaper has finished deleting the files of a claimed blob.
+
+        Gives up after DELETION_WAIT_SECONDS: a mark that old was left
+        by a reaper that died, and the next reaper pass clears it.
+        """
+        deadline = time.monotonic() + DELETION_WAIT_SECONDS
+        while time.monotonic() < deadline:
+            if self.blobs.find_one({"_id": self.key(name), "deleting": {"$exists": True}}, {"_id": 1}) is None:
+                return
+            time.sleep(0.05)
+
+    def put(self, file, ext):
+        """Store an uploaded file (or any readable stream); returns its blob document"""
+        stream = getattr(file, "stream", file)
+        if not isinstance(stream, HashingFile):
+            # Not parsed by UploadRequest: stage it here, chunk by chunk
+            staged = HashingFile()
+            try:
+                shutil.copyfileobj(stream, staged, CHUNK_SIZE)
+            except Exception:
+                staged.discard()
+                raise
+            stream = staged
+
+        if self.bucket in IMAGE_BUCKETS:
+            # Named (and so given a URL) by the hash of the stripped file
+            try:
+                stream.flush()
+                if remove_metadata(stream.path):
+                    stream.reload()
+            except Exception:
+                stream.discard()
+                raise
+
+        name = f"{stream.hexdigest()}.{ext.lower()}"
+        blob = None
+        try:
+            blob = self.add_reference(name, stream.size)
+            claimed = "deleting" in blob
+            if claimed:
+                # The stored copy is being deleted: store it again after
+                self.wait_for_reaper(name)
+            self.storage.save(self.key(name), stream, replace=claimed)
+        except Exception:
+            stream.discard()
+            if blob is not None:
+                # No record will point at it: take the reference back
+                try:
+                    self.release(name)
+                except Exception:
+                    log.warning("Could not release %s after a failed save", self.key(name), exc_info=True)
+            raise
+
+        upload_stored(self.bucket, stream.size, "form")
+        cache_lookup("upload_dedup", blob["refs"] > 1)
+        return blob
+
+    # -----------------------------------------------------------------
+    # Direct uploads (presigned)
+    # -----------------------------------------------------------------
+    def presign(self, sha256_hex, ext, size, content_type):
+        """Where the client should upload a file with this hash and size.
+
+        upload is None when the file is already stored (nothing to send)
+        or when the backend cannot take direct uploads (use the form).
+        """
+        name = f"{sha256_hex.lower()}.{ext.lower()}"
+        if not BLOB_NAME.match(name):
+            return None
+        if self.bucket in IMAGE_BUCKETS:
+            # The client's bytes still carry their metadata: use the form
+            return {"name": name, "exists": False, "upload": None}
+        if self.storage.size(self.key(name)) == size:
+            return {"name": name, "exists": True, "upload": None}
+        upload = self.storage.presigned_upload(self.key(name), size, sha256_hex.lower(), content_type)
+        return {"name": name, "exists": False, "upload": upload}
+
+    def adopt(self, name):
+        """Reference a file the client uploaded straight to storage"""
+        if not name or not BLOB_NAME.match(name) or self.bucket in IMAGE_BUCKETS:
+            return None
+        size = self.storage.size(self.key(name))
+        if size is None:
+            return None
+        blob = self.add_reference(name, size)
+        if "deleting" in blob:
+            # Only the client has the bytes: usable only if they survived
+            self.wait_for_reaper(name)
+            if self.storage.size(self.key(name)) is None:
+                self.release(name)
+                return None
+        upload_stored(self.bucket, size, "direct")
+        return blob
+
+    # -----------------------------------------------------------------
+    # Renditions
+    # -----------------------------------------------------------------
+    def set_renditions(self, name, renditions):
+        self.blobs.update_one(
+            {"_id": self.key(name)},
+            {"$set": {"renditions": renditions, "updated_at": datetime.utcnow()}}
+        )
+
+    def build_renditions(self, blob, on_done):
+        """on_done(renditions) once they exist, reusing those of an identical upload"""
+        if blob.get("renditions"):
+            on_done(blob["renditions"])
+            return
+
+        def finished(renditions):
+            self.set_renditions(blob["name"], renditions)
+            on_done(renditions)
+
+        self.run_image_task(blob, make_renditions, lambda renditions: renditions.values(), finished)
+
+    def run_image_task(self, blob, task, output_files, on_done):
+        """Run task(source_path, output_dir) on a stored file in the image pool.
+
+        output_files(result) names the files the task wrote next to the
+        source; with remote storage they are uploaded before on_done(result).
+        """
+        name = blob["name"]
+        source = self.storage.local_path(self.key(name))
+        workdir = None
+        if source is None:
+            # Remote storage: work on a local copy, then upload the results
+            os.makedirs(STAGING_FOLDER, exist_ok=True)
+            workdir = tempfile.mkdtemp(dir=STAGING_FOLDER)
+            source = os.path.join(workdir, name)
+            self.storage.download(self.key(name), source)
+
+        def finished(result):
+            if workdir:
+                for output_name in output_files(result):
+                    self.storage.upload_file(self.key(output_name), os.path.join(workdir, output_name))
+                shutil.rmtree(workdir, ignore_errors=True)
+            on_done(result)
+
+        if submit_image_task(task, source, os.path.dirname(source), finished) is None and workdir:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    # -----------------------------------------------------------------
+    # Release
+    # -----------------------------------------------------------------
+    def release(self, name, renditions=None):
+        """Drop one reference; the file and its renditions go with the last one"""
+        if not name:
+            return False
+
+        blob = self.blobs.find_one_and_update(
+            {"_id": self.key(name)},
+            {"$inc": {"refs": -1}, "$set": {"updated_at": datetime.utcnow()}},
+            return_document=ReturnDocument.AFTER
+        )
+
+        if blob is None:
+            # Uploaded before the blob store: the file belongs to one record
+            self.delete_files(name, renditions)
+            return True
+
+        if blob["refs"] > 0:
+            return False
+
+        deleted = self.blobs.delete_one({"_id": blob["_id"], "refs": {"$lte": 0}})
+        if deleted.deleted_count:
+            self.delete_files(name, blob.get("renditions") or renditions, blob_id=blob["_id"])
+            return True
+        return False
+
+    def delete_files(self, name, renditions=None, blob_id=None):
+        """Queue a file and its renditions for the background reaper"""
+        names = [name] + list((renditions or {}).values())
+        enqueue_deletion(self.db, [self.key(n) for n in names], blob_id=blob_id)
+
+
+# ---------------------------------------------------------------------
+# DEFERRED DELETION
+# ---------------------------------------------------------------------
+# Files are not deleted inside requests. Their storage keys go to the
+# deletion queue and backend/reaper.py removes them in batches:
+#
+# {
+#     "_id": "<bucket>/<name>",        # storage key
+#     "blob_id": "<bucket>/<name>",    # blob it belongs to, if any
+#     "not_before": datetime,          # end of the grace period
+#     "enqueued_at": datetime
+# }
+
+def ensure_deletion_indexes(db):
+    db[DELETION_QUEUE_COLLECTION].create_index([("not_before", ASCENDING)])
+
+
+def enqueue_deletion(db, keys, blob_id=None, delay=DELETION_GRACE):
+    """Queue storage keys for deletion by the reaper"""
+    now = datetime.utcnow()
+    operations = [
+        UpdateOne(
+            {"_id": key},
+            {
+                "$set": {"blob_id": blob_id, "not_before": now + delay},
+                "$setOnInsert": {"enqueued_at": now}
+            },
+            upsert=True
+        )
+        for key in keys
+    ]
+    if operations:
+        db[DELETION_QUEUE_COLLECTION].bulk_write(operations, ordered=False)
+    return len(operations)
+
+
+def is_blob_path(path):
+    """True for URLs of content addressed files (and their renditions)"""
+    return bool(BLOB_NAME.match(path.rsplit("/", 1)[-1]))
+
+
+def immutable_cache_headers(response):
+    response.headers["Cache-Control"] = f"public, max-age={IMMUTABLE_MAX_AGE}, immutable"
+    return response
+
+
+def blob_cache_headers(response, path):
+    """Cache-Control for a blob URL, by the bucket in its path"""
+    bucket = path.rsplit("/", 2)[-2] if path.count("/") >= 2 else None
+    if bucket in IMAGE_BUCKETS:
+        return immutable_cache_headers(response)
+    response.headers["Cache-Control"] = "private, no-store"
+    return response
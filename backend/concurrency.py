@@ -0,0 +1,39 @@
+import contextvars
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+
+# ---------------------------------------------------------------------
+# PARALLEL QUERY FAN-OUT
+# ---------------------------------------------------------------------
+# pymongo clients are thread safe and pool their connections, so
+# independent queries inside one request can be issued from a small
+# shared thread pool. The request then waits roughly as long as its
+# slowest query instead of the sum of all of them.
+
+QUERY_POOL_SIZE = int(os.getenv("QUERY_POOL_SIZE", "16"))
+
+query_pool = ThreadPoolExecutor(max_workers=QUERY_POOL_SIZE, thread_name_prefix="query")
+
+
+def run_parallel(calls):
+    """Run independent zero-argument callables concurrently.
+
+    Takes a dict of name -> callable and returns a dict of name -> result.
+    The first exception raised by any call is re-raised. Must not be
+    called from inside a query_pool thread.
+    """
+    futures = {
+        # Copy the caller's context so per-request state follows the query
+        name: query_pool.submit(contextvars.copy_context().run, call)
+        for name, call in calls.items()
+    }
+    return {name: future.result() for name, future in futures.items()}
+
+
+def count_all(db, queries):
+    """Concurrently count_documents for a dict of name -> (collection, filter)"""
+    return run_parallel({
+        name: (lambda c=collection_name, q=query: db[c].count_documents(q))
+        for name, (collection_name, query) in queries.items()
+    })
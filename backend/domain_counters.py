@@ -0,0 +1,221 @@
+import logging
+import os
+import threading
+import time
+from collections import Counter, OrderedDict
+from datetime import datetime, timedelta
+
+from pymongo import DESCENDING
+from pymongo.errors import PyMongoError
+
+from backend.invalidation import bus
+
+log = logging.getLogger(__name__)
+
+
+# ---------------------------------------------------------------------
+# DOMAIN COUNTERS
+# ---------------------------------------------------------------------
+# Donations by status and pending requests by urgency, kept up to date
+# from the invalidation bus instead of counted on demand. The counters
+# are seeded with one $group per collection (status, urgency, and the
+# expiry date of available donations expiring within 30 days); after
+# that each change event re-reads only the changed document and applies
+# -1 to its previous state and +1 to its new one.
+#
+# The previous state is known for the TRACKED_DOCUMENTS most recently
+# changed documents of each collection (seeded from the updated_at
+# index). Any other document created after the seed started was not
+# grouped, so it has no previous state to take back: polling reports
+# inserts as updates, and this is how they are told apart. A change to
+# any other document, or a delete polling cannot see, is caught up by
+# grouping again: within RECOUNT_DELAY when a
+# change could not be applied, when the date moves the expiry window,
+# and every RESEED_INTERVAL otherwise.
+
+RESEED_INTERVAL = float(os.getenv("DOMAIN_COUNTERS_RESEED_INTERVAL", str(60 * 60)))
+TRACKED_DOCUMENTS = int(os.getenv("DOMAIN_COUNTERS_TRACKED", "10000"))
+RECOUNT_DELAY = 30
+# expiry_info(): "expiring_soon" is 0-30 whole days left, an expiry date
+# after today and at most 31 days ahead
+EXPIRING_DAYS = 31
+
+DONATION_FIELDS = {"status": 1, "expiryDate": 1}
+REQUEST_FIELDS = {"status": 1, "urgency": 1}
+
+
+def donation_state(doc):
+    return (doc.get("status", "available"), doc.get("expiryDate"))
+
+
+def request_state(doc):
+    return (doc.get("status", "pending"), doc.get("urgency", "normal"))
+
+
+STATES = {
+    "donated_medicine": (DONATION_FIELDS, donation_state),
+    "requests_medicine": (REQUEST_FIELDS, request_state),
+}
+
+
+def expiring_window(today):
+    """(after, until): YYYY-MM-DD bounds of the expiry dates expiring soon"""
+    return today.isoformat(), (today + timedelta(days=EXPIRING_DAYS)).isoformat()
+
+
+def donation_groups(window):
+    after, until = window
+    in_window = {"$and": [{"$gt": ["$expiryDate", after]}, {"$lte": ["$expiryDate", until]}]}
+    return [{"$group": {
+        "_id": {
+            "status": {"$ifNull": ["$status", "available"]},
+            "expiry": {"$cond": [in_window, "$expiryDate", None]},
+        },
+        "count": {"$sum": 1},
+    }}]
+
+
+REQUEST_GROUPS = [{"$group": {
+    "_id": {"status": {"$ifNull": ["$status", "pending"]}, "urgency": {"$ifNull": ["$urgency", "normal"]}},
+    "count": {"$sum": 1},
+}}]
+
+
+class DomainCounters:
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.db = None
+        # collection -> {_id: state}, least recently changed first
+        self.tracked = {name: OrderedDict() for name in STATES}
+        self.donation_status = Counter()
+        self.expiring = Counter()              # expiryDate -> available donations
+        self.window = None
+        self.request_status_urgency = Counter()
+        self.seeded_at = None
+        self.seed_started = None
+        self.stale = False
+
+    def start(self, db):
+        self.db = db
+        self.reseed()
+        bus.subscribe(self.on_change, list(STATES))
+        threading.Thread(target=self._reseed_loop, name="domain-counters", daemon=True).start()
+
+    def reseed(self):
+        started = datetime.utcnow()
+        window = expiring_window(datetime.utcnow().date())
+        donation_status, expiring = Counter(), Counter()
+        for group in self.db["donated_medicine"].aggregate(donation_groups(window)):
+            status, expiry = group["_id"]["status"], group["_id"].get("expiry")
+            donation_status[status] += group["count"]
+            if status == "available" and expiry:
+                expiring[expiry] += group["count"]
+        request_status_urgency = Counter({
+            (group["_id"]["status"], group["_id"]["urgency"]): group["count"]
+            for group in self.db["requests_medicine"].aggregate(REQUEST_GROUPS)
+        })
+        tracked = {name: self.recent_states(name) for name in STATES}
+
+        with self._lock:
+            self.donation_status = donation_status
+            self.expiring = expiring
+            self.window = window
+            self.request_status_urgency = request_status_urgency
+            self.tracked = tracked
+            self.seeded_at = datetime.utcnow()
+            self.seed_started = started
+            self.stale = False
+
+    def recent_states(self, name):
+        fields, make_state = STATES[name]
+        docs = self.db[name].find({}, fields).sort("updated_at", DESCENDING).limit(TRACKED_DOCUMENTS)
+        return OrderedDict((doc["_id"], make_state(doc)) for doc in reversed(list(docs)))
+
+    def due(self):
+        if self.seeded_at is None:
+            return True
+        return (
+            self.stale
+            or self.window != expiring_window(datetime.utcnow().date())
+            or (datetime.utcnow() - self.seeded_at).total_seconds() >= RESEED_INTERVAL
+        )
+
+    def _reseed_loop(self):
+        while True:
+            time.sleep(RECOUNT_DELAY)
+            if not self.due():
+                continue
+            try:
+                self.reseed()
+            except PyMongoError as e:
+                log.warning("Domain counters reseed failed: %s", e)
+
+    def on_change(self, event):
+        if event.operation == "resync":
+            self.reseed()
+            return
+        if event.document_id is None:
+            return
+
+        fields, make_state = STATES[event.collection]
+        doc = None
+        if event.operation != "delete":
+            doc = self.db[event.collection].find_one({"_id": event.document_id}, {**fields, "created_at": 1})
+        new = make_state(doc) if doc else None
+
+        with self._lock:
+            tracked = self.tracked[event.collection]
+            if event.document_id in tracked:
+                self.count(event.collection, tracked.pop(event.document_id), -1)
+            elif event.operation != "insert" and not self.created_since_seed(doc):
+                # Changed from a state this process does not know
+                self.stale = True
+                return
+            if new:
+                self.count(event.collection, new, 1)
+                tracked[event.document_id] = new
+                if len(tracked) > TRACKED_DOCUMENTS:
+                    tracked.popitem(last=False)
+
+    def created_since_seed(self, doc):
+        """True for a document the seed's $group could not have counted"""
+        created_at = (doc or {}).get("created_at")
+        return isinstance(created_at, datetime) and created_at >= self.seed_started
+
+    def count(self, collection, state, delta):
+        """Move the counters of one document state by delta (lock held)"""
+        if collection == "requests_medicine":
+            self.request_status_urgency[state] += delta
+            return
+        status, expiry_date = state
+        self.donation_status[status] += delta
+        after, until = self.window
+        if status == "available" and isinstance(expiry_date, str) and after < expiry_date <= until:
+            self.expiring[expiry_date] += delta
+
+    def expiring_soon(self):
+        """Available donations expiring within 30 days"""
+        after, until = expiring_window(datetime.utcnow().date())
+        with self._lock:
+            return sum(count for expiry_date, count in self.expiring.items() if after < expiry_date <= until)
+
+    def snapshot(self):
+        expiring_soon = self.expiring_soon()
+        with self._lock:
+            return {
+                "donations_by_status": {k: v for k, v in self.donation_status.items() if v},
+                "pending_requests_by_urgency": {
+                    urgency: count for (status, urgency), count in self.request_status_urgency.items()
+                    if status == "pending" and count
+                },
+                "donations_expiring_soon": expiring_soon,
+            }
+
+
+domain_counters = DomainCounters()
+
+
+def start_domain_counters(db):
+    domain_counters.start(db)
+    return domain_counters
@@ -0,0 +1,372 @@
+import json
+import logging
+import os
+import queue
+import threading
+import time
+from datetime import datetime
+
+from pymongo.errors import OperationFailure, PyMongoError
+
+from backend.serializers import (
+    admin_donation_row, admin_request_row, available_medicine_row, donor_feed_row, iso,
+    receiver_request_row,
+)
+
+log = logging.getLogger(__name__)
+
+
+# ---------------------------------------------------------------------
+# DASHBOARD EVENT PUSH (SERVER-SENT EVENTS)
+# ---------------------------------------------------------------------
+# Every change the dashboards care about is already appended to the
+# activity collection, so activity inserts are the event source:
+#
+# * On a replica set, ActivityWatcher tails a change stream on the
+#   activity collection and publishes each insert to the in-process
+#   broker. Writes made by any app process reach every process.
+# * On a standalone mongod change streams are unavailable; then
+#   record_activity() publishes straight to the broker instead, so
+#   clients connected to the same process still get pushed updates.
+#
+# Dashboards apply each event to what they already show: stats_delta
+# to the stat cards, and row (built by the same serializer as the list
+# endpoint) to their lists. They only refetch when the stream sends
+# "resync": the replay after a reconnect did not cover the gap, or the
+# subscriber queue overflowed and events were dropped.
+#
+# Each connected dashboard holds one subscriber queue on the broker,
+# and one gthread thread for as long as the page stays open. Streams
+# are capped per worker at SSE_MAX_CONNECTIONS, half the worker's
+# threads by default, so open dashboards cannot take every thread from
+# ordinary requests. A dashboard over the cap gets 503 and retries
+# after SSE_RETRY_SECONDS.
+
+SUBSCRIBER_QUEUE_SIZE = 100
+# Activities replayed on reconnect; a longer gap is a resync
+REPLAY_LIMIT = 100
+KEEPALIVE_SECONDS = 15
+SSE_MAX_CONNECTIONS = int(os.getenv(
+    "SSE_MAX_CONNECTIONS", str(max(1, int(os.getenv("GUNICORN_THREADS", "8")) // 2))
+))
+SSE_RETRY_SECONDS = 30
+
+
+class Subscriber(queue.Queue):
+    """One dashboard's event queue; overflowed once an event was dropped"""
+
+    def __init__(self):
+        super().__init__(maxsize=SUBSCRIBER_QUEUE_SIZE)
+        self.overflowed = False
+
+
+class EventBroker:
+    """In-process fan-out of events to subscriber queues"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._subscribers = set()
+
+    def subscribe(self):
+        """New subscriber queue, or None when the worker is at its cap"""
+        subscriber = Subscriber()
+        with self._lock:
+            if len(self._subscribers) >= SSE_MAX_CONNECTIONS:
+                return None
+            self._subscribers.add(subscriber)
+        return subscriber
+
+    def unsubscribe(self, subscriber):
+        with self._lock:
+            self._subscribers.discard(subscriber)
+
+    def publish(self, event):
+        with self._lock:
+            subscribers = list(self._subscribers)
+        for subscriber in subscribers:
+            try:
+                subscriber.put_nowait(event)
+            except queue.Full:
+                # Slow client; the stream tells it to resync
+                subscriber.overflowed = True
+
+    def subscriber_count(self):
+        with self._lock:
+            return len(self._subscribers)
+
+
+broker = EventBroker()
+
+
+# ---------------------------------------------------------------------
+# CHANGE STREAM WATCHER
+# ---------------------------------------------------------------------
+class ActivityWatcher(threading.Thread):
+    """Publish activity inserts from a change stream, with reconnects"""
+
+    def __init__(self, activity_collection):
+        super().__init__(name="activity-watcher", daemon=True)
+        self.activity_collection = activity_collection
+        self.active = False
+        self.unsupported = False
+        self._resume_token = None
+
+    def run(self):
+        backoff = 1
+        while not self.unsupported:
+            try:
+                with self.activity_collection.watch(
+                    [{"$match": {"operationType": "insert"}}],
+                    resume_after=self._resume_token
+                ) as stream:
+                    self.active = True
+                    backoff = 1
+                    log.info("Activity change stream connected")
+                    for change in stream:
+                        self._resume_token = stream.resume_token
+                        broker.publish(change["fullDocument"])
+            except OperationFailure as e:
+                self.active = False
+                # 40573: change streams are only supported on replica sets
+                if e.code == 40573 or "replica set" in str(e).lower():
+                    self.unsupported = True
+                    log.warning("Change streams unavailable, using in-process events")
+                    return
+                log.warning("Activity change stream failed: %s", e)
+                self._resume_token = None
+            except PyMongoError as e:
+                self.active = False
+                log.warning("Activity change stream disconnected: %s", e)
+
+            time.sleep(backoff)
+            backoff = min(backoff * 2, 30)
+
+
+watcher = None
+
+
+def start_activity_watcher(db):
+    global watcher
+    if watcher is None:
+        watcher = ActivityWatcher(db["activity"])
+        watcher.start()
+    return watcher
+
+
+def activity_recorded(activity):
+    """Called by record_activity(); publishes locally when not watching"""
+    if watcher is None or not watcher.active:
+        broker.publish(activity)
+
+
+# ---------------------------------------------------------------------
+# PER ROLE EVENTS
+# ---------------------------------------------------------------------
+REQUEST_STAT_KEYS = ("pending", "approved", "completed", "cancelled")
+
+
+def status_delta(keys, previous, new):
+    delta = {}
+    if previous in keys:
+        delta[previous] = delta.get(previous, 0) - 1
+    if new in keys:
+        delta[new] = delta.get(new, 0) + 1
+    return {key: value for key, value in delta.items() if value}
+
+
+def stats_delta(activity, role):
+    """Change to the role's dashboard stats implied by one activity"""
+    activity_type = activity.get("type")
+    data = activity.get("data", {})
+
+    if role == "donor":
+        if activity_type == "donation":
+            return {"total_donated": 1, "pending": 1}
+        return {}
+
+    if role == "receiver":
+        if activity_type == "request":
+            return {"total_requests": 1, "pending": 1}
+        if activity_type == "request_status":
+            delta = status_delta(REQUEST_STAT_KEYS, data.get("previous_status"), data.get("status"))
+            if "approved" in delta:
+                delta["upcoming_pickups"] = delta["approved"]
+            return delta
+        return {}
+
+    # admin
+    if activity_type == "registration":
+        delta = {"total_users": 1, "today_registrations": 1}
+        if activity.get("actor_type") in ("donor", "receiver"):
+            delta[f"total_{activity['actor_type']}s"] = 1
+            delta["active_users"] = 1
+            delta["pending_verifications"] = 1
+        else:
+            delta["total_admins"] = 1
+        return delta
+    if activity_type == "request":
+        return {"pending_requests": 1}
+    if activity_type == "request_status":
+        renamed = {"pending": "pending_requests", "completed": "completed_total"}
+        delta = status_delta(renamed, data.get("previous_status"), data.get("status"))
+        return {renamed[key]: value for key, value in delta.items()}
+    if activity_type == "user_status":
+        renamed = {"suspended": "suspended_users", "blocked": "blocked_users"}
+        delta = status_delta(renamed, data.get("previous_status"), data.get("status"))
+        return {renamed[key]: value for key, value in delta.items()}
+    if activity_type == "user_verified" and not data.get("was_verified"):
+        return {"pending_verifications": -1}
+    return {}
+
+
+def visible_to(activity, user):
+    role = user["user_type"]
+    if role == "admin":
+        return True
+    if role == "receiver" and activity.get("type") == "donation":
+        # A new donation changes every receiver's available medicines
+        return True
+    return activity.get("actor_email") == user["email"]
+
+
+def snapshot(activity, keys):
+    """Document fields from an activity's data snapshot, as {field: value}"""
+    data = activity.get("data", {})
+    doc = {field: data[key] for key, field in keys.items() if data.get(key) is not None}
+    doc["_id"] = activity.get("subject_id")
+    doc["created_at"] = activity.get("created_at")
+    return doc
+
+
+DONATION_FIELDS = {
+    "medicine_name": "medicineName", "manufacturer": "manufacturer", "quantity": "quantity",
+    "expiry_date": "expiryDate", "category": "category", "condition": "condition",
+    "image": "image", "status": "status",
+}
+REQUEST_FIELDS = {
+    "medicine_name": "medicine_name", "dosage": "dosage", "quantity": "quantity",
+    "urgency": "urgency", "preferred_location": "preferred_location",
+    "prescription": "prescription", "status": "status",
+}
+
+
+def event_row(activity, role):
+    """List row the activity adds to the role's dashboard, if any"""
+    activity_type = activity.get("type")
+    now = datetime.utcnow()
+
+    if activity_type == "donation":
+        if role == "donor":
+            return donor_feed_row(activity, now)
+        donation = snapshot(activity, DONATION_FIELDS)
+        donation.update(username=activity.get("actor_username"), email=activity.get("actor_email"))
+        if role == "receiver":
+            return available_medicine_row(donation, datetime.now())
+        return admin_donation_row(donation, now)
+
+    if activity_type == "request":
+        req = snapshot(activity, REQUEST_FIELDS)
+        if role == "receiver":
+            return receiver_request_row(req, now)
+        req.update(receiver_username=activity.get("actor_username"), receiver_email=activity.get("actor_email"))
+        return admin_request_row(req, now)
+
+    if activity_type == "registration" and role == "admin":
+        return {
+            "id": activity.get("subject_id"),
+            "username": activity.get("actor_username") or "Unknown",
+            "email": activity.get("actor_email") or "",
+            "user_type": activity.get("actor_type"),
+            "status": "active",
+            "verified": activity.get("actor_type") == "admin",
+            "profile_image": None,
+            "created_at": iso(activity.get("created_at"))
+        }
+    return None
+
+
+def event_key(activity):
+    return (iso(activity.get("created_at")), activity.get("subject_id"), activity.get("type"))
+
+
+def format_event(activity, user):
+    """SSE frame for one activity, or None if the user should not see it"""
+    if not visible_to(activity, user):
+        return None
+
+    own = activity.get("actor_email") == user["email"] or user["user_type"] == "admin"
+    payload = {
+        "type": activity.get("type"),
+        "subject_id": activity.get("subject_id"),
+        "actor_type": activity.get("actor_type"),
+        "data": activity.get("data", {}),
+        "stats_delta": stats_delta(activity, user["user_type"]) if own else {},
+        "row": event_row(activity, user["user_type"]),
+        "created_at": iso(activity.get("created_at"))
+    }
+    return (
+        f"id: {payload['created_at']}\n"
+        f"event: {payload['type']}\n"
+        f"data: {json.dumps(payload, default=str)}\n\n"
+    )
+
+
+def control_frame(event, cursor):
+    """Frame that moves the client's Last-Event-ID to cursor"""
+    return f"id: {iso(cursor)}\nevent: {event}\ndata: {{}}\n\n"
+
+
+def event_stream(user, subscriber, missed, since=None):
+    """Generator of SSE frames for one connected dashboard.
+
+    subscriber is the dashboard's broker queue; missed are up to
+    REPLAY_LIMIT activities after since (the client's Last-Event-ID),
+    oldest first, replayed before live events.
+
+    The view subscribes before reading missed, so nothing written in
+    between is lost; activities that land in both are sent once.
+    """
+    if len(missed) >= REPLAY_LIMIT:
+        # More was missed than the replay holds; the client refetches
+        missed = []
+        first_frame = control_frame("resync", datetime.utcnow())
+    else:
+        # Gives a client that has not seen an event yet a Last-Event-ID
+        # to resume from
+        first_frame = control_frame("ready", since or datetime.utcnow())
+
+    replayed = {event_key(activity) for activity in missed}
+    replayed_until = missed[-1].get("created_at") if missed else None
+    try:
+        yield "retry: 5000\n\n"
+        yield first_frame
+        for activity in missed:
+            frame = format_event(activity, user)
+            if frame:
+                yield frame
+
+        while True:
+            try:
+                activity = subscriber.get(timeout=KEEPALIVE_SECONDS)
+            except queue.Empty:
+                yield ": keep-alive\n\n"
+                continue
+            if subscriber.overflowed:
+                # Events were dropped; skip what is queued and refetch
+                subscriber.overflowed = False
+                while not subscriber.empty():
+                    subscriber.get_nowait()
+                replayed.clear()
+                yield control_frame("resync", datetime.utcnow())
+                continue
+            if replayed:
+                if event_key(activity) in replayed:
+                    continue
+                if activity.get("created_at") and activity["created_at"] > replayed_until:
+                    # Past the replay; no more duplicates can follow
+                    replayed.clear()
+            frame = format_event(activity, user)
+            if frame:
+                yield frame
+    finally:
+        broker.unsubscribe(subscriber)
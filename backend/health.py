@@ -0,0 +1,162 @@
+import logging
+import os
+import tempfile
+import threading
+import time
+from datetime import datetime
+
+from pymongo import MongoClient
+from pymongo.errors import PyMongoError
+
+from backend import invalidation
+from backend.concurrency import QUERY_POOL_SIZE
+from backend.domain_counters import domain_counters
+from backend.http_cache import versions
+from backend.images import IMAGE_WORKERS
+from backend.metrics import queue_depths
+from backend.storage import LocalStorage
+from backend.uploads import STAGING_FOLDER
+
+log = logging.getLogger(__name__)
+
+
+# ---------------------------------------------------------------------
+# HEALTH AND READINESS
+# ---------------------------------------------------------------------
+#   GET /healthz   liveness: the worker answers requests. No I/O, so a
+#                  failing probe means a hung or dead process, not a
+#                  slow database.
+#   GET /readyz    readiness: 200 when this worker can serve traffic,
+#                  503 (with the failing checks) when it should be
+#                  taken out of the load balancer for now.
+#
+# Readiness checks
+#
+#   mongo      ping round trip, failing over READY_MONGO_MS. Sent over
+#              a client of its own (readiness_client) whose timeouts are
+#              all READY_MONGO_TIMEOUT, so a database that does not
+#              answer fails the probe in time without tying up the app's
+#              connection pool or query threads.
+#   uploads    staging and upload folders writable (local storage)
+#   executors  query/image pool queues below READY_MAX_QUEUE per worker
+#   caches     ETag versions and domain counters seeded, invalidation
+#              bus running
+#
+# The result is cached for READY_CACHE_SECONDS, and concurrent probes
+# share one check in progress, so probes add at most one ping per
+# worker per interval whatever their rate.
+
+READY_CACHE_SECONDS = float(os.getenv("READY_CACHE_SECONDS", "5"))
+READY_MONGO_MS = float(os.getenv("READY_MONGO_MS", "500"))
+READY_MONGO_TIMEOUT = float(os.getenv("READY_MONGO_TIMEOUT", "2"))
+# Queued tasks per executor worker before the worker reports not ready
+READY_MAX_QUEUE = int(os.getenv("READY_MAX_QUEUE", "10"))
+
+UPLOAD_BUCKETS = ["medicine_images", "profile_images", "prescriptions"]
+
+STARTED_AT = time.time()
+
+
+def liveness():
+    return {"status": "ok", "pid": os.getpid(), "uptime_s": round(time.time() - STARTED_AT)}
+
+
+def readiness_client(uri, **options):
+    """MongoClient for the readiness ping only; options as for the app's client"""
+    timeout_ms = int(READY_MONGO_TIMEOUT * 1000)
+    return MongoClient(
+        uri,
+        serverSelectionTimeoutMS=timeout_ms,
+        connectTimeoutMS=timeout_ms,
+        socketTimeoutMS=timeout_ms,
+        # Probes run one at a time (Readiness.get)
+        maxPoolSize=1,
+        **options
+    )
+
+
+def check_mongo(client):
+    started = time.perf_counter()
+    try:
+        client.admin.command("ping")
+    except PyMongoError as e:
+        # /readyz is public: the error names hosts and the replica set
+        log.warning("Readiness ping failed: %s", e)
+        return {"ok": False, "status": "unavailable"}
+    latency_ms = round((time.perf_counter() - started) * 1000, 1)
+    return {"ok": latency_ms <= READY_MONGO_MS, "latency_ms": latency_ms}
+
+
+def check_uploads(storage):
+    if not isinstance(storage, LocalStorage):
+        return {"ok": True, "backend": type(storage).__name__}
+
+    unwritable = []
+    for folder in [STAGING_FOLDER] + [storage.local_path(bucket) for bucket in UPLOAD_BUCKETS]:
+        try:
+            os.makedirs(folder, exist_ok=True)
+            # os.access misses read-only mounts and full disks
+            with tempfile.TemporaryFile(dir=folder):
+                pass
+        except OSError as e:
+            unwritable.append(f"{folder}: {e.strerror}")
+    return {"ok": False, "unwritable": unwritable} if unwritable else {"ok": True}
+
+
+def check_executors():
+    depths = queue_depths()
+    limits = {"query": READY_MAX_QUEUE * QUERY_POOL_SIZE, "image": READY_MAX_QUEUE * IMAGE_WORKERS}
+    saturated = [name for name, depth in depths.items() if depth > limits[name]]
+    return {"ok": not saturated, "queued": depths, "limits": limits}
+
+
+def check_caches():
+    consumer = invalidation.consumer
+    state = {
+        "etag_versions": versions.started,
+        "domain_counters": domain_counters.seeded_at is not None,
+        "invalidation_bus": consumer is not None and consumer.is_alive(),
+    }
+    return {"ok": all(state.values()), **state}
+
+
+class Readiness:
+    """The latest readiness result of this worker, refreshed when stale"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._result = None
+        self._checked = 0.0
+
+    def check(self, client, storage):
+        checks = {
+            "mongo": check_mongo(client),
+            "uploads": check_uploads(storage),
+            "executors": check_executors(),
+            "caches": check_caches(),
+        }
+        return {
+            "status": "ready" if all(check["ok"] for check in checks.values()) else "not_ready",
+            "checked_at": datetime.utcnow().isoformat(timespec="seconds") + "Z",
+            "checks": checks,
+        }
+
+    def get(self, client, storage):
+        """(result, cached)"""
+        if self._result is not None and time.monotonic() - self._checked < READY_CACHE_SECONDS:
+            return self._result, True
+
+        # One check at a time; other probes get the previous result
+        if not self._lock.acquire(blocking=self._result is None):
+            return self._result, True
+        try:
+            if self._result is not None and time.monotonic() - self._checked < READY_CACHE_SECONDS:
+                return self._result, True
+            self._result = self.check(client, storage)
+            self._checked = time.monotonic()
+            return self._result, False
+        finally:
+            self._lock.release()
+
+
+readiness = Readiness()
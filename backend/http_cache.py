@@ -0,0 +1,192 @@
+import glob
+import gzip
+import hashlib
+import os
+import threading
+import time
+from datetime import datetime
+from functools import wraps
+
+from flask import current_app, request, session
+from pymongo import DESCENDING
+
+from backend.invalidation import WATCHED_COLLECTIONS, bus
+from backend.metrics import cache_lookup
+from backend.telemetry import written_collections
+
+try:
+    import brotli
+except ImportError:  # gzip only
+    brotli = None
+
+
+# ---------------------------------------------------------------------
+# CONDITIONAL GET
+# ---------------------------------------------------------------------
+# Each watched collection has a version: the time of its latest change.
+# Versions are seeded from max(updated_at) at startup and advanced by
+# the invalidation bus, so every process derives the same versions
+# from the same data. A write handled by this process also advances the
+# collections it wrote to right away, before the bus has seen the
+# change, from their max(updated_at) again, never from the local clock.
+# Deletes leave no updated_at behind and wait for the bus.
+#
+# @conditional("donated_medicine", ttl=60) gives a GET endpoint a weak
+# ETag built from the path, query, session user and the versions of the
+# collections it reads. A matching If-None-Match is answered 304 without
+# running the view. ttl buckets time for responses that contain
+# relative times ("5 minutes ago") so they are refreshed anyway.
+
+def code_version():
+    """Hash of the app's source; a deploy that changes responses changes ETags"""
+    here = os.path.dirname(os.path.abspath(__file__))
+    digest = hashlib.sha1()
+    for path in sorted(glob.glob(os.path.join(here, "..", "*.py")) + glob.glob(os.path.join(here, "*.py"))):
+        with open(path, "rb") as f:
+            digest.update(f.read())
+    return digest.hexdigest()[:8]
+
+
+CODE_VERSION = code_version()
+
+
+class CollectionVersions:
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._versions = {}
+        self.db = None
+        self.started = False
+
+    def start(self, db):
+        """Seed versions from the data and follow the invalidation bus"""
+        self.db = db
+        for name in WATCHED_COLLECTIONS:
+            self.refresh(name)
+        bus.subscribe(self.on_change)
+        self.started = True
+
+    def refresh(self, name):
+        """Advance a collection to the updated_at of its latest document"""
+        latest = self.db[name].find_one({}, {"updated_at": 1}, sort=[("updated_at", DESCENDING)])
+        if latest and latest.get("updated_at"):
+            self.advance(name, latest["updated_at"])
+
+    def on_change(self, event):
+        if event.operation == "resync":
+            self.touch_all()
+        else:
+            self.advance(event.collection, event.changed_at or datetime.utcnow())
+
+    def advance(self, name, changed_at):
+        with self._lock:
+            if changed_at > self._versions.get(name, datetime.min):
+                self._versions[name] = changed_at
+
+    def touch_all(self):
+        now = datetime.utcnow()
+        for name in WATCHED_COLLECTIONS:
+            self.advance(name, now)
+
+    def get(self, name):
+        with self._lock:
+            return self._versions.get(name, datetime.min)
+
+
+versions = CollectionVersions()
+
+
+def etag_for(collections, ttl=None):
+    return etag_value(request.path, request.query_string, session.get("user") or {}, collections, ttl)
+
+
+def etag_value(path, query_string, user, collections, ttl=None):
+    """The ETag of etag_for, from plain values (asgi.py has its own request)"""
+    parts = [
+        CODE_VERSION,
+        path,
+        query_string.decode("latin-1"),
+        user.get("email", ""),
+        user.get("user_type", ""),
+    ]
+    parts += [versions.get(name).isoformat() for name in collections]
+    if ttl:
+        parts.append(str(int(time.time() // ttl)))
+    return hashlib.sha1("|".join(parts).encode("utf-8")).hexdigest()[:20]
+
+
+def conditional(*collections, ttl=None):
+    """Weak ETag / 304 for a GET endpoint reading the given collections"""
+
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            # Computed before the view reads, so a concurrent write can
+            # only make the ETag older than the data, never newer
+            etag = etag_for(collections, ttl)
+            hit = request.if_none_match.contains_weak(etag)
+            cache_lookup("etag", hit)
+            if hit:
+                response = current_app.response_class(status=304)
+            else:
+                response = current_app.make_response(view(*args, **kwargs))
+                if response.status_code != 200:
+                    return response
+            response.set_etag(etag, weak=True)
+            # Per user data: browsers may keep it, but must revalidate
+            response.headers["Cache-Control"] = "private, no-cache"
+            return response
+
+        return wrapper
+
+    return decorator
+
+
+def touch_on_write(response):
+    """after_request: a successful write makes the GETs reading what it
+    wrote stale at once"""
+    if request.method in ("GET", "HEAD", "OPTIONS") or response.status_code >= 400 or not versions.started:
+        return response
+    for name in written_collections() & set(WATCHED_COLLECTIONS):
+        versions.refresh(name)
+    return response
+
+
+# ---------------------------------------------------------------------
+# RESPONSE COMPRESSION
+# ---------------------------------------------------------------------
+COMPRESS_MIN_SIZE = 1024
+COMPRESS_MIMETYPES = {
+    "application/json", "text/html", "text/css", "text/plain",
+    "application/javascript", "text/javascript", "image/svg+xml",
+}
+
+
+def compress_response(response):
+    """after_request: gzip/brotli bodies the client accepts, above a size"""
+    response.vary.add("Accept-Encoding")
+    if (
+        response.status_code != 200
+        or response.direct_passthrough          # files, streams (SSE)
+        or response.is_streamed
+        or "Content-Encoding" in response.headers
+        or response.mimetype not in COMPRESS_MIMETYPES
+    ):
+        return response
+
+    compressed = compress_body(response.get_data(), request.accept_encodings)
+    if compressed:
+        response.set_data(compressed[0])
+        response.headers["Content-Encoding"] = compressed[1]
+    return response
+
+
+def compress_body(data, accept_encodings):
+    """(body, Content-Encoding) the client accepts, or None to send data as is"""
+    if len(data) < COMPRESS_MIN_SIZE:
+        return None
+    if brotli and accept_encodings["br"]:
+        return brotli.compress(data, quality=5), "br"
+    if accept_encodings["gzip"]:
+        return gzip.compress(data, compresslevel=6), "gzip"
+    return None
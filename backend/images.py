@@ -0,0 +1,174 @@
+import logging
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+try:
+    from PIL import Image, ImageOps
+except ImportError:  # Pillow not installed: uploads are served as-is
+    Image = ImageOps = None
+
+log = logging.getLogger(__name__)
+
+
+# ---------------------------------------------------------------------
+# IMAGE RENDITIONS
+# ---------------------------------------------------------------------
+# Uploaded medicine photos and profile images are decoded, rotated
+# upright, stripped of EXIF and re-encoded to WebP at fixed sizes in a
+# process pool, off the request thread. The original stays on disk;
+# listing endpoints hand out the rendition URLs once they exist, and
+# the original's until then. The original is therefore re-saved
+# without its metadata (GPS position, camera, owner...) when it is
+# uploaded, before it is stored under a name (remove_metadata).
+#
+#   <stem>.<ext>  ->  <stem>_thumb.webp   160px
+#                     <stem>_card.webp    480px
+#                     <stem>_full.webp   1280px
+
+RENDITIONS = {
+    "thumb": 160,
+    "card": 480,
+    "full": 1280,
+}
+
+WEBP_QUALITY = 80
+IMAGE_WORKERS = int(os.getenv("IMAGE_WORKERS", max(1, (os.cpu_count() or 2) // 2)))
+
+_pool = None
+
+
+def image_pool():
+    global _pool
+    if _pool is None:
+        _pool = ProcessPoolExecutor(max_workers=IMAGE_WORKERS)
+    return _pool
+
+
+def rendition_name(filename, rendition):
+    stem = os.path.splitext(filename)[0]
+    return f"{stem}_{rendition}.webp"
+
+
+def make_renditions(source_path, output_dir):
+    """Write every rendition of source_path; runs inside the process pool"""
+    filename = os.path.basename(source_path)
+
+    with Image.open(source_path) as original:
+        # Apply the EXIF orientation before the metadata is dropped
+        image = ImageOps.exif_transpose(original)
+        image = image.convert("RGBA" if image.mode in ("RGBA", "LA", "P") else "RGB")
+
+        renditions = {}
+        for rendition, size in RENDITIONS.items():
+            resized = image.copy()
+            resized.thumbnail((size, size), Image.LANCZOS)
+
+            name = rendition_name(filename, rendition)
+            tmp_path = os.path.join(output_dir, f".{name}.tmp")
+            # No exif= argument, so the WebP carries no metadata
+            resized.save(tmp_path, "WEBP", quality=WEBP_QUALITY, method=4)
+            os.replace(tmp_path, os.path.join(output_dir, name))
+
+            renditions[rendition] = name
+
+    return renditions
+
+
+# EXIF is carried by these; GIFs are stored as they are
+METADATA_FORMATS = ("JPEG", "PNG", "WEBP")
+# EXIF orientation tag
+ORIENTATION = 0x0112
+# Image.info keys that describe the encoding, not the picture's origin.
+# Any other key (exif, xmp, icc_profile, comment, photoshop...) is
+# treated as metadata.
+STRUCTURAL_INFO = {
+    "jfif", "jfif_version", "jfif_unit", "jfif_density", "dpi", "progressive", "progression",
+    "adobe", "adobe_transform", "loop", "duration", "background", "timestamp",
+}
+
+
+def strip_metadata(path):
+    """Re-save an image in place without metadata, rotated upright first;
+    runs inside the process pool. False if the format is left alone."""
+    with Image.open(path) as original:
+        if original.format not in METADATA_FORMATS:
+            return False
+
+        image_format = original.format
+        if original.getexif().get(ORIENTATION, 1) == 1:
+            image = original
+            # Same quantization tables: no visible loss from re-encoding
+            params = {"quality": "keep"} if image_format == "JPEG" else {}
+        else:
+            image = ImageOps.exif_transpose(original)
+            params = {"quality": 95} if image_format == "JPEG" else {}
+        if image_format == "WEBP":
+            params = {"quality": 90, "method": 4}
+
+        tmp_path = f"{path}.strip"
+        # No exif=/icc_profile=/pnginfo= arguments, so none are written
+        image.save(tmp_path, image_format, **params)
+    os.replace(tmp_path, path)
+    return True
+
+
+def carries_metadata(path):
+    """False only for a JPEG/WebP whose headers show no metadata at all.
+
+    Reads the headers, not the pixels, so it is cheap enough for the
+    request thread. PNG text chunks may follow the image data, so PNGs
+    always count as carrying some.
+    """
+    with Image.open(path) as image:
+        if image.format not in METADATA_FORMATS:
+            return False
+        if image.format == "PNG":
+            return True
+        return bool(image.getexif()) or any(key not in STRUCTURAL_INFO for key in image.info)
+
+
+def remove_metadata(path):
+    """strip_metadata(path) in the pool, waiting for it. False without Pillow.
+
+    Synchronous on purpose: the stripped bytes name the file, and that
+    name is a public URL cached forever, so nothing can be stored, let
+    alone served, before this returns. Files without metadata skip the
+    pool entirely.
+    """
+    if Image is None or not carries_metadata(path):
+        return False
+    return image_pool().submit(strip_metadata, path).result()
+
+
+def submit_image_task(task, source_path, output_dir, on_done):
+    """Run task(source_path, output_dir) in the pool; on_done(result) when it finishes"""
+    if Image is None:
+        return None
+
+    future = image_pool().submit(task, source_path, output_dir)
+
+    def finished(f):
+        try:
+            on_done(f.result())
+        except Exception as e:
+            log.warning("Could not process %s: %s", os.path.basename(source_path), e)
+
+    future.add_done_callback(finished)
+    return future
+
+
+def submit_renditions(source_path, output_dir, on_done):
+    """Queue rendition generation; on_done(renditions) runs when it finishes"""
+    return submit_image_task(make_renditions, source_path, output_dir, on_done)
+
+
+def rendition_urls(url_prefix, filename, renditions):
+    """URL per rendition, falling back to the original until they exist"""
+    if not filename:
+        return None
+
+    renditions = renditions or {}
+    original = f"{url_prefix}/{filename}"
+    return {rendition: f"{url_prefix}/{renditions[rendition]}" if rendition in renditions else original
+            for rendition in RENDITIONS}
+
@@ -0,0 +1,244 @@
+import logging
+import os
+import threading
+import time
+from collections import namedtuple
+from datetime import datetime
+
+from pymongo import ASCENDING
+from pymongo.errors import OperationFailure, PyMongoError
+
+log = logging.getLogger(__name__)
+
+
+# ---------------------------------------------------------------------
+# CACHE INVALIDATION BUS
+# ---------------------------------------------------------------------
+# Caches (stats, catalog, sessions...) subscribe here instead of every
+# write handler having to know about every cache. One consumer thread
+# per process turns database changes into InvalidationEvents:
+#
+# * ChangeStreamConsumer watches the database with a change stream
+#   (replica sets). Its resume token is persisted in resume_tokens so a
+#   restarted process continues where it stopped.
+# * PollingConsumer is the fallback for a standalone mongod. It tails
+#   the (updated_at, _id) index of each watched collection and persists
+#   the last position it reached the same way. The _id breaks ties, so
+#   a bulk update giving thousands of documents one updated_at is read
+#   batch by batch instead of the same first batch forever.
+#
+# Every write to a watched collection must therefore set updated_at.
+
+WATCHED_COLLECTIONS = ["donated_medicine", "requests_medicine", "donar", "receiver", "admin"]
+
+RESUME_TOKENS_COLLECTION = "resume_tokens"
+CONSUMER_NAME = os.getenv("INVALIDATION_CONSUMER_NAME", "invalidation")
+POLL_INTERVAL = float(os.getenv("INVALIDATION_POLL_INTERVAL", "2"))
+POLL_BATCH_SIZE = 1000
+TOKEN_SAVE_INTERVAL = 1.0
+
+# operation is insert / update / replace / delete, or "resync" when the
+# consumer could not tell what changed and everything must be dropped
+InvalidationEvent = namedtuple("InvalidationEvent", ["collection", "operation", "document_id", "changed_at"])
+
+
+class InvalidationBus:
+    """In-process subscribers to invalidation events"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._subscribers = []
+
+    def subscribe(self, callback, collections=None):
+        """Call callback(event) for changes to collections (default: all)"""
+        entry = (callback, set(collections) if collections else None)
+        with self._lock:
+            self._subscribers.append(entry)
+        return lambda: self._unsubscribe(entry)
+
+    def _unsubscribe(self, entry):
+        with self._lock:
+            if entry in self._subscribers:
+                self._subscribers.remove(entry)
+
+    def publish(self, event):
+        with self._lock:
+            subscribers = list(self._subscribers)
+        for callback, collections in subscribers:
+            if collections is not None and event.collection not in collections:
+                continue
+            try:
+                callback(event)
+            except Exception as e:
+                log.exception("Invalidation subscriber failed")
+
+    def resync(self):
+        """Tell every subscriber to drop everything"""
+        now = datetime.utcnow()
+        for name in WATCHED_COLLECTIONS:
+            self.publish(InvalidationEvent(name, "resync", None, now))
+
+
+bus = InvalidationBus()
+
+
+def ensure_invalidation_indexes(db):
+    for name in WATCHED_COLLECTIONS:
+        db[name].create_index([("updated_at", ASCENDING), ("_id", ASCENDING)])
+
+
+# ---------------------------------------------------------------------
+# CHANGE STREAM CONSUMER
+# ---------------------------------------------------------------------
+class ChangeStreamUnsupported(Exception):
+    pass
+
+
+class ChangeStreamConsumer:
+
+    def __init__(self, db):
+        self.db = db
+        self.tokens = db[RESUME_TOKENS_COLLECTION]
+        self.token_id = f"{CONSUMER_NAME}:change_stream"
+
+    def load_token(self):
+        saved = self.tokens.find_one({"_id": self.token_id})
+        return saved["token"] if saved else None
+
+    def save_token(self, token):
+        self.tokens.update_one(
+            {"_id": self.token_id},
+            {"$set": {"token": token, "updated_at": datetime.utcnow()}},
+            upsert=True
+        )
+
+    def run_once(self):
+        pipeline = [{"$match": {"ns.coll": {"$in": WATCHED_COLLECTIONS}}}]
+        token = self.load_token()
+        unsaved = None
+        last_save = time.monotonic()
+
+        try:
+            with self.db.watch(pipeline, resume_after=token) as stream:
+                log.info("Invalidation change stream connected")
+                while stream.alive:
+                    change = stream.try_next()
+                    if change is not None:
+                        changed_at = change.get("wallTime") or datetime.utcnow()
+                        bus.publish(InvalidationEvent(
+                            change["ns"]["coll"],
+                            change["operationType"],
+                            change.get("documentKey", {}).get("_id"),
+                            changed_at.replace(tzinfo=None)
+                        ))
+                        unsaved = stream.resume_token
+                    # Persist the token at most once a second
+                    if unsaved is not None and time.monotonic() - last_save >= TOKEN_SAVE_INTERVAL:
+                        self.save_token(unsaved)
+                        unsaved = None
+                        last_save = time.monotonic()
+        except OperationFailure as e:
+            if e.code == 40573 or "replica set" in str(e).lower():
+                raise ChangeStreamUnsupported()
+            if e.code == 286 or "resume" in str(e).lower():
+                # ChangeStreamHistoryLost: token fell off the oplog
+                log.warning("Invalidation resume token expired, resyncing caches")
+                self.tokens.delete_one({"_id": self.token_id})
+                bus.resync()
+                return
+            raise
+        finally:
+            if unsaved is not None:
+                try:
+                    self.save_token(unsaved)
+                except PyMongoError:
+                    pass
+
+
+# ---------------------------------------------------------------------
+# POLLING CONSUMER (STANDALONE MONGOD)
+# ---------------------------------------------------------------------
+class PollingConsumer:
+
+    def __init__(self, db):
+        self.db = db
+        self.tokens = db[RESUME_TOKENS_COLLECTION]
+        self.token_id = f"{CONSUMER_NAME}:polling"
+        saved = self.tokens.find_one({"_id": self.token_id}) or {}
+        now = datetime.utcnow()
+        self.positions = {name: saved.get("positions", {}).get(name, now) for name in WATCHED_COLLECTIONS}
+        # _id of the last document published at exactly the current position
+        self.last_ids = {name: saved.get("last_ids", {}).get(name) for name in WATCHED_COLLECTIONS}
+
+    def poll_collection(self, name):
+        position, last_id = self.positions[name], self.last_ids[name]
+        if last_id is None:
+            query = {"updated_at": {"$gte": position}}
+        else:
+            query = {"$or": [
+                {"updated_at": {"$gt": position}},
+                {"updated_at": position, "_id": {"$gt": last_id}},
+            ]}
+        changed = self.db[name].find(query, {"updated_at": 1}).sort(
+            [("updated_at", ASCENDING), ("_id", ASCENDING)]
+        ).limit(POLL_BATCH_SIZE)
+
+        published = 0
+        for doc in changed:
+            position, last_id = doc["updated_at"], doc["_id"]
+            bus.publish(InvalidationEvent(name, "update", doc["_id"], position))
+            published += 1
+
+        self.positions[name], self.last_ids[name] = position, last_id
+        return published
+
+    def run_once(self):
+        counts = [self.poll_collection(name) for name in WATCHED_COLLECTIONS]
+        published = sum(counts)
+        if published:
+            self.tokens.update_one(
+                {"_id": self.token_id},
+                {"$set": {"positions": self.positions, "last_ids": self.last_ids, "updated_at": datetime.utcnow()}},
+                upsert=True
+            )
+        if max(counts) < POLL_BATCH_SIZE:
+            # Otherwise a backlog is left: poll again right away
+            time.sleep(POLL_INTERVAL)
+
+
+# ---------------------------------------------------------------------
+# CONSUMER THREAD
+# ---------------------------------------------------------------------
+class InvalidationConsumer(threading.Thread):
+
+    def __init__(self, db):
+        super().__init__(name="invalidation-consumer", daemon=True)
+        self.db = db
+        self.mode = "change_stream"
+
+    def run(self):
+        consumer = ChangeStreamConsumer(self.db)
+        backoff = 1
+        while True:
+            try:
+                consumer.run_once()
+                backoff = 1
+            except ChangeStreamUnsupported:
+                log.warning("Change streams unavailable, polling updated_at for invalidation")
+                self.mode = "polling"
+                consumer = PollingConsumer(self.db)
+            except PyMongoError as e:
+                log.warning("Invalidation consumer error: %s", e)
+                time.sleep(backoff)
+                backoff = min(backoff * 2, 30)
+
+
+consumer = None
+
+
+def start_invalidation_bus(db):
+    global consumer
+    if consumer is None:
+        consumer = InvalidationConsumer(db)
+        consumer.start()
+    return consumer
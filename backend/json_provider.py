@@ -0,0 +1,78 @@
+import base64
+import decimal
+import json
+import uuid
+from datetime import date, datetime
+
+from bson import Binary, Decimal128, ObjectId
+from flask.json.provider import DefaultJSONProvider
+
+try:
+    import orjson
+except ImportError:  # stdlib json with the same type handling
+    orjson = None
+
+
+# ---------------------------------------------------------------------
+# JSON PROVIDER
+# ---------------------------------------------------------------------
+# app.json = FastJSONProvider(app) makes jsonify() encode BSON types
+# itself, so handlers can return projected documents as they come from
+# pymongo instead of converting every field in Python first:
+#
+#   ObjectId    -> "65f0c2..."                 (str)
+#   datetime    -> "2026-03-01T10:15:00.123"   (isoformat, like iso())
+#   Decimal128  -> "12.50"
+#   Binary      -> base64
+#
+# Encoding uses orjson when installed (several times faster, bytes out
+# straight into the response), else the stdlib json module.
+
+def bson_default(value):
+    """Encode the non-JSON types found in pymongo documents"""
+    if isinstance(value, ObjectId):
+        return str(value)
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, Decimal128):
+        return str(value.to_decimal())
+    if isinstance(value, decimal.Decimal):
+        return str(value)
+    if isinstance(value, Binary):
+        return base64.b64encode(bytes(value)).decode("ascii")
+    if isinstance(value, uuid.UUID):
+        return str(value)
+    if isinstance(value, (set, frozenset)):
+        return list(value)
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+ORJSON_OPTIONS = orjson.OPT_NON_STR_KEYS if orjson else 0
+
+
+def dumps_bytes(obj):
+    """Encode obj as compact JSON bytes"""
+    if orjson:
+        return orjson.dumps(obj, default=bson_default, option=ORJSON_OPTIONS)
+    return json.dumps(obj, default=bson_default, separators=(",", ":")).encode("utf-8")
+
+
+class FastJSONProvider(DefaultJSONProvider):
+    # Key order is the handler's own; sorting only costs time
+    sort_keys = False
+    default = staticmethod(bson_default)
+
+    def dumps(self, obj, **kwargs):
+        if orjson is None or kwargs:
+            kwargs.setdefault("default", bson_default)
+            return json.dumps(obj, **kwargs)
+        return dumps_bytes(obj).decode("utf-8")
+
+    def loads(self, s, **kwargs):
+        if orjson is None or kwargs:
+            return json.loads(s, **kwargs)
+        return orjson.loads(s)
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        return self._app.response_class(dumps_bytes(obj), mimetype=self.mimetype)
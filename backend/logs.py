@@ -0,0 +1,214 @@
+import atexit
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import re
+import sys
+import uuid
+from contextvars import ContextVar
+from datetime import datetime, timezone
+
+from flask import g, request
+
+from backend.metrics import log_dropped
+
+
+# ---------------------------------------------------------------------
+# STRUCTURED LOGGING
+# ---------------------------------------------------------------------
+# One JSON object per line on stdout:
+#
+#   {"ts": "2026-03-01T10:15:00.123Z", "level": "INFO", "logger": "app",
+#    "msg": "Medicine request submitted", "request_id": "9f1c...",
+#    "medicine_request_id": "65f0..."}
+#
+# Handlers only put records on a queue; a background thread formats and
+# writes them, so a slow stdout never blocks a request and lines from
+# concurrent requests never interleave. When the queue is full, records
+# are dropped and counted rather than waited for.
+#
+# Every record logged while serving a request carries its request_id,
+# taken from the X-Request-ID header (or generated) and echoed back on
+# the response. Extra fields: log.info("...", extra=fields(key=value)).
+#
+# High-volume success messages use extra=sampled(...) and are only kept
+# at LOG_SUCCESS_SAMPLE_RATE (warnings and errors are always kept).
+#
+#   LOG_LEVEL=INFO                                   root level
+#   LOG_LEVELS=backend.invalidation=WARNING,app=DEBUG per logger levels
+#   LOG_FORMAT=json | text                           text for local runs
+#   LOG_SUCCESS_SAMPLE_RATE=0.1                     default 1 (keep all)
+
+# Read by configure_logging(), after the .env file is loaded
+SUCCESS_SAMPLE_RATE = 1.0
+LOG_QUEUE_SIZE = 10000
+
+REQUEST_ID_HEADER = "X-Request-ID"
+VALID_REQUEST_ID = re.compile(r"^[A-Za-z0-9._-]{1,64}$")
+
+# Attributes every LogRecord has; anything else was passed in extra=
+RECORD_ATTRIBUTES = set(vars(logging.LogRecord("", 0, "", 0, "", None, None))) | {"message", "asctime"}
+
+_request_id = ContextVar("request_id", default=None)
+
+
+def fields(**values):
+    """extra= for structured fields"""
+    return values
+
+
+def sampled(**values):
+    """extra= for a success message that may be sampled away"""
+    values["sample_rate"] = SUCCESS_SAMPLE_RATE
+    return values
+
+
+def current_request_id():
+    return _request_id.get()
+
+
+# ---------------------------------------------------------------------
+# FORMATTING
+# ---------------------------------------------------------------------
+class JsonFormatter(logging.Formatter):
+
+    def format(self, record):
+        entry = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds").replace("+00:00", "Z"),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        for key, value in vars(record).items():
+            if key not in RECORD_ATTRIBUTES and key != "sample_rate" and value is not None:
+                entry[key] = value
+        if record.exc_text:
+            entry["exc"] = record.exc_text
+        return json.dumps(entry, default=str, ensure_ascii=False)
+
+
+class TextFormatter(logging.Formatter):
+
+    def format(self, record):
+        extra = " ".join(
+            f"{key}={value}" for key, value in vars(record).items()
+            if key not in RECORD_ATTRIBUTES and key != "sample_rate" and value is not None
+        )
+        line = f"{datetime.fromtimestamp(record.created):%H:%M:%S} {record.levelname:<7} {record.name}: {record.getMessage()}"
+        if extra:
+            line += f"  [{extra}]"
+        if record.exc_text:
+            line += "\n" + record.exc_text
+        return line
+
+
+# ---------------------------------------------------------------------
+# FILTERS AND QUEUE
+# ---------------------------------------------------------------------
+class ContextFilter(logging.Filter):
+    """Runs on the caller's thread: stamps the request id, applies sampling"""
+
+    def filter(self, record):
+        rate = getattr(record, "sample_rate", None)
+        if rate is not None and record.levelno < logging.WARNING and random.random() >= rate:
+            return False
+        if getattr(record, "request_id", None) is None:
+            record.request_id = _request_id.get()
+        return True
+
+
+class DroppingQueueHandler(logging.handlers.QueueHandler):
+    """Never blocks the caller: a full queue drops the record"""
+
+    def prepare(self, record):
+        # Render the message and traceback here, where the arguments are
+        # still valid, but leave the formatting to the writer thread
+        record = logging.makeLogRecord(vars(record))
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            log_dropped()
+
+
+_listener = None
+
+
+def parse_levels(spec):
+    levels = {}
+    for item in spec.split(","):
+        name, _, level = item.strip().partition("=")
+        if name and level:
+            levels[name.strip()] = level.strip().upper()
+    return levels
+
+
+def configure_logging():
+    """Route all logging through the queue and writer thread (idempotent)"""
+    global _listener, SUCCESS_SAMPLE_RATE
+    if _listener is not None:
+        return _listener
+
+    SUCCESS_SAMPLE_RATE = float(os.getenv("LOG_SUCCESS_SAMPLE_RATE", str(SUCCESS_SAMPLE_RATE)))
+
+    stream = logging.StreamHandler(sys.stdout)
+    stream.setFormatter(TextFormatter() if os.getenv("LOG_FORMAT") == "text" else JsonFormatter())
+
+    handler = DroppingQueueHandler(queue.Queue(int(os.getenv("LOG_QUEUE_SIZE", str(LOG_QUEUE_SIZE)))))
+    handler.addFilter(ContextFilter())
+
+    root = logging.getLogger()
+    root.handlers[:] = [handler]
+    root.setLevel(os.getenv("LOG_LEVEL", "INFO").upper())
+    for name, level in parse_levels(os.getenv("LOG_LEVELS", "werkzeug=WARNING")).items():
+        logging.getLogger(name).setLevel(level)
+
+    _listener = logging.handlers.QueueListener(handler.queue, stream, respect_handler_level=True)
+    _listener.start()
+    # Flush what is still queued when the process exits
+    atexit.register(_listener.stop)
+    return _listener
+
+
+# ---------------------------------------------------------------------
+# REQUEST IDS
+# ---------------------------------------------------------------------
+def start_request_id(incoming):
+    """Make the client's X-Request-ID (or a new id) current; returns the reset token"""
+    incoming = incoming or ""
+    return _request_id.set(incoming if VALID_REQUEST_ID.match(incoming) else uuid.uuid4().hex)
+
+
+def end_request_id(token):
+    _request_id.reset(token)
+
+
+def install_request_ids(app):
+    """Give every request an id, visible in its log records and response"""
+
+    @app.before_request
+    def assign_request_id():
+        g.request_id_token = start_request_id(request.headers.get(REQUEST_ID_HEADER))
+
+    @app.after_request
+    def echo_request_id(response):
+        request_id = _request_id.get()
+        if request_id:
+            response.headers[REQUEST_ID_HEADER] = request_id
+        return response
+
+    @app.teardown_request
+    def clear_request_id(exc=None):
+        token = g.pop("request_id_token", None)
+        if token is not None:
+            end_request_id(token)
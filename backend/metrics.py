@@ -0,0 +1,275 @@
+import logging
+import os
+import threading
+import time
+
+from pymongo import monitoring
+
+try:
+    import prometheus_client
+    from prometheus_client import CONTENT_TYPE_LATEST, CollectorRegistry, generate_latest, multiprocess
+except ImportError:  # metrics are recorded nowhere and /metrics answers 503
+    prometheus_client = None
+
+log = logging.getLogger(__name__)
+
+
+# ---------------------------------------------------------------------
+# PROMETHEUS METRICS
+# ---------------------------------------------------------------------
+# GET /metrics in the Prometheus text format:
+#
+#   http_requests_total, http_request_duration_seconds,
+#   http_response_size_bytes, http_request_mongo_commands ...
+#                             per Flask endpoint (see backend/telemetry.py)
+#   mongo_pool_*              connection pool checkouts and waits
+#   cache_requests_total      hit/miss of the ETag, dashboard shell and
+#                             upload dedup "caches"
+#   executor_queue_depth      work waiting in the query and image pools
+#   upload_bytes_total        bytes stored per bucket
+#   log_records_dropped_total records lost to a full logging queue
+#   domain_*                  donations/requests gauges, read from the
+#                             in-memory counters (backend/domain_counters.py)
+#                             so a scrape never queries Mongo
+#
+# Under gunicorn with several workers each worker has its own counters.
+# Set PROMETHEUS_MULTIPROC_DIR to an empty directory before starting;
+# every worker then writes its values there and /metrics, whichever
+# worker serves it, adds them up. gunicorn.conf.py removes the files of
+# workers that exit.
+
+MULTIPROC_DIR = os.getenv("PROMETHEUS_MULTIPROC_DIR")
+QUEUE_SAMPLE_INTERVAL = 5
+
+LATENCY_BUCKETS = [0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0]
+SIZE_BUCKETS = [1024, 4096, 16384, 65536, 262144, 1048576, 4194304]
+MONGO_COMMAND_BUCKETS = [0, 1, 2, 3, 5, 10, 25, 50, 100]
+CHECKOUT_BUCKETS = [0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0]
+
+DONATION_STATUSES = ["available", "pending", "approved", "completed", "collected", "delivered", "expired"]
+URGENCIES = ["low", "normal", "urgent", "immediate"]
+
+
+class _NoMetric:
+    """Stands in for every metric when prometheus_client is missing"""
+
+    def labels(self, *args, **kwargs):
+        return self
+
+    def inc(self, amount=1):
+        pass
+
+    def dec(self, amount=1):
+        pass
+
+    def set(self, value):
+        pass
+
+    def observe(self, value):
+        pass
+
+
+def _metric(kind, name, documentation, labelnames=(), **kwargs):
+    if prometheus_client is None:
+        return _NoMetric()
+    return getattr(prometheus_client, kind)(name, documentation, labelnames, **kwargs)
+
+
+# Requests
+REQUESTS = _metric("Counter", "http_requests_total", "Requests handled", ["method", "endpoint", "status"])
+REQUEST_LATENCY = _metric(
+    "Histogram", "http_request_duration_seconds", "Time to produce the response", ["method", "endpoint"], buckets=LATENCY_BUCKETS
+)
+RESPONSE_SIZE = _metric(
+    "Histogram", "http_response_size_bytes", "Response body size as sent", ["method", "endpoint"], buckets=SIZE_BUCKETS
+)
+REQUEST_MONGO_COMMANDS = _metric(
+    "Histogram", "http_request_mongo_commands", "Mongo commands issued per request", ["method", "endpoint"],
+    buckets=MONGO_COMMAND_BUCKETS
+)
+REQUEST_MONGO_SECONDS = _metric(
+    "Counter", "http_request_mongo_seconds_total", "Time spent in Mongo commands", ["method", "endpoint"]
+)
+N_PLUS_ONE = _metric(
+    "Counter", "http_n_plus_one_total", "Requests flagged as likely N+1 query patterns", ["method", "endpoint"]
+)
+
+# Mongo connection pool
+POOL_CHECKED_OUT = _metric("Gauge", "mongo_pool_connections_checked_out", "Connections in use", multiprocess_mode="livesum")
+POOL_OPEN = _metric("Gauge", "mongo_pool_connections_open", "Connections open", multiprocess_mode="livesum")
+POOL_CHECKOUT_WAIT = _metric(
+    "Histogram", "mongo_pool_checkout_seconds", "Time waiting for a pooled connection", buckets=CHECKOUT_BUCKETS
+)
+POOL_CHECKOUT_FAILED = _metric(
+    "Counter", "mongo_pool_checkout_failures_total", "Failed connection checkouts", ["reason"]
+)
+
+# Caches, executors, uploads
+CACHE_REQUESTS = _metric("Counter", "cache_requests_total", "Cache lookups", ["cache", "result"])
+EXECUTOR_QUEUE_DEPTH = _metric(
+    "Gauge", "executor_queue_depth", "Tasks queued on the executor", ["executor"], multiprocess_mode="livesum"
+)
+UPLOAD_BYTES = _metric("Counter", "upload_bytes_total", "Bytes of uploaded files stored", ["bucket", "via"])
+LOG_DROPPED = _metric("Counter", "log_records_dropped_total", "Log records dropped on a full logging queue")
+
+# Domain gauges: every worker reports the same numbers, keep the latest
+DONATIONS = _metric("Gauge", "domain_donations", "Donations by status", ["status"], multiprocess_mode="livemostrecent")
+PENDING_REQUESTS = _metric(
+    "Gauge", "domain_pending_requests", "Pending medicine requests by urgency", ["urgency"],
+    multiprocess_mode="livemostrecent"
+)
+EXPIRING_SOON = _metric(
+    "Gauge", "domain_donations_expiring_soon", "Available donations expiring within 30 days",
+    multiprocess_mode="livemostrecent"
+)
+
+
+# ---------------------------------------------------------------------
+# RECORDING
+# ---------------------------------------------------------------------
+def observe_request(method, endpoint, status, elapsed, size, commands, mongo_seconds, n_plus_one):
+    REQUESTS.labels(method, endpoint, str(status)).inc()
+    REQUEST_LATENCY.labels(method, endpoint).observe(elapsed)
+    if size is not None:
+        RESPONSE_SIZE.labels(method, endpoint).observe(size)
+    REQUEST_MONGO_COMMANDS.labels(method, endpoint).observe(commands)
+    REQUEST_MONGO_SECONDS.labels(method, endpoint).inc(mongo_seconds)
+    if n_plus_one:
+        N_PLUS_ONE.labels(method, endpoint).inc()
+
+
+def cache_lookup(cache, hit):
+    CACHE_REQUESTS.labels(cache, "hit" if hit else "miss").inc()
+
+
+def upload_stored(bucket, size, via):
+    UPLOAD_BYTES.labels(bucket, via).inc(size or 0)
+
+
+def log_dropped():
+    LOG_DROPPED.inc()
+
+
+class PoolMetricsListener(monitoring.ConnectionPoolListener):
+    """Passed to MongoClient(event_listeners=[...]) with the command listener"""
+
+    def __init__(self):
+        self._checkout_started = threading.local()
+
+    def pool_created(self, event):
+        pass
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_cleared(self, event):
+        pass
+
+    def pool_closed(self, event):
+        pass
+
+    def connection_created(self, event):
+        POOL_OPEN.inc()
+
+    def connection_ready(self, event):
+        pass
+
+    def connection_closed(self, event):
+        POOL_OPEN.dec()
+
+    def connection_check_out_started(self, event):
+        self._checkout_started.at = time.perf_counter()
+
+    def connection_check_out_failed(self, event):
+        POOL_CHECKOUT_FAILED.labels(str(event.reason)).inc()
+        self._checkout_started.at = None
+
+    def connection_checked_out(self, event):
+        started = getattr(self._checkout_started, "at", None)
+        if started is not None:
+            POOL_CHECKOUT_WAIT.observe(time.perf_counter() - started)
+            self._checkout_started.at = None
+        POOL_CHECKED_OUT.inc()
+
+    def connection_checked_in(self, event):
+        POOL_CHECKED_OUT.dec()
+
+
+pool_listener = PoolMetricsListener()
+
+
+# ---------------------------------------------------------------------
+# SAMPLED VALUES
+# ---------------------------------------------------------------------
+def queue_depths():
+    """Tasks queued but not yet running, per executor of this process"""
+    from backend import concurrency, images
+
+    depths = {"query": concurrency.query_pool._work_queue.qsize()}
+    image_pool = images._pool
+    # ProcessPoolExecutor keeps every submitted, unfinished task here
+    depths["image"] = len(getattr(image_pool, "_pending_work_items", {})) if image_pool else 0
+    return depths
+
+
+class QueueSampler(threading.Thread):
+    """Updates this process' executor gauges; in multiprocess mode a
+    scrape reads every worker's files, so they cannot be set on scrape"""
+
+    def __init__(self):
+        super().__init__(name="metrics-sampler", daemon=True)
+
+    def run(self):
+        while True:
+            try:
+                for executor, depth in queue_depths().items():
+                    EXECUTOR_QUEUE_DEPTH.labels(executor).set(depth)
+            except Exception as e:
+                log.exception("Metrics sampler failed")
+            time.sleep(QUEUE_SAMPLE_INTERVAL)
+
+
+sampler = None
+
+
+def start_metrics_sampler():
+    global sampler
+    if sampler is None and prometheus_client is not None:
+        sampler = QueueSampler()
+        sampler.start()
+    return sampler
+
+
+def set_domain_gauges(snapshot):
+    # Known labels are always set, so a count that dropped to zero shows 0
+    donations = dict.fromkeys(DONATION_STATUSES, 0)
+    donations.update(snapshot["donations_by_status"])
+    for status, count in donations.items():
+        DONATIONS.labels(status).set(count)
+
+    pending = dict.fromkeys(URGENCIES, 0)
+    pending.update(snapshot["pending_requests_by_urgency"])
+    for urgency, count in pending.items():
+        PENDING_REQUESTS.labels(urgency).set(count)
+
+    EXPIRING_SOON.set(snapshot["donations_expiring_soon"])
+
+
+def render_metrics(domain_snapshot):
+    """(body, content_type) of the exposition, or None without prometheus_client"""
+    if prometheus_client is None:
+        return None
+
+    set_domain_gauges(domain_snapshot)
+    if MULTIPROC_DIR:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = prometheus_client.REGISTRY
+    return generate_latest(registry), CONTENT_TYPE_LATEST
+
+
+def mark_process_dead(pid):
+    """gunicorn child_exit hook: drop the live gauges of an exited worker"""
+    if prometheus_client is not None and MULTIPROC_DIR:
+        multiprocess.mark_process_dead(pid)
@@ -0,0 +1,166 @@
+import logging
+import os
+from datetime import datetime
+
+from backend.images import WEBP_QUALITY, Image, ImageOps, rendition_name
+from backend.logs import fields
+
+try:
+    import pypdfium2
+except ImportError:  # PDF prescriptions get no preview or hash
+    pypdfium2 = None
+
+log = logging.getLogger(__name__)
+
+
+# ---------------------------------------------------------------------
+# PRESCRIPTION PREVIEWS AND REUSE DETECTION
+# ---------------------------------------------------------------------
+# Each uploaded prescription (image, or first page of a PDF) is turned
+# into a small WebP preview for the admin review queue and a 64 bit
+# difference hash (dHash) of its content, in the image process pool:
+#
+#   <sha256>.pdf  ->  <sha256>_preview.webp     640px
+#
+# The hash survives re-encoding, rescaling and small edits, so the same
+# paper prescription photographed or exported again hashes to within a
+# few bits. To find those without comparing against every request, the
+# hash is split into 8 bands of 8 bits stored as "<band>:<hex>" keys in
+# an indexed array: two hashes within REUSE_DISTANCE (< 8) bits share
+# at least one band, so the band lookup finds every candidate.
+#
+# Requests sharing a prescription point at each other through
+# "prescription_matches" and carry "prescription_reused": True.
+
+PREVIEW_SIZE = 640
+# Render PDF pages at up to this many pixels on the long side
+PDF_RENDER_SIZE = 1280
+HASH_BANDS = 8
+REUSE_DISTANCE = int(os.getenv("PRESCRIPTION_REUSE_DISTANCE", "6"))
+# Band collisions worth comparing per lookup
+MAX_CANDIDATES = 500
+
+
+def open_prescription(source_path):
+    """First page of a PDF, or the image itself, as an upright PIL image"""
+    if source_path.lower().endswith(".pdf"):
+        if pypdfium2 is None:
+            return None
+        pdf = pypdfium2.PdfDocument(source_path)
+        try:
+            page = pdf[0]
+            width, height = page.get_size()
+            scale = min(3.0, PDF_RENDER_SIZE / max(width, height, 1))
+            return page.render(scale=scale).to_pil()
+        finally:
+            pdf.close()
+
+    with Image.open(source_path) as original:
+        return ImageOps.exif_transpose(original)
+
+
+def dhash(image):
+    """64 bit difference hash as 16 hex digits"""
+    small = image.convert("L").resize((9, 8), Image.LANCZOS)
+    pixels = list(small.getdata())
+    bits = 0
+    for row in range(8):
+        for col in range(8):
+            left = pixels[row * 9 + col]
+            right = pixels[row * 9 + col + 1]
+            bits = (bits << 1) | (left > right)
+    return f"{bits:016x}"
+
+
+def make_preview(source_path, output_dir):
+    """Write the preview and hash the prescription; runs inside the process pool"""
+    image = open_prescription(source_path)
+    if image is None:
+        return None
+
+    image = image.convert("RGB")
+    phash = dhash(image)
+
+    image.thumbnail((PREVIEW_SIZE, PREVIEW_SIZE), Image.LANCZOS)
+    name = rendition_name(os.path.basename(source_path), "preview")
+    tmp_path = os.path.join(output_dir, f".{name}.tmp")
+    image.save(tmp_path, "WEBP", quality=WEBP_QUALITY, method=4)
+    os.replace(tmp_path, os.path.join(output_dir, name))
+
+    return {"renditions": {"preview": name}, "phash": phash}
+
+
+def hash_bands(phash):
+    width = 16 // HASH_BANDS
+    return [f"{band}:{phash[band * width:(band + 1) * width]}" for band in range(HASH_BANDS)]
+
+
+def hamming(a, b):
+    return bin(int(a, 16) ^ int(b, 16)).count("1")
+
+
+def ensure_prescription_indexes(db):
+    db["requests_medicine"].create_index("prescription_phash_bands", sparse=True)
+
+
+def find_reuse(requests_medicine, request_id, phash):
+    """Ids of other requests whose prescription hashes within REUSE_DISTANCE"""
+    candidates = requests_medicine.find(
+        {"prescription_phash_bands": {"$in": hash_bands(phash)}, "_id": {"$ne": request_id}},
+        {"prescription_phash": 1}
+    ).limit(MAX_CANDIDATES)
+    return [doc["_id"] for doc in candidates
+            if hamming(doc["prescription_phash"], phash) <= REUSE_DISTANCE]
+
+
+def record_preview(requests_medicine, request_id, result):
+    """Store a finished preview on the request and flag reuse both ways"""
+    now = datetime.utcnow()
+    matches = find_reuse(requests_medicine, request_id, result["phash"])
+
+    requests_medicine.update_one(
+        {"_id": request_id},
+        {"$set": {
+            "prescription_renditions": result["renditions"],
+            "prescription_phash": result["phash"],
+            "prescription_phash_bands": hash_bands(result["phash"]),
+            "prescription_matches": matches,
+            "prescription_reused": bool(matches),
+            "updated_at": now
+        }}
+    )
+    if matches:
+        requests_medicine.update_many(
+            {"_id": {"$in": matches}},
+            {
+                "$addToSet": {"prescription_matches": request_id},
+                "$set": {"prescription_reused": True, "updated_at": now}
+            }
+        )
+        log.warning("Prescription matches other requests", extra=fields(
+            medicine_request_id=str(request_id), matches=[str(match) for match in matches]
+        ))
+    return matches
+
+
+def build_prescription_preview(store, requests_medicine, request_id, blob):
+    """Preview + hash of a request's prescription in the background,
+    reusing the result of an identical upload"""
+    if blob.get("phash") and blob.get("renditions"):
+        record_preview(requests_medicine, request_id, blob)
+        return
+
+    def finished(result):
+        if result is None:
+            return
+        store.blobs.update_one(
+            {"_id": store.key(blob["name"])},
+            {"$set": {"renditions": result["renditions"], "phash": result["phash"], "updated_at": datetime.utcnow()}}
+        )
+        record_preview(requests_medicine, request_id, result)
+
+    store.run_image_task(
+        blob, make_preview,
+        lambda result: result["renditions"].values() if result else [],
+        finished
+    )
@@ -0,0 +1,199 @@
+import os
+import sys
+import threading
+import time
+from collections import Counter
+
+from flask import g, request, session
+
+
+# ---------------------------------------------------------------------
+# ON-DEMAND SAMPLING PROFILER
+# ---------------------------------------------------------------------
+# Nothing runs until an admin asks for a profile:
+#
+#   GET /get_all_users?__profile=1
+#       profiles that one request; the response is replaced by its
+#       collapsed stacks instead of the usual body
+#
+#   GET /admin/profile?seconds=10
+#       profiles every request this worker serves during the window,
+#       each stack rooted at its Flask endpoint (?threads=all samples
+#       every thread, background workers included)
+#
+# A sampler thread reads the stack of each profiled thread every
+# ?interval_ms (sys._current_frames) and counts identical stacks. The
+# output is the "collapsed" format, one "frame;frame;frame count" line
+# per stack, for flamegraph.pl, speedscope.app or inferno. While the
+# profiled code holds the GIL the real rate is bounded by the switch
+# interval (5 ms by default); the proportions stay right.
+#
+#   curl -b session.txt 'http://host/admin/profile?seconds=30' > app.folded
+#   flamegraph.pl app.folded > app.svg
+#
+# Queries issued through backend/concurrency.py run on query_pool
+# threads and show up in window profiles with ?threads=all only.
+
+PROFILE_PARAM = "__profile"
+MAX_WINDOW_SECONDS = 60
+DEFAULT_INTERVAL_MS = {"request": 1.0, "window": 5.0}
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# thread ident -> endpoint of the request it is serving
+_request_threads = {}
+# One profile at a time per worker keeps the overhead bounded
+_profile_lock = threading.Lock()
+# code object -> "function (file:line)"
+_labels = {}
+
+
+def frame_label(code):
+    label = _labels.get(code)
+    if label is None:
+        path = code.co_filename
+        if path.startswith(ROOT):
+            path = os.path.relpath(path, ROOT)
+        elif "site-packages" in path:
+            path = path.split("site-packages" + os.sep, 1)[1]
+        else:
+            path = os.path.basename(path)
+        label = _labels[code] = f"{code.co_name} ({path}:{code.co_firstlineno})"
+    return label
+
+
+def collapse(frame):
+    stack = []
+    while frame is not None:
+        stack.append(frame_label(frame.f_code))
+        frame = frame.f_back
+    stack.reverse()
+    return ";".join(stack)
+
+
+class StackSampler(threading.Thread):
+    """Counts the stacks of the selected threads until stopped"""
+
+    def __init__(self, interval, thread_ids=None, request_threads_only=False, exclude=None):
+        super().__init__(name="stack-sampler", daemon=True)
+        self.interval = interval
+        self.thread_ids = thread_ids
+        self.exclude = exclude
+        self.request_threads_only = request_threads_only
+        self.stacks = Counter()
+        self.samples = 0
+        self._stopped = threading.Event()
+
+    def run(self):
+        names = {}
+        while not self._stopped.wait(self.interval):
+            self.samples += 1
+            for ident, frame in sys._current_frames().items():
+                if ident == self.ident or ident == self.exclude:
+                    continue
+                if self.thread_ids is not None and ident not in self.thread_ids:
+                    continue
+
+                if self.request_threads_only:
+                    root = _request_threads.get(ident)
+                    if root is None:
+                        continue
+                elif self.thread_ids is None:
+                    root = names.get(ident)
+                    if root is None:
+                        names = {thread.ident: thread.name for thread in threading.enumerate()}
+                        root = names.get(ident, str(ident))
+                else:
+                    root = None
+
+                stack = collapse(frame)
+                self.stacks[f"{root};{stack}" if root else stack] += 1
+
+    def stop(self):
+        self._stopped.set()
+        self.join()
+        return self
+
+    def collapsed(self):
+        return "".join(f"{stack} {count}\n" for stack, count in self.stacks.most_common())
+
+
+def is_admin():
+    user = session.get("user")
+    return bool(user and user.get("user_type") == "admin")
+
+
+def interval_from(args, mode):
+    try:
+        interval_ms = float(args.get("interval_ms", DEFAULT_INTERVAL_MS[mode]))
+    except ValueError:
+        interval_ms = DEFAULT_INTERVAL_MS[mode]
+    return max(0.5, min(interval_ms, 100.0)) / 1000
+
+
+def profile_response(app, sampler, name, elapsed):
+    response = app.response_class(sampler.collapsed(), mimetype="text/plain")
+    response.headers["Content-Disposition"] = f'attachment; filename="{name}.folded"'
+    response.headers["X-Profile-Samples"] = str(sampler.samples)
+    response.headers["X-Profile-Seconds"] = f"{elapsed:.3f}"
+    response.headers["Cache-Control"] = "no-store"
+    return response
+
+
+def profile_window(app, args):
+    """Sample this worker's requests for ?seconds; collapsed stacks response"""
+    try:
+        seconds = max(0.1, min(float(args.get("seconds", 10)), MAX_WINDOW_SECONDS))
+    except ValueError:
+        seconds = 10
+    all_threads = args.get("threads") == "all"
+
+    if not _profile_lock.acquire(blocking=False):
+        return None
+    try:
+        started = time.perf_counter()
+        sampler = StackSampler(
+            interval_from(args, "window"),
+            request_threads_only=not all_threads,
+            exclude=threading.get_ident()      # this request, sleeping
+        )
+        sampler.start()
+        time.sleep(seconds)
+        sampler.stop()
+        return profile_response(app, sampler, f"worker-{os.getpid()}-{int(time.time())}", time.perf_counter() - started)
+    finally:
+        _profile_lock.release()
+
+
+def install_profiler(app):
+    """Register the hooks behind ?__profile=1 and window profiles"""
+
+    @app.before_request
+    def track_request_thread():
+        ident = threading.get_ident()
+        _request_threads[ident] = request.endpoint or "<unmatched>"
+
+        if PROFILE_PARAM in request.args and is_admin() and _profile_lock.acquire(blocking=False):
+            sampler = StackSampler(interval_from(request.args, "request"), thread_ids={ident})
+            g.profile = (sampler, time.perf_counter())
+            sampler.start()
+
+    @app.after_request
+    def finish_request_profile(response):
+        profile = g.pop("profile", None)
+        if profile is None:
+            return response
+        sampler, started = profile
+        try:
+            sampler.stop()
+        finally:
+            _profile_lock.release()
+        return profile_response(app, sampler, request.endpoint or "request", time.perf_counter() - started)
+
+    @app.teardown_request
+    def untrack_request_thread(exc=None):
+        _request_threads.pop(threading.get_ident(), None)
+        profile = g.pop("profile", None)
+        if profile is not None:
+            # The request failed before after_request ran
+            profile[0].stop()
+            _profile_lock.release()
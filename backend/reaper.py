@@ -0,0 +1,277 @@
+import logging
+import os
+import socket
+import threading
+import time
+from datetime import datetime, timedelta
+
+from pymongo import ASCENDING, ReturnDocument, UpdateOne
+from pymongo.errors import BulkWriteError, DuplicateKeyError
+
+from backend.blobs import BLOBS_COLLECTION, DELETION_QUEUE_COLLECTION, enqueue_deletion
+from backend.logs import fields
+from backend.uploads import STAGING_FOLDER
+
+log = logging.getLogger(__name__)
+
+
+# ---------------------------------------------------------------------
+# DEFERRED FILE DELETION
+# ---------------------------------------------------------------------
+# Request handlers never delete files themselves: BlobStore.release()
+# enqueues the storage keys of files nothing refers to any more (see
+# enqueue_deletion in backend/blobs.py) and this background reaper
+# removes them in batches.
+#
+# Before deleting, the reaper claims each blob: "deleting" is set on its
+# document only while refs <= 0, in one update. A blob referenced again
+# in the meantime (an identical file uploaded during the grace period)
+# fails the claim and keeps its files; a reference added after the claim
+# sees the mark, and BlobStore.put() stores the file again once the
+# reaper is done with it. A reconciler periodically compares what is
+# stored with the image/prescription fields in Mongo and enqueues leaked
+# files in bulk (replaced images missed by old code, abandoned presigned
+# uploads...).
+#
+# Every worker starts the thread, but only the holder of the reaper
+# lease (a document in the leases collection, renewed each pass) reaps
+# and reconciles. The first reconcile waits RECONCILE_DELAY after boot,
+# and the time of the last one is kept in the lease, so restarts and
+# changes of holder do not rescan the storage.
+
+REAPER_INTERVAL = float(os.getenv("REAPER_INTERVAL", "30"))
+REAPER_BATCH_SIZE = 500
+RECONCILE_INTERVAL = float(os.getenv("RECONCILE_INTERVAL", str(6 * 3600)))
+RECONCILE_DELAY = float(os.getenv("RECONCILE_DELAY", "600"))
+LEASES_COLLECTION = "leases"
+REAPER_LEASE = "file-reaper"
+# A holder that stops renewing for this long is presumed dead
+REAPER_LEASE_SECONDS = float(os.getenv("REAPER_LEASE_SECONDS", str(max(300, 4 * REAPER_INTERVAL))))
+DUPLICATE_KEY = 11000
+# Files younger than this may belong to an upload still in flight
+LEAK_MIN_AGE = timedelta(hours=1)
+
+# collection, file field, renditions field, bucket
+FILE_REFERENCES = [
+    ("donated_medicine", "image", "image_renditions", "medicine_images"),
+    ("requests_medicine", "prescription", "prescription_renditions", "prescriptions"),
+    ("donar", "profile_image", "profile_image_renditions", "profile_images"),
+    ("receiver", "profile_image", "profile_image_renditions", "profile_images"),
+    ("admin", "profile_image", "profile_image_renditions", "profile_images"),
+]
+
+# Shipped with the app, never uploaded
+KEEP_FILES = {"default.png"}
+
+
+# ---------------------------------------------------------------------
+# REAPER
+# ---------------------------------------------------------------------
+def reap(db, storage, batch_size=REAPER_BATCH_SIZE):
+    """Delete one batch of due files; returns how many entries were processed"""
+    queue = db[DELETION_QUEUE_COLLECTION]
+    due = list(
+        queue.find({"not_before": {"$lte": datetime.utcnow()}})
+        .sort("not_before", ASCENDING)
+        .limit(batch_size)
+    )
+    if not due:
+        return 0
+
+    blob_ids = sorted({entry["blob_id"] for entry in due if entry.get("blob_id")})
+    claimed, revived = claim_blobs(db, blob_ids)
+
+    keys = [entry["_id"] for entry in due if entry.get("blob_id") not in revived]
+    if keys:
+        storage.delete(keys)
+    release_claims(db, claimed)
+    queue.delete_many({"_id": {"$in": [entry["_id"] for entry in due]}})
+    return len(due)
+
+
+def claim_blobs(db, blob_ids):
+    """Mark blobs nothing refers to as being deleted; returns (claimed, revived)"""
+    if not blob_ids:
+        return [], set()
+
+    blobs = db[BLOBS_COLLECTION]
+    now = datetime.utcnow()
+    operations = []
+    for blob_id in blob_ids:
+        bucket, name = blob_id.split("/", 1)
+        # Upserted when release() already removed the document, so a
+        # concurrent add_reference() still finds the mark. Renditions
+        # go with the files and are rebuilt for the next reference.
+        operations.append(UpdateOne(
+            {"_id": blob_id, "refs": {"$lte": 0}},
+            {
+                "$set": {"deleting": now},
+                "$unset": {"renditions": ""},
+                "$setOnInsert": {"bucket": bucket, "name": name, "refs": 0, "created_at": now}
+            },
+            upsert=True
+        ))
+
+    failed = set()
+    try:
+        blobs.bulk_write(operations, ordered=False)
+    except BulkWriteError as e:
+        # A duplicate _id: the blob exists with refs > 0
+        for error in e.details["writeErrors"]:
+            if error["code"] != DUPLICATE_KEY:
+                raise
+            failed.add(error["index"])
+
+    revived = {blob_ids[index] for index in failed}
+    if revived:
+        # Marks left by a reaper that died mid-pass
+        blobs.update_many({"_id": {"$in": list(revived)}, "deleting": {"$exists": True}},
+                          {"$unset": {"deleting": ""}})
+    return [blob_id for blob_id in blob_ids if blob_id not in revived], revived
+
+
+def release_claims(db, blob_ids):
+    """Drop the claimed blobs, or their mark if referenced during the deletion"""
+    if not blob_ids:
+        return
+    blobs = db[BLOBS_COLLECTION]
+    blobs.delete_many({"_id": {"$in": blob_ids}, "refs": {"$lte": 0}})
+    blobs.update_many({"_id": {"$in": blob_ids}}, {"$unset": {"deleting": ""}})
+
+
+# ---------------------------------------------------------------------
+# RECONCILER
+# ---------------------------------------------------------------------
+def referenced_keys(db):
+    """Storage keys some record (or live blob) still points at"""
+    keys = set()
+    for collection, field, renditions_field, bucket in FILE_REFERENCES:
+        projection = {field: 1}
+        if renditions_field:
+            projection[renditions_field] = 1
+        for doc in db[collection].find({field: {"$nin": [None, ""]}}, projection):
+            keys.add(f"{bucket}/{doc[field]}")
+            renditions = doc.get(renditions_field) or {}
+            for name in renditions.values():
+                keys.add(f"{bucket}/{name}")
+
+    for blob in db[BLOBS_COLLECTION].find({"refs": {"$gt": 0}}, {"bucket": 1, "name": 1, "renditions": 1}):
+        keys.add(blob["_id"])
+        for name in (blob.get("renditions") or {}).values():
+            keys.add(f"{blob['bucket']}/{name}")
+    return keys
+
+
+def reconcile(db, storage):
+    """Enqueue stored files nothing refers to; returns how many"""
+    cutoff = datetime.utcnow() - LEAK_MIN_AGE
+    referenced = referenced_keys(db)
+    buckets = sorted({bucket for _, _, _, bucket in FILE_REFERENCES})
+
+    leaked = []
+    for bucket in buckets:
+        for key, modified_at in storage.list_keys(bucket):
+            name = key.rsplit("/", 1)[-1]
+            if name in KEEP_FILES or name.startswith(".") or key in referenced:
+                continue
+            if modified_at > cutoff:
+                continue
+            leaked.append(key)
+
+    enqueue_deletion(db, leaked, delay=timedelta(0))
+    sweep_staging(cutoff)
+    return len(leaked)
+
+
+def sweep_staging(cutoff):
+    """Remove staged uploads left behind by crashed workers"""
+    if not os.path.isdir(STAGING_FOLDER):
+        return
+    for entry in os.scandir(STAGING_FOLDER):
+        try:
+            if datetime.utcfromtimestamp(entry.stat().st_mtime) > cutoff:
+                continue
+            if entry.is_dir():
+                for child in os.scandir(entry.path):
+                    os.remove(child.path)
+                os.rmdir(entry.path)
+            else:
+                os.remove(entry.path)
+        except OSError:
+            pass
+
+
+# ---------------------------------------------------------------------
+# LEASE
+# ---------------------------------------------------------------------
+def acquire_lease(db, holder, seconds=REAPER_LEASE_SECONDS):
+    """Take or renew the reaper lease; returns the lease document, or None
+    while another process holds it"""
+    now = datetime.utcnow()
+    try:
+        return db[LEASES_COLLECTION].find_one_and_update(
+            {"_id": REAPER_LEASE, "$or": [{"holder": holder}, {"expires_at": {"$lt": now}}]},
+            {
+                "$set": {"holder": holder, "expires_at": now + timedelta(seconds=seconds)},
+                # First holder ever: the first reconcile waits RECONCILE_DELAY
+                "$setOnInsert": {
+                    "reconciled_at": now - timedelta(seconds=max(RECONCILE_INTERVAL - RECONCILE_DELAY, 0))
+                }
+            },
+            upsert=True,
+            return_document=ReturnDocument.AFTER
+        )
+    except DuplicateKeyError:
+        # Held, and not expired
+        return None
+
+
+# ---------------------------------------------------------------------
+# BACKGROUND THREAD
+# ---------------------------------------------------------------------
+class Reaper(threading.Thread):
+
+    def __init__(self, db, storage):
+        super().__init__(name="file-reaper", daemon=True)
+        self.db = db
+        self.storage = storage
+        self.started_at = time.monotonic()
+
+    def run(self):
+        holder = f"{socket.gethostname()}:{os.getpid()}"
+        while True:
+            try:
+                lease = acquire_lease(self.db, holder)
+                if lease is not None:
+                    self.run_pass(lease)
+            except Exception as e:
+                log.exception("File reaper error")
+            time.sleep(REAPER_INTERVAL)
+
+    def run_pass(self, lease):
+        # Drain the backlog batch by batch
+        while reap(self.db, self.storage) == REAPER_BATCH_SIZE:
+            pass
+
+        now = datetime.utcnow()
+        due = lease["reconciled_at"] + timedelta(seconds=RECONCILE_INTERVAL)
+        if now < due or time.monotonic() - self.started_at < RECONCILE_DELAY:
+            return
+        # Recorded first, so a reconcile that fails is not retried every pass
+        self.db[LEASES_COLLECTION].update_one(
+            {"_id": REAPER_LEASE, "holder": lease["holder"]}, {"$set": {"reconciled_at": now}}
+        )
+        leaked = reconcile(self.db, self.storage)
+        if leaked:
+            log.info("Reconciler queued leaked files for deletion", extra=fields(count=leaked))
+
+
+reaper = None
+
+
+def start_reaper(db, storage):
+    global reaper
+    if reaper is None:
+        reaper = Reaper(db, storage)
+        reaper.start()
+    return reaper
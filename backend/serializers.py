@@ -0,0 +1,465 @@
+from datetime import datetime, timedelta
+
+from backend.images import rendition_urls
+from backend.storage import get_storage
+
+
+# ---------------------------------------------------------------------
+# SHARED ROUTE LOGIC
+# ---------------------------------------------------------------------
+# Row formatting and stats calculation used by both the Flask app
+# (app.py) and the async entry point (asgi.py). The handlers only do
+# the database reads; everything that turns documents into JSON lives
+# here so both servers return exactly the same payloads.
+
+def medicine_image_url():
+    return get_storage().url_prefix("medicine_images")
+
+
+SUCCESSFUL_DONATION_STATUSES = ["completed", "collected", "delivered"]
+PENDING_DONATION_STATUSES = ["available", "pending", "approved"]
+
+
+# ---------------------------------------------------------------------
+# TIME AGO HELPERS
+# ---------------------------------------------------------------------
+def time_ago(created_at, now, weeks=False):
+    """Time ago ladder used by the donation and request lists"""
+    time_diff = now - created_at
+
+    if time_diff < timedelta(minutes=1):
+        return "Just now"
+    elif time_diff < timedelta(hours=1):
+        minutes = int(time_diff.total_seconds() / 60)
+        return f"{minutes} minute{'s' if minutes > 1 else ''} ago"
+    elif time_diff < timedelta(days=1):
+        hours = int(time_diff.total_seconds() / 3600)
+        return f"{hours} hour{'s' if hours > 1 else ''} ago"
+    elif time_diff < timedelta(days=7):
+        days = time_diff.days
+        return f"{days} day{'s' if days > 1 else ''} ago"
+    elif weeks and time_diff < timedelta(days=30):
+        weeks_count = time_diff.days // 7
+        return f"{weeks_count} week{'s' if weeks_count > 1 else ''} ago"
+    return created_at.strftime("%b %d, %Y")
+
+
+def short_time_ago(created_at, now):
+    """Compact time ago used by the admin activity feed"""
+    if not created_at:
+        return "Recently"
+
+    time_diff = now - created_at
+    if time_diff < timedelta(hours=1):
+        minutes = int(time_diff.total_seconds() / 60)
+        return f"{minutes} min ago"
+    elif time_diff < timedelta(days=1):
+        hours = int(time_diff.total_seconds() / 3600)
+        return f"{hours} hour{'s' if hours > 1 else ''} ago"
+    days = time_diff.days
+    return f"{days} day{'s' if days > 1 else ''} ago"
+
+
+def registration_time_ago(created_at, now):
+    """Day level time ago used for new registrations"""
+    if not created_at:
+        return "Recently"
+
+    time_diff = now - created_at
+    if time_diff < timedelta(hours=24):
+        return "Today"
+    days = time_diff.days
+    return f"{days} day{'s' if days > 1 else ''} ago"
+
+
+def iso(value):
+    return value.isoformat() if value else None
+
+
+# ---------------------------------------------------------------------
+# PER ROW CLASSIFICATION
+# ---------------------------------------------------------------------
+def expiry_info(expiry_date, today):
+    """Return (days_until_expiry, expiry_status) for a YYYY-MM-DD string"""
+    if not expiry_date:
+        return None, "safe"
+
+    try:
+        expiry = datetime.strptime(expiry_date, "%Y-%m-%d")
+    except (TypeError, ValueError):
+        return None, "unknown"
+
+    days_until_expiry = (expiry - today).days
+
+    if days_until_expiry < 0:
+        expiry_status = "expired"
+    elif days_until_expiry <= 30:
+        expiry_status = "expiring_soon"
+    elif days_until_expiry <= 90:
+        expiry_status = "moderate"
+    else:
+        expiry_status = "safe"
+
+    return days_until_expiry, expiry_status
+
+
+URGENCY_COLORS = {
+    "immediate": "danger",
+    "urgent": "warning",
+    "low": "success",
+}
+
+
+def urgency_color(urgency):
+    return URGENCY_COLORS.get(urgency, "normal")
+
+
+# ---------------------------------------------------------------------
+# DONOR
+# ---------------------------------------------------------------------
+def donor_stats(all_donations):
+    """Donor dashboard statistics from the donor's donation documents"""
+    successful = 0
+    pending = 0
+    lives_impacted = 0
+
+    for donation in all_donations:
+        status = donation.get("status")
+        if status in SUCCESSFUL_DONATION_STATUSES:
+            successful += 1
+            lives_impacted += donation.get("quantity", 0)
+        elif status in PENDING_DONATION_STATUSES:
+            pending += 1
+
+    return {
+        "total_donated": len(all_donations),
+        "successful": successful,
+        "pending": pending,
+        "lives_impacted": lives_impacted
+    }
+
+
+def donation_history_row(donation, now):
+    """Row for the donor donation history"""
+    created_at = donation.get("created_at") or now
+
+    return {
+        "id": str(donation.get("_id")),
+        "medicine_name": donation.get("medicineName", "Medicine"),
+        "manufacturer": donation.get("manufacturer", ""),
+        "quantity": donation.get("quantity", 0),
+        "expiry_date": donation.get("expiryDate", "N/A"),
+        "category": donation.get("category", ""),
+        "condition": donation.get("condition", ""),
+        "description": donation.get("description", ""),
+        "status": donation.get("status", "available"),
+        "image": donation.get("image", ""),
+        "image_urls": rendition_urls(medicine_image_url(), donation.get("image"), donation.get("image_renditions")),
+        "time_ago": time_ago(created_at, now),
+        "created_at": iso(created_at)
+    }
+
+
+# ---------------------------------------------------------------------
+# RECEIVER
+# ---------------------------------------------------------------------
+def available_medicine_row(medicine, today):
+    """Row for the receiver's available medicines grid"""
+    expiry_date = medicine.get("expiryDate")
+    days_until_expiry, expiry_status = expiry_info(expiry_date, today)
+
+    return {
+        "id": str(medicine.get("_id")),
+        "medicine_name": medicine.get("medicineName", "Unknown"),
+        "manufacturer": medicine.get("manufacturer", "Unknown"),
+        "quantity": medicine.get("quantity", 0),
+        "expiry_date": expiry_date,
+        "days_until_expiry": days_until_expiry,
+        "expiry_status": expiry_status,
+        "category": medicine.get("category", "other"),
+        "condition": medicine.get("condition", "good"),
+        "description": medicine.get("description", ""),
+        "image": medicine.get("image", ""),
+        "image_urls": rendition_urls(medicine_image_url(), medicine.get("image"), medicine.get("image_renditions")),
+        "donor_username": medicine.get("username", "Anonymous"),
+        "donor_email": medicine.get("email", ""),
+        "created_at": iso(medicine.get("created_at"))
+    }
+
+
+def receiver_stats(all_requests):
+    """Receiver dashboard statistics from the receiver's requests"""
+    counts = {"pending": 0, "approved": 0, "completed": 0, "cancelled": 0}
+    medicines_received = 0
+
+    for req in all_requests:
+        status = req.get("status")
+        if status in counts:
+            counts[status] += 1
+        if status == "completed":
+            medicines_received += req.get("quantity", 0)
+
+    return {
+        "total_requests": len(all_requests),
+        "pending": counts["pending"],
+        "approved": counts["approved"],
+        "completed": counts["completed"],
+        "cancelled": counts["cancelled"],
+        "medicines_received": medicines_received,
+        "upcoming_pickups": counts["approved"]
+    }
+
+
+EMPTY_RECEIVER_STATS = {
+    "total_requests": 0,
+    "pending": 0,
+    "approved": 0,
+    "completed": 0,
+    "cancelled": 0,
+    "medicines_received": 0,
+    "upcoming_pickups": 0
+}
+
+
+def receiver_request_row(req, now):
+    """Row for the receiver's request history"""
+    created_at = req.get("created_at")
+
+    return {
+        "id": str(req.get("_id")),
+        "medicine_name": req.get("medicine_name", "Unknown"),
+        "dosage": req.get("dosage", ""),
+        "quantity": req.get("quantity", 0),
+        "urgency": req.get("urgency", "normal"),
+        "preferred_location": req.get("preferred_location", ""),
+        "status": req.get("status", "pending"),
+        "donor_username": req.get("donor_username", "Pending"),
+        "donor_email": req.get("donor_email"),
+        "prescription": req.get("prescription"),
+        "additional_notes": req.get("additional_notes", ""),
+        "created_at": iso(created_at),
+        "time_ago": time_ago(created_at, now) if created_at else "Recently"
+    }
+
+
+# ---------------------------------------------------------------------
+# ADMIN
+# ---------------------------------------------------------------------
+def admin_stat_queries(now):
+    """Named count queries behind /get_admin_stats as (collection, filter)"""
+    today_start = now.replace(hour=0, minute=0, second=0, microsecond=0)
+
+    return {
+        "total_donors": ("donar", {}),
+        "total_receivers": ("receiver", {}),
+        "total_admins": ("admin", {}),
+        "pending_requests": ("requests_medicine", {"status": "pending"}),
+        "completed_donations": ("donated_medicine", {"status": "completed"}),
+        "completed_requests": ("requests_medicine", {"status": "completed"}),
+        "unverified_donors": ("donar", {"verified": {"$ne": True}}),
+        "unverified_receivers": ("receiver", {"verified": {"$ne": True}}),
+        "today_donors": ("donar", {"created_at": {"$gte": today_start}}),
+        "today_receivers": ("receiver", {"created_at": {"$gte": today_start}}),
+        "suspended_donors": ("donar", {"status": "suspended"}),
+        "suspended_receivers": ("receiver", {"status": "suspended"}),
+        "blocked_donors": ("donar", {"status": "blocked"}),
+        "blocked_receivers": ("receiver", {"status": "blocked"}),
+    }
+
+
+def admin_stats(counts):
+    """Admin dashboard statistics from the results of admin_stat_queries"""
+    total_donors = counts["total_donors"]
+    total_receivers = counts["total_receivers"]
+    total_admins = counts["total_admins"]
+
+    return {
+        "total_users": total_donors + total_receivers + total_admins,
+        # No last_login tracking yet, so every donor/receiver counts as active
+        "active_users": total_donors + total_receivers,
+        "pending_requests": counts["pending_requests"],
+        "completed_total": counts["completed_donations"] + counts["completed_requests"],
+        "total_donors": total_donors,
+        "total_receivers": total_receivers,
+        "total_admins": total_admins,
+        "pending_verifications": counts["unverified_donors"] + counts["unverified_receivers"],
+        "today_registrations": counts["today_donors"] + counts["today_receivers"],
+        "suspended_users": counts["suspended_donors"] + counts["suspended_receivers"],
+        "blocked_users": counts["blocked_donors"] + counts["blocked_receivers"]
+    }
+
+
+EMPTY_ADMIN_STATS = {
+    "total_users": 0,
+    "active_users": 0,
+    "pending_requests": 0,
+    "completed_total": 0,
+    "total_donors": 0,
+    "total_receivers": 0,
+    "total_admins": 1,
+    "pending_verifications": 0,
+    "today_registrations": 0,
+    "suspended_users": 0,
+    "blocked_users": 0
+}
+
+
+def admin_donation_row(donation, now):
+    """Row for the admin donations table"""
+    created_at = donation.get("created_at")
+
+    return {
+        "id": str(donation.get("_id")),
+        "medicine_name": donation.get("medicineName", "Unknown"),
+        "manufacturer": donation.get("manufacturer", ""),
+        "quantity": donation.get("quantity", 0),
+        "expiry_date": donation.get("expiryDate", "N/A"),
+        "category": donation.get("category", "other"),
+        "condition": donation.get("condition", "good"),
+        "status": donation.get("status", "available"),
+        "donor_username": donation.get("username", "Anonymous"),
+        "donor_email": donation.get("email", ""),
+        "image": donation.get("image", ""),
+        "image_urls": rendition_urls(medicine_image_url(), donation.get("image"), donation.get("image_renditions")),
+        "created_at": iso(created_at),
+        "time_ago": time_ago(created_at, now) if created_at else "Recently"
+    }
+
+
+def admin_donation_counts(donations):
+    counts = {"total": len(donations), "available": 0, "claimed": 0, "completed": 0, "expired": 0}
+
+    for donation in donations:
+        status = donation["status"]
+        if status == "available":
+            counts["available"] += 1
+        elif status in ("pending", "approved"):
+            counts["claimed"] += 1
+        elif status == "completed":
+            counts["completed"] += 1
+        elif status == "expired":
+            counts["expired"] += 1
+
+    return counts
+
+
+# Prescriptions are served by the app, behind its access check
+PRESCRIPTION_URL_PREFIX = "/prescriptions"
+
+
+def prescription_urls(req):
+    """Original prescription URL and its preview (the original until built)"""
+    prescription = req.get("prescription")
+    if not prescription:
+        return None, None
+    url_prefix = PRESCRIPTION_URL_PREFIX
+    preview = (req.get("prescription_renditions") or {}).get("preview")
+    original = f"{url_prefix}/{prescription}"
+    return original, f"{url_prefix}/{preview}" if preview else None
+
+
+def admin_request_row(req, now):
+    """Row for the admin medicine requests table"""
+    created_at = req.get("created_at")
+    prescription_url, prescription_preview_url = prescription_urls(req)
+
+    return {
+        "id": str(req.get("_id")),
+        "medicine_name": req.get("medicine_name", "Unknown"),
+        "dosage": req.get("dosage", ""),
+        "quantity": req.get("quantity", 0),
+        "urgency": req.get("urgency", "normal"),
+        "urgency_color": urgency_color(req.get("urgency")),
+        "preferred_location": req.get("preferred_location", ""),
+        "status": req.get("status", "pending"),
+        "receiver_username": req.get("receiver_username", "Unknown"),
+        "receiver_email": req.get("receiver_email", ""),
+        "receiver_id": req.get("receiver_id", ""),
+        "prescription": req.get("prescription"),
+        "prescription_url": prescription_url,
+        "prescription_preview_url": prescription_preview_url,
+        "prescription_reused": bool(req.get("prescription_reused")),
+        "prescription_matches": [str(match) for match in req.get("prescription_matches") or []],
+        "additional_notes": req.get("additional_notes", ""),
+        "donor_username": req.get("donor_username"),
+        "donor_email": req.get("donor_email"),
+        "created_at": iso(created_at),
+        "time_ago": time_ago(created_at, now) if created_at else "Recently"
+    }
+
+
+def admin_request_counts(requests):
+    counts = {"total": len(requests), "pending": 0, "approved": 0, "completed": 0, "cancelled": 0}
+
+    for req in requests:
+        if req["status"] in counts:
+            counts[req["status"]] += 1
+
+    return counts
+
+
+def admin_activity_row(activity, now):
+    """Row for the admin recent activity feed"""
+    created_at = activity.get("created_at")
+    data = activity.get("data", {})
+    username = activity.get("actor_username") or "Someone"
+    activity_type = activity.get("type")
+    actor_type = activity.get("actor_type")
+
+    if activity_type == "donation":
+        icon, icon_color, title = "fa-donate", "orange", "New Medicine Donation"
+        description = f"{username} donated {data.get('quantity')} units of {data.get('medicine_name')}"
+        ago = short_time_ago(created_at, now)
+    elif activity_type == "request":
+        icon, icon_color, title = "fa-prescription", "blue", "New Medicine Request"
+        description = f"{username} requested {data.get('quantity')} units of {data.get('medicine_name')}"
+        ago = short_time_ago(created_at, now)
+    elif activity_type == "registration":
+        icon, title = "fa-user-plus", f"New {actor_type.capitalize() if actor_type else 'User'} Registration"
+        icon_color = "green" if actor_type == "donor" else "teal"
+        description = f"{username} joined as a {actor_type}"
+        ago = registration_time_ago(created_at, now)
+    elif activity_type == "request_status":
+        icon, icon_color = "fa-clipboard-check", "purple"
+        title = f"Request {str(data.get('status', 'updated')).capitalize()}"
+        description = f"{username}'s request for {data.get('medicine_name')} is now {data.get('status')}"
+        ago = short_time_ago(created_at, now)
+    elif activity_type == "prescription_verified":
+        icon, icon_color, title = "fa-file-medical", "blue", "Prescription Verified"
+        description = f"Prescription for {username}'s request of {data.get('medicine_name')} was verified"
+        ago = short_time_ago(created_at, now)
+    elif activity_type == "user_verified":
+        icon, icon_color, title = "fa-user-check", "green", "User Verified"
+        description = f"{username} ({actor_type}) was verified"
+        ago = short_time_ago(created_at, now)
+    else:
+        icon, icon_color, title = "fa-user-cog", "gray", "User Status Changed"
+        description = f"{username} ({actor_type}) is now {data.get('status')}"
+        ago = short_time_ago(created_at, now)
+
+    return {
+        "id": str(activity.get("_id")),
+        "type": activity_type,
+        "icon": icon,
+        "icon_color": icon_color,
+        "title": title,
+        "description": description,
+        "time_ago": ago,
+        "created_at": iso(created_at)
+    }
+
+
+def donor_feed_row(activity, now):
+    """Row for the donor recent activity list, from a donation activity"""
+    created_at = activity.get("created_at") or now
+    data = activity.get("data", {})
+
+    return {
+        "id": activity.get("subject_id"),
+        "medicine_name": data.get("medicine_name") or "Medicine",
+        "quantity": data.get("quantity", 0),
+        "expiry_date": data.get("expiry_date") or "N/A",
+        "status": data.get("status", "available"),
+        "time_ago": time_ago(created_at, now, weeks=True),
+        "created_at": iso(created_at)
+    }
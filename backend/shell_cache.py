@@ -0,0 +1,92 @@
+import re
+import threading
+
+from flask import current_app, render_template
+from jinja2.utils import htmlsafe_json_dumps
+from markupsafe import escape
+
+from backend.metrics import cache_lookup
+
+
+# ---------------------------------------------------------------------
+# DASHBOARD SHELL CACHE
+# ---------------------------------------------------------------------
+# The dashboard templates are large and almost entirely the same for
+# every user of a role; only the username, id and profile image differ.
+# Each template is rendered once per process (per role, with and without
+# a profile image, since the template branches on it) with placeholder
+# values, and split at the placeholders. A page view then only joins the
+# cached pieces with the escaped values of the current user.
+#
+# A placeholder in double quotes is a |tojson value and gets a JSON
+# string; anywhere else it gets HTML escaped text. With debug or
+# TEMPLATES_AUTO_RELOAD on, templates are rendered normally.
+
+PLACEHOLDERS = {
+    "_id": "__shell_user_id__",
+    "username": "__shell_username__",
+    "profile_image": "__shell_profile_image__",
+}
+FIELDS = {token: field for field, token in PLACEHOLDERS.items()}
+
+PLACEHOLDER = re.compile(r'("?)(' + "|".join(PLACEHOLDERS.values()) + r')("?)')
+
+
+class ShellCache:
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._shells = {}
+
+    def compile(self, html):
+        """Split rendered html into [literal, (field, is_json), literal, ...]"""
+        pieces = []
+        position = 0
+        for match in PLACEHOLDER.finditer(html):
+            open_quote, token, close_quote = match.groups()
+            is_json = bool(open_quote and close_quote)
+            start = match.start() if is_json else match.start(2)
+            end = match.end() if is_json else match.end(2)
+            pieces.append(html[position:start])
+            pieces.append((FIELDS[token], is_json))
+            position = end
+        pieces.append(html[position:])
+        return pieces
+
+    def shell(self, template, user_type, has_profile_image):
+        key = (template, user_type, has_profile_image)
+        pieces = self._shells.get(key)
+        cache_lookup("dashboard_shell", pieces is not None)
+        if pieces is None:
+            placeholder_user = dict(PLACEHOLDERS, user_type=user_type)
+            if not has_profile_image:
+                placeholder_user["profile_image"] = None
+            pieces = self.compile(render_template(template, user=placeholder_user))
+            with self._lock:
+                self._shells[key] = pieces
+        return pieces
+
+    def render(self, template, user, user_type):
+        app = current_app
+        if app.debug or app.config.get("TEMPLATES_AUTO_RELOAD"):
+            return render_template(template, user=user)
+
+        values = {field: str(user.get(field) or "") for field in PLACEHOLDERS}
+        out = []
+        for piece in self.shell(template, user_type, bool(user.get("profile_image"))):
+            if isinstance(piece, str):
+                out.append(piece)
+            else:
+                field, is_json = piece
+                if is_json:
+                    out.append(str(htmlsafe_json_dumps(values[field], dumps=app.json.dumps)))
+                else:
+                    out.append(str(escape(values[field])))
+        return "".join(out)
+
+    def clear(self):
+        with self._lock:
+            self._shells.clear()
+
+
+dashboard_shells = ShellCache()
@@ -0,0 +1,312 @@
+import hashlib
+import json
+import logging
+import os
+import queue
+import random
+import threading
+import time
+from datetime import datetime
+
+from pymongo import DESCENDING, monitoring
+from pymongo.errors import CollectionInvalid, PyMongoError
+
+from backend.logs import current_request_id, fields
+from backend.telemetry import current_route
+
+log = logging.getLogger(__name__)
+
+
+# ---------------------------------------------------------------------
+# SLOW QUERY LOG
+# ---------------------------------------------------------------------
+# slow_query_listener (passed to MongoClient with the other listeners)
+# notices every read/write command slower than SLOW_QUERY_MS and hands
+# it to a background thread, which stores it in the capped collection
+# slow_queries:
+#
+# {
+#     "at": datetime,
+#     "command": "find" | "aggregate" | "update" | ...,
+#     "collection": "donated_medicine",
+#     "shape": {"status": "?", "created_at": {"$gte": "?"}},   # values redacted
+#     "fingerprint": "3f9a1c0e2b7d",   # same shape, same fingerprint
+#     "duration_ms": 412.7,
+#     "route": "GET /get_all_donations_admin" | None,
+#     "request_id": "9f1c..." | None,
+#     "plan": {...} | None             # sampled explain(), values redacted
+# }
+#
+# explain() runs in "queryPlanner" mode, which plans the query without
+# executing it again, for EXPLAIN_SAMPLE_RATE of the slow commands and
+# at most once per fingerprint every EXPLAIN_INTERVAL seconds.
+
+SLOW_QUERIES_COLLECTION = "slow_queries"
+SLOW_QUERIES_SIZE = 16 * 1024 * 1024
+SLOW_QUERIES_MAX = 20000
+
+SLOW_QUERY_MS = float(os.getenv("SLOW_QUERY_MS", "100"))
+EXPLAIN_SAMPLE_RATE = float(os.getenv("SLOW_QUERY_EXPLAIN_RATE", "0.2"))
+EXPLAIN_INTERVAL = float(os.getenv("SLOW_QUERY_EXPLAIN_INTERVAL", "300"))
+QUEUE_SIZE = 1000
+
+# command -> fields holding the filter (or pipeline) worth a shape
+SHAPE_FIELDS = {
+    "find": ["filter", "sort", "projection"],
+    "aggregate": ["pipeline"],
+    "count": ["query"],
+    "distinct": ["key", "query"],
+    "findAndModify": ["query", "sort"],
+    "update": ["updates"],
+    "delete": ["deletes"],
+}
+# Per operation fields of the bulk write commands
+STATEMENT_FIELDS = {"update": ["q", "u"], "delete": ["q"]}
+# Keys kept verbatim: they name fields, they are not values
+VERBATIM_FIELDS = {"sort", "projection", "key"}
+
+# Session/cluster fields that explain does not accept
+NOT_EXPLAINABLE = {"lsid", "txnNumber", "autocommit", "startTransaction", "readConcern", "writeConcern"}
+
+PLAN_DEPTH = 12
+
+
+# ---------------------------------------------------------------------
+# REDACTION
+# ---------------------------------------------------------------------
+def redact(value):
+    """value with every literal replaced by "?" (operators and field names kept)"""
+    if isinstance(value, dict):
+        return {key: redact(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        # {"$in": [...]} and friends: one entry shows the shape
+        return [redact(value[0])] if value else []
+    if isinstance(value, str) and value.startswith("$"):
+        return value  # a field path in a pipeline, not a value
+    return "?"
+
+
+def command_shape(name, command):
+    shape = {}
+    for field in SHAPE_FIELDS.get(name, []):
+        if field not in command:
+            continue
+        value = command[field]
+        if field in VERBATIM_FIELDS:
+            shape[field] = value
+        elif field in ("updates", "deletes"):
+            statements = value[:1]
+            shape[field] = [
+                {key: redact(statement[key]) for key in STATEMENT_FIELDS[name] if key in statement}
+                for statement in statements
+            ]
+        elif field == "pipeline":
+            shape[field] = [redact(stage) for stage in value]
+        else:
+            shape[field] = redact(value)
+    return shape
+
+
+def fingerprint(name, collection, shape):
+    data = json.dumps([name, collection, shape], sort_keys=True, default=str)
+    return hashlib.sha1(data.encode("utf-8")).hexdigest()[:12]
+
+
+def redact_plan(plan, depth=0):
+    """The stages of a winning plan, with the literals of its filters removed"""
+    if depth > PLAN_DEPTH:
+        return "..."
+    if isinstance(plan, list):
+        return [redact_plan(item, depth + 1) for item in plan]
+    if not isinstance(plan, dict):
+        return plan
+
+    out = {}
+    for key, value in plan.items():
+        if key in ("filter", "parsedQuery"):
+            out[key] = redact(value)
+        elif key == "indexBounds":
+            out[key] = {field: "?" for field in value}
+        elif key in ("inputStage", "inputStages", "queryPlan", "winningPlan", "stage", "indexName",
+                     "keyPattern", "direction", "isMultiKey", "namespace", "$cursor", "queryPlanner"):
+            out[key] = redact_plan(value, depth + 1)
+    return out
+
+
+def explainable(command):
+    return {key: value for key, value in command.items()
+            if not key.startswith("$") and key not in NOT_EXPLAINABLE}
+
+
+# ---------------------------------------------------------------------
+# LISTENER
+# ---------------------------------------------------------------------
+class SlowQueryListener(monitoring.CommandListener):
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._inflight = {}
+        self.recorder = None
+
+    def started(self, event):
+        if event.command_name not in SHAPE_FIELDS:
+            return
+        collection = event.command.get(event.command_name)
+        if collection == SLOW_QUERIES_COLLECTION:
+            return
+        # Only a reference: the command is read again only if it was slow
+        with self._lock:
+            self._inflight[(event.connection_id, event.request_id)] = (event.command, event.database_name)
+
+    def succeeded(self, event):
+        self._finish(event)
+
+    def failed(self, event):
+        self._finish(event)
+
+    def _finish(self, event):
+        with self._lock:
+            started = self._inflight.pop((event.connection_id, event.request_id), None)
+        if started is None or self.recorder is None:
+            return
+
+        duration_ms = event.duration_micros / 1000
+        if duration_ms < SLOW_QUERY_MS:
+            return
+
+        command, database_name = started
+        route = current_route()
+        self.recorder.submit({
+            "at": datetime.utcnow(),
+            "command": event.command_name,
+            "database": database_name,
+            "collection": command.get(event.command_name),
+            "duration_ms": round(duration_ms, 1),
+            "route": f"{route[0]} {route[1]}" if route else None,
+            "request_id": current_request_id(),
+            "failed": isinstance(event, monitoring.CommandFailedEvent),
+        }, command)
+
+
+slow_query_listener = SlowQueryListener()
+
+
+# ---------------------------------------------------------------------
+# RECORDER THREAD
+# ---------------------------------------------------------------------
+class SlowQueryRecorder(threading.Thread):
+
+    def __init__(self, db):
+        super().__init__(name="slow-query-recorder", daemon=True)
+        self.db = db
+        self.queue = queue.Queue(QUEUE_SIZE)
+        self.last_explained = {}
+
+    def submit(self, record, command):
+        try:
+            self.queue.put_nowait((record, command))
+        except queue.Full:
+            pass
+
+    def should_explain(self, record):
+        if record["failed"] or random.random() >= EXPLAIN_SAMPLE_RATE:
+            return False
+        last = self.last_explained.get(record["fingerprint"])
+        if last is not None and time.monotonic() - last < EXPLAIN_INTERVAL:
+            return False
+        self.last_explained[record["fingerprint"]] = time.monotonic()
+        return True
+
+    def explain(self, record, command):
+        result = self.db.client[record["database"]].command(
+            {"explain": explainable(command), "verbosity": "queryPlanner"}
+        )
+        planner = result.get("queryPlanner") or result
+        stages = result.get("stages")
+        if stages:
+            # aggregate: the plan of the initial $cursor stage
+            planner = stages[0].get("$cursor", {}).get("queryPlanner", planner)
+        return redact_plan({"winningPlan": planner.get("winningPlan")})
+
+    def record(self, record, command):
+        record["shape"] = command_shape(record["command"], command)
+        record["fingerprint"] = fingerprint(record["command"], record["collection"], record["shape"])
+        record["plan"] = None
+        if self.should_explain(record):
+            try:
+                record["plan"] = self.explain(record, command)
+            except PyMongoError as e:
+                record["plan"] = {"error": str(e)}
+        self.db[SLOW_QUERIES_COLLECTION].insert_one(record)
+        log.warning("Slow query", extra=fields(
+            command=record["command"], collection=record["collection"], duration_ms=record["duration_ms"],
+            route=record["route"], fingerprint=record["fingerprint"], request_id=record["request_id"]
+        ))
+
+    def run(self):
+        while True:
+            record, command = self.queue.get()
+            try:
+                self.record(record, command)
+            except Exception:
+                log.exception("Could not record slow query")
+
+
+def ensure_slow_query_collection(db):
+    try:
+        db.create_collection(SLOW_QUERIES_COLLECTION, capped=True, size=SLOW_QUERIES_SIZE, max=SLOW_QUERIES_MAX)
+    except CollectionInvalid:
+        pass  # already there
+    db[SLOW_QUERIES_COLLECTION].create_index([("fingerprint", 1), ("at", DESCENDING)])
+
+
+def start_slow_query_recorder(db):
+    if slow_query_listener.recorder is None:
+        recorder = SlowQueryRecorder(db)
+        recorder.start()
+        slow_query_listener.recorder = recorder
+    return slow_query_listener.recorder
+
+
+# ---------------------------------------------------------------------
+# OPERATOR VIEW
+# ---------------------------------------------------------------------
+def slow_query_report(db, since, route=None, collection=None, limit=100):
+    """Slowest shapes since a time, worst first, with their latest plan"""
+    match = {"at": {"$gte": since}}
+    if route:
+        match["route"] = route
+    if collection:
+        match["collection"] = collection
+
+    pipeline = [
+        {"$match": match},
+        {"$sort": {"at": DESCENDING}},
+        {"$group": {
+            "_id": "$fingerprint",
+            "command": {"$first": "$command"},
+            "collection": {"$first": "$collection"},
+            "shape": {"$first": "$shape"},
+            "routes": {"$addToSet": "$route"},
+            "count": {"$sum": 1},
+            "avg_ms": {"$avg": "$duration_ms"},
+            "max_ms": {"$max": "$duration_ms"},
+            "total_ms": {"$sum": "$duration_ms"},
+            "last_at": {"$first": "$at"},
+            "last_request_id": {"$first": "$request_id"},
+            # Documents compare field by field: the latest explained record
+            "latest_plan": {"$max": {"$cond": [
+                {"$gt": ["$plan", None]}, {"at": "$at", "plan": "$plan"}, None
+            ]}},
+        }},
+        {"$sort": {"total_ms": DESCENDING}},
+        {"$limit": limit},
+    ]
+    report = []
+    for group in db[SLOW_QUERIES_COLLECTION].aggregate(pipeline):
+        group["fingerprint"] = group.pop("_id")
+        group["avg_ms"] = round(group["avg_ms"], 1)
+        # Latest explain of this shape, if one was sampled
+        group["plan"] = (group.pop("latest_plan") or {}).get("plan")
+        report.append(group)
+    return report
@@ -0,0 +1,239 @@
+import base64
+import logging
+import mimetypes
+import os
+import shutil
+from datetime import datetime
+
+try:
+    import boto3
+    from botocore.exceptions import ClientError
+except ImportError:  # only needed for STORAGE_BACKEND=s3
+    boto3 = None
+
+from backend.blobs import IMMUTABLE_MAX_AGE
+
+log = logging.getLogger(__name__)
+
+
+# ---------------------------------------------------------------------
+# UPLOAD STORAGE BACKENDS
+# ---------------------------------------------------------------------
+# Uploaded files are addressed by key, "<bucket>/<name>", e.g.
+# "medicine_images/<sha256>.jpg". Where the bytes live is chosen with
+# STORAGE_BACKEND:
+#
+# * local  files under static/<bucket>/, served by Flask (default)
+# * s3     an S3 compatible bucket (AWS, MinIO...), served from
+#          S3_PUBLIC_URL; every app node sees the same files
+#
+# S3 also hands out presigned PUT URLs, so browsers can upload straight
+# to the bucket and the file bytes never pass through a worker.
+#
+# Prescriptions (PRIVATE_BUCKETS) are never public. They are stored
+# with "private, no-store" and served only through the app's
+# /prescriptions/<name> route, after its access check: from disk for
+# local storage, or as a redirect to a presigned GET that expires after
+# PRESCRIPTION_URL_EXPIRES seconds for S3. The S3 bucket policy should
+# grant public read on medicine_images/* and profile_images/* only.
+#
+#   STORAGE_BACKEND=s3
+#   S3_BUCKET=cmrds-uploads
+#   S3_ENDPOINT_URL=http://localhost:9000     # MinIO; unset for AWS
+#   S3_PUBLIC_URL=http://localhost:9000/cmrds-uploads
+#   AWS_ACCESS_KEY_ID / AWS_SECRET_ACCESS_KEY / AWS_DEFAULT_REGION
+
+PRESIGN_EXPIRES = 15 * 60
+PRESCRIPTION_URL_EXPIRES = int(os.getenv("PRESCRIPTION_URL_EXPIRES", "300"))
+CACHE_CONTROL = f"public, max-age={IMMUTABLE_MAX_AGE}, immutable"
+PRIVATE_CACHE_CONTROL = "private, no-store"
+PRIVATE_BUCKETS = ("prescriptions",)
+
+
+def cache_control(key):
+    return PRIVATE_CACHE_CONTROL if key.split("/", 1)[0] in PRIVATE_BUCKETS else CACHE_CONTROL
+
+
+class LocalStorage:
+
+    def __init__(self, root="static", url_root="/static"):
+        self.root = root
+        self.url_root = url_root
+
+    def local_path(self, key):
+        return os.path.join(self.root, *key.split("/"))
+
+    def url_prefix(self, bucket):
+        return f"{self.url_root}/{bucket}"
+
+    def url(self, key):
+        return f"{self.url_root}/{key}"
+
+    def save(self, key, staged, replace=False):
+        """Move a staged HashingFile to key (kept as is if stored, unless replace)"""
+        path = self.local_path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        staged.claim(path, replace)
+
+    def upload_file(self, key, path):
+        """Move a plain local file to key"""
+        target = self.local_path(key)
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        os.replace(path, target)
+
+    def download(self, key, path):
+        shutil.copyfile(self.local_path(key), path)
+
+    def size(self, key):
+        """Size of the stored file, or None if it does not exist"""
+        path = self.local_path(key)
+        return os.path.getsize(path) if os.path.exists(path) else None
+
+    def delete(self, keys):
+        for key in keys:
+            path = self.local_path(key)
+            if os.path.exists(path):
+                try:
+                    os.remove(path)
+                except OSError as e:
+                    log.warning("Could not delete %s: %s", key, e)
+
+    def list_keys(self, bucket):
+        """(key, last modified) of every file in a bucket"""
+        folder = os.path.join(self.root, bucket)
+        if not os.path.isdir(folder):
+            return
+        for entry in os.scandir(folder):
+            if entry.is_file():
+                yield f"{bucket}/{entry.name}", datetime.utcfromtimestamp(entry.stat().st_mtime)
+
+    def presigned_upload(self, key, size, sha256_hex, content_type):
+        # The app itself is the storage: upload through the normal form
+        return None
+
+    def presigned_download(self, key):
+        # Served from local_path(key) by the app
+        return None
+
+
+class S3Storage:
+
+    def __init__(self, bucket, endpoint_url=None, public_url=None):
+        if boto3 is None:
+            raise Exception("⚠ ERROR: STORAGE_BACKEND=s3 needs boto3 installed!")
+        self.bucket = bucket
+        self.client = boto3.client("s3", endpoint_url=endpoint_url)
+        self.public_url = (public_url or f"https://{bucket}.s3.amazonaws.com").rstrip("/")
+
+    def local_path(self, key):
+        return None
+
+    def url_prefix(self, bucket):
+        return f"{self.public_url}/{bucket}"
+
+    def url(self, key):
+        return f"{self.public_url}/{key}"
+
+    def object_args(self, key):
+        # Keys are content addressed, so public objects can be cached forever
+        content_type = mimetypes.guess_type(key)[0] or "application/octet-stream"
+        return {"ContentType": content_type, "CacheControl": cache_control(key)}
+
+    def save(self, key, staged, replace=False):
+        try:
+            if replace or self.size(key) is None:
+                self.client.upload_file(staged.path, self.bucket, key, ExtraArgs=self.object_args(key))
+        finally:
+            staged.discard()
+
+    def upload_file(self, key, path):
+        try:
+            self.client.upload_file(path, self.bucket, key, ExtraArgs=self.object_args(key))
+        finally:
+            os.remove(path)
+
+    def download(self, key, path):
+        self.client.download_file(self.bucket, key, path)
+
+    def size(self, key):
+        try:
+            return self.client.head_object(Bucket=self.bucket, Key=key)["ContentLength"]
+        except ClientError as e:
+            if e.response["Error"]["Code"] in ("404", "NoSuchKey", "NotFound"):
+                return None
+            raise
+
+    def delete(self, keys):
+        keys = list(keys)
+        # DeleteObjects takes at most 1000 keys per call
+        for start in range(0, len(keys), 1000):
+            batch = keys[start:start + 1000]
+            self.client.delete_objects(
+                Bucket=self.bucket,
+                Delete={"Objects": [{"Key": key} for key in batch], "Quiet": True}
+            )
+
+    def list_keys(self, bucket):
+        paginator = self.client.get_paginator("list_objects_v2")
+        for page in paginator.paginate(Bucket=self.bucket, Prefix=f"{bucket}/"):
+            for obj in page.get("Contents", []):
+                yield obj["Key"], obj["LastModified"].replace(tzinfo=None)
+
+    def presigned_upload(self, key, size, sha256_hex, content_type):
+        """PUT URL bound to the exact size and SHA-256 the client announced.
+
+        S3 rejects a body whose length or checksum differs, so the
+        content addressed key cannot be filled with other bytes.
+        """
+        checksum = base64.b64encode(bytes.fromhex(sha256_hex)).decode("ascii")
+        url = self.client.generate_presigned_url(
+            "put_object",
+            Params={
+                "Bucket": self.bucket,
+                "Key": key,
+                "ContentLength": size,
+                "ContentType": content_type,
+                "CacheControl": cache_control(key),
+                "ChecksumSHA256": checksum,
+            },
+            ExpiresIn=PRESIGN_EXPIRES
+        )
+        return {
+            "method": "PUT",
+            "url": url,
+            "headers": {
+                "Content-Type": content_type,
+                "Cache-Control": cache_control(key),
+                "x-amz-checksum-sha256": checksum,
+            },
+        }
+
+    def presigned_download(self, key):
+        """Short lived GET URL for a private object"""
+        return self.client.generate_presigned_url(
+            "get_object",
+            Params={"Bucket": self.bucket, "Key": key, "ResponseCacheControl": PRIVATE_CACHE_CONTROL},
+            ExpiresIn=PRESCRIPTION_URL_EXPIRES
+        )
+
+
+def make_storage():
+    backend = os.getenv("STORAGE_BACKEND", "local").lower()
+    if backend == "s3":
+        return S3Storage(
+            os.getenv("S3_BUCKET"),
+            endpoint_url=os.getenv("S3_ENDPOINT_URL"),
+            public_url=os.getenv("S3_PUBLIC_URL")
+        )
+    return LocalStorage()
+
+
+_storage = None
+
+
+def get_storage():
+    """The configured backend, created on first use (after .env is loaded)"""
+    global _storage
+    if _storage is None:
+        _storage = make_storage()
+    return _storage
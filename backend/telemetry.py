@@ -0,0 +1,276 @@
+import logging
+import os
+import threading
+import time
+from bisect import bisect_left
+from collections import Counter
+from contextvars import ContextVar
+
+from flask import g, request
+from pymongo import monitoring
+
+from backend.logs import fields, sampled
+from backend.metrics import LATENCY_BUCKETS, SIZE_BUCKETS, observe_request
+
+log = logging.getLogger(__name__)
+
+
+# ---------------------------------------------------------------------
+# REQUEST TELEMETRY
+# ---------------------------------------------------------------------
+# Per route (URL rule, e.g. "/get_medicines") latency histogram, status
+# codes, response sizes and the Mongo commands each request issued.
+#
+# mongo_listener is passed to MongoClient(event_listeners=[...]); pymongo
+# calls it on the thread running the command, so each command and its
+# duration are added to the request active on that thread. Commands run
+# by background threads (reaper, watchers) belong to no request.
+#
+# Each request is logged (sampled when successful) with its timing. A
+# request issuing more than N_PLUS_ONE_QUERIES commands, or the same
+# command on the same collection more than N_PLUS_ONE_REPEATS times, is
+# logged as a warning and counted as a likely N+1 query pattern.
+#
+# The same numbers, per Flask endpoint, go to Prometheus (backend/metrics.py).
+#
+# Each response carries a Server-Timing header, visible in the browser's
+# network panel:  Server-Timing: app;dur=12.3, db;dur=8.1;desc="5 queries"
+
+N_PLUS_ONE_QUERIES = int(os.getenv("N_PLUS_ONE_QUERIES", "25"))
+N_PLUS_ONE_REPEATS = int(os.getenv("N_PLUS_ONE_REPEATS", "10"))
+
+UNMATCHED_ROUTE = "<unmatched>"
+WRITE_COMMANDS = {"insert", "update", "delete", "findAndModify"}
+
+
+class Histogram:
+    """Cumulative-bucket histogram (last bucket is +Inf)"""
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def cumulative(self):
+        total = 0
+        out = []
+        for bound, count in zip(self.buckets + [float("inf")], self.counts):
+            total += count
+            out.append((bound, total))
+        return out
+
+    def quantile(self, q):
+        """Upper bound of the bucket holding the q-th observation"""
+        if not self.count:
+            return None
+        rank = q * self.count
+        for bound, total in self.cumulative():
+            if total >= rank:
+                return bound
+        return float("inf")
+
+
+class RouteStats:
+
+    def __init__(self):
+        self.latency = Histogram(LATENCY_BUCKETS)
+        self.response_bytes = Histogram(SIZE_BUCKETS)
+        self.statuses = Counter()
+        self.mongo_commands = 0
+        self.mongo_seconds = 0.0
+        self.max_mongo_commands = 0
+        self.n_plus_one = 0
+
+    def snapshot(self):
+        latency = self.latency
+        return {
+            "requests": latency.count,
+            "latency_avg_ms": round(latency.sum / latency.count * 1000, 2) if latency.count else None,
+            "latency_p50_s": latency.quantile(0.5),
+            "latency_p95_s": latency.quantile(0.95),
+            "latency_p99_s": latency.quantile(0.99),
+            "statuses": dict(self.statuses),
+            "response_bytes_avg": round(self.response_bytes.sum / self.response_bytes.count) if self.response_bytes.count else None,
+            "mongo_commands_avg": round(self.mongo_commands / latency.count, 2) if latency.count else None,
+            "mongo_commands_max": self.max_mongo_commands,
+            "mongo_ms_avg": round(self.mongo_seconds / latency.count * 1000, 2) if latency.count else None,
+            "n_plus_one": self.n_plus_one,
+        }
+
+
+class RequestTrace:
+    """Mongo commands issued while serving one request"""
+
+    def __init__(self, method, route):
+        # Parallel queries (backend/concurrency.py) report from pool threads
+        self.lock = threading.Lock()
+        self.method = method
+        self.route = route
+        self.started = time.perf_counter()
+        self.commands = 0
+        self.mongo_seconds = 0.0
+        self.shapes = Counter()        # (command, collection) -> count
+
+    def n_plus_one(self):
+        """The repeated command shape, or a note on the total, if over the limits"""
+        if self.shapes:
+            shape, repeats = self.shapes.most_common(1)[0]
+            if repeats > N_PLUS_ONE_REPEATS:
+                return f"{shape[0]} on {shape[1]} x{repeats}"
+        if self.commands > N_PLUS_ONE_QUERIES:
+            return f"{self.commands} commands"
+        return None
+
+
+_current = ContextVar("request_trace", default=None)
+
+
+def current_route():
+    """(method, route) of the request running on this thread, or None"""
+    trace = _current.get()
+    return (trace.method, trace.route) if trace else None
+
+
+def written_collections():
+    """Collections the request running on this thread has written to"""
+    trace = _current.get()
+    if trace is None:
+        return set()
+    with trace.lock:
+        return {collection for command, collection in trace.shapes if command in WRITE_COMMANDS and collection}
+
+
+class MongoCommandListener(monitoring.CommandListener):
+
+    def started(self, event):
+        trace = _current.get()
+        if trace is None:
+            return
+        collection = event.command.get(event.command_name)
+        shape = (event.command_name, collection if isinstance(collection, str) else "")
+        with trace.lock:
+            trace.shapes[shape] += 1
+            trace.commands += 1
+
+    def succeeded(self, event):
+        self._finish(event)
+
+    def failed(self, event):
+        self._finish(event)
+
+    def _finish(self, event):
+        trace = _current.get()
+        if trace is None:
+            return
+        with trace.lock:
+            trace.mongo_seconds += event.duration_micros / 1e6
+
+
+mongo_listener = MongoCommandListener()
+
+
+class Telemetry:
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._routes = {}
+
+    def install(self, app):
+        """Register the request hooks; call before any other after_request
+        is registered so the recorded size is the one sent (compressed)"""
+        app.before_request(self.start_request)
+        app.after_request(self.finish_request)
+        app.teardown_request(self.end_request)
+
+    def start_request(self):
+        g.telemetry_token = self.start(request.method, request.url_rule.rule if request.url_rule else UNMATCHED_ROUTE)
+
+    def finish_request(self, response):
+        if _current.get() is None:
+            return response
+        size = response.content_length
+        if size is None and not response.is_streamed:
+            size = len(response.get_data())
+        response.headers["Server-Timing"] = self.finish(request.endpoint, response.status_code, size)
+        return response
+
+    def end_request(self, exc=None):
+        token = g.pop("telemetry_token", None)
+        if token is not None:
+            self.end(token)
+
+    # Shared with the ASGI entry point (asgi.py), which has its own hooks
+    def start(self, method, route):
+        """Trace the request starting on this context; returns the reset token"""
+        return _current.set(RequestTrace(method, route))
+
+    def end(self, token):
+        _current.reset(token)
+
+    def finish(self, endpoint, status, size):
+        """Record the current request; returns its Server-Timing header"""
+        trace = _current.get()
+        elapsed = time.perf_counter() - trace.started
+        method, route = trace.method, trace.route
+        suspect = trace.n_plus_one()
+
+        with self._lock:
+            stats = self._routes.get((method, route))
+            if stats is None:
+                stats = self._routes[(method, route)] = RouteStats()
+            stats.latency.observe(elapsed)
+            stats.statuses[status] += 1
+            if size is not None:
+                stats.response_bytes.observe(size)
+            stats.mongo_commands += trace.commands
+            stats.mongo_seconds += trace.mongo_seconds
+            stats.max_mongo_commands = max(stats.max_mongo_commands, trace.commands)
+            if suspect:
+                stats.n_plus_one += 1
+
+        observe_request(
+            method, endpoint or UNMATCHED_ROUTE, status,
+            elapsed, size, trace.commands, trace.mongo_seconds, suspect
+        )
+
+        request_fields = {
+            "method": method,
+            "route": route,
+            "status": status,
+            "duration_ms": round(elapsed * 1000, 1),
+            "mongo_commands": trace.commands,
+            "mongo_ms": round(trace.mongo_seconds * 1000, 1),
+            "bytes": size,
+        }
+        if suspect:
+            log.warning("Possible N+1 query pattern: %s", suspect, extra=fields(**request_fields))
+        elif status < 400:
+            log.info("Request handled", extra=sampled(**request_fields))
+        else:
+            log.info("Request failed", extra=fields(**request_fields))
+
+        return (
+            f"app;dur={elapsed * 1000:.1f}, "
+            f'db;dur={trace.mongo_seconds * 1000:.1f};desc="{trace.commands} queries"'
+        )
+
+    def routes(self):
+        """{(method, route): RouteStats} copy for exporters"""
+        with self._lock:
+            return dict(self._routes)
+
+    def snapshot(self):
+        with self._lock:
+            return [
+                dict(method=method, route=route, **stats.snapshot())
+                for (method, route), stats in sorted(self._routes.items(), key=lambda item: item[0][1])
+            ]
+
+
+telemetry = Telemetry()
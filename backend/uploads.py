@@ -0,0 +1,117 @@
+import hashlib
+import os
+import tempfile
+
+from flask import Request
+from werkzeug.exceptions import RequestEntityTooLarge
+
+
+# ---------------------------------------------------------------------
+# STREAMING UPLOADS
+# ---------------------------------------------------------------------
+# Werkzeug parses multipart bodies into whatever _get_file_stream()
+# returns. UploadRequest hands it a HashingFile: a temp file in the
+# staging folder that hashes and counts every chunk as it is written,
+# and stops the upload as soon as the endpoint's size cap is passed.
+# BlobStore.put() then only has to rename the staged file into place,
+# so per-upload memory is one parser chunk whatever the file size.
+#
+# The staging folder must be on the same filesystem as the upload
+# folders for that rename to be atomic.
+
+STAGING_FOLDER = "static/.incoming"
+
+MB = 1024 * 1024
+
+# Per endpoint cap on the size of one uploaded file
+UPLOAD_LIMITS = {
+    "submit_donation": 8 * MB,
+    "request_medicine": 10 * MB,
+    "upload_profile": 5 * MB,
+    "receiver_upload_profile": 5 * MB,
+    "admin_upload_profile": 5 * MB,
+}
+
+# Whole request body; a little above the largest cap for the other fields
+MAX_CONTENT_LENGTH = 12 * MB
+MAX_FORM_MEMORY_SIZE = 1 * MB
+
+
+class UploadTooLarge(RequestEntityTooLarge):
+    description = "Uploaded file is too large"
+
+
+class HashingFile:
+    """Write-once temp file that hashes and size-checks what is written"""
+
+    def __init__(self, limit=None):
+        os.makedirs(STAGING_FOLDER, exist_ok=True)
+        self._file = tempfile.NamedTemporaryFile(dir=STAGING_FOLDER, suffix=".upload", delete=False)
+        self.path = self._file.name
+        self.limit = limit
+        self.size = 0
+        self._hash = hashlib.sha256()
+        self._claimed = False
+
+    def write(self, data):
+        self.size += len(data)
+        if self.limit is not None and self.size > self.limit:
+            self.discard()
+            raise UploadTooLarge()
+        self._hash.update(data)
+        return self._file.write(data)
+
+    def hexdigest(self):
+        return self._hash.hexdigest()
+
+    def reload(self):
+        """Hash and size the staged file again after it was rewritten in place"""
+        self._file.close()
+        self._file = open(self.path, "rb+")
+        self._hash = hashlib.sha256()
+        self.size = 0
+        for chunk in iter(lambda: self._file.read(64 * 1024), b""):
+            self._hash.update(chunk)
+            self.size += len(chunk)
+        self._file.seek(0)
+
+    def claim(self, path, replace=False):
+        """Move the staged file to path (dropping it if path already exists)"""
+        self._file.close()
+        if os.path.exists(path) and not replace:
+            os.remove(self.path)
+        else:
+            os.replace(self.path, path)
+        self._claimed = True
+
+    def discard(self):
+        self._file.close()
+        if not self._claimed and os.path.exists(self.path):
+            os.remove(self.path)
+        self._claimed = True
+
+    def close(self):
+        # Called by Werkzeug when the request ends; unclaimed uploads go
+        self.discard()
+
+    def __getattr__(self, name):
+        # read/seek/tell/flush... for code that reads the upload back
+        return getattr(self._file, name)
+
+
+class UploadRequest(Request):
+    max_form_memory_size = MAX_FORM_MEMORY_SIZE
+
+    def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+        return HashingFile(UPLOAD_LIMITS.get(self.endpoint))
+
+
+def check_upload_size(request):
+    """Reject an oversized upload from its Content-Length, before reading it,
+    then parse the body so a too large file fails here and not in the view."""
+    limit = UPLOAD_LIMITS.get(request.endpoint)
+    if limit is None:
+        return
+    if request.content_length is not None and request.content_length > limit + MAX_FORM_MEMORY_SIZE:
+        raise UploadTooLarge()
+    request.files
@@ -0,0 +1,148 @@
+"""
+Concurrent dashboard load comparison (Flask/WSGI vs asgi.py).
+
+Each virtual user logs in once and then repeatedly "loads the dashboard":
+it fires the same JSON fetches the dashboard page fires, in parallel, and
+waits for all of them. The report is dashboard loads per second per server
+core, so runs with different worker counts can be compared.
+
+    # terminal 1: python -m gunicorn -w 2 -k gthread --threads 8 -b :5000 app:app
+    # terminal 2: uvicorn asgi:app --workers 2 --port 8000
+    python benchmarks/dashboard_load.py --email admin@example.com --password secret \\
+        --target wsgi=http://127.0.0.1:5000 --target asgi=http://127.0.0.1:8000 \\
+        --cores 2 --users 50 --duration 30
+"""
+import argparse
+import http.cookiejar
+import json
+import statistics
+import threading
+import time
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+
+DASHBOARD_FETCHES = {
+    "donor": ["/get_donor_stats", "/get_recent_activity", "/get_all_donations"],
+    "receiver": ["/get_receiver_stats", "/get_available_medicines", "/get_receiver_requests"],
+    "admin": [
+        "/get_admin_stats", "/get_recent_activity_admin",
+        "/get_all_donations_admin", "/get_all_requests_admin",
+    ],
+}
+
+
+def login(base_url, email, password):
+    """Log in and return (opener, user_type) carrying the session cookie"""
+    opener = urllib.request.build_opener(
+        urllib.request.HTTPCookieProcessor(http.cookiejar.CookieJar())
+    )
+    body = json.dumps({"email": email, "password": password}).encode("utf-8")
+    req = urllib.request.Request(
+        base_url + "/login", data=body, headers={"Content-Type": "application/json"}
+    )
+    with opener.open(req) as response:
+        data = json.loads(response.read())
+
+    if not data.get("success"):
+        raise SystemExit(f"Login failed on {base_url}: {data.get('message')}")
+
+    return opener, data["user_type"]
+
+
+def fetch(opener, url):
+    start = time.perf_counter()
+    with opener.open(url) as response:
+        response.read()
+    return time.perf_counter() - start
+
+
+def run_target(name, base_url, args):
+    openers = []
+    user_type = None
+    for _ in range(args.users):
+        opener, user_type = login(base_url, args.email, args.password)
+        openers.append(opener)
+
+    paths = DASHBOARD_FETCHES[user_type]
+    pool = ThreadPoolExecutor(max_workers=args.users * len(paths))
+    deadline = time.perf_counter() + args.duration
+    load_times = []
+    errors = [0]
+    lock = threading.Lock()
+
+    def virtual_user(opener):
+        while time.perf_counter() < deadline:
+            start = time.perf_counter()
+            futures = [pool.submit(fetch, opener, base_url + path) for path in paths]
+            try:
+                for future in futures:
+                    future.result()
+            except Exception:
+                with lock:
+                    errors[0] += 1
+                continue
+            with lock:
+                load_times.append(time.perf_counter() - start)
+
+    users = [threading.Thread(target=virtual_user, args=(opener,)) for opener in openers]
+    started = time.perf_counter()
+    for user in users:
+        user.start()
+    for user in users:
+        user.join()
+    elapsed = time.perf_counter() - started
+    pool.shutdown()
+
+    load_times.sort()
+    loads = len(load_times)
+
+    def percentile(p):
+        if not load_times:
+            return None
+        return round(load_times[min(loads - 1, int(loads * p))] * 1000, 1)
+
+    return {
+        "target": name,
+        "url": base_url,
+        "user_type": user_type,
+        "users": args.users,
+        "loads": loads,
+        "errors": errors[0],
+        "loads_per_sec": round(loads / elapsed, 2),
+        "loads_per_sec_per_core": round(loads / elapsed / args.cores, 2),
+        "mean_ms": round(statistics.mean(load_times) * 1000, 1) if load_times else None,
+        "p50_ms": percentile(0.50),
+        "p95_ms": percentile(0.95),
+        "p99_ms": percentile(0.99),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--target", action="append", required=True, help="name=base_url, repeatable")
+    parser.add_argument("--email", required=True)
+    parser.add_argument("--password", required=True)
+    parser.add_argument("--users", type=int, default=20, help="concurrent dashboards")
+    parser.add_argument("--duration", type=float, default=20, help="seconds per target")
+    parser.add_argument("--cores", type=int, default=1, help="server cores, for the per-core figure")
+    parser.add_argument("--json", help="also write the results to this file")
+    args = parser.parse_args()
+
+    results = []
+    for target in args.target:
+        name, _, base_url = target.partition("=")
+        results.append(run_target(name, base_url.rstrip("/"), args))
+
+    print(f"{'target':<10}{'loads/s':>10}{'per core':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'errors':>8}")
+    for r in results:
+        print(f"{r['target']:<10}{r['loads_per_sec']:>10}{r['loads_per_sec_per_core']:>10}"
+              f"{r['p50_ms']!s:>10}{r['p95_ms']!s:>10}{r['p99_ms']!s:>10}{r['errors']:>8}")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
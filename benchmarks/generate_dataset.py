@@ -0,0 +1,428 @@
+"""
+Synthetic dataset at production scale.
+
+Fills donar, receiver, admin, donated_medicine and requests_medicine of
+a (throwaway) database with realistic documents, shaped exactly like the
+ones the app writes:
+
+    medicine names      Zipf distributed over a catalogue of ~250 names,
+                        a few common medicines make up most donations
+    users               a minority of donors and receivers create most
+                        of the donations and requests
+    donation status     mostly available, then completed/pending/...,
+                        expired ones have an expiry date in the past
+    expiry dates        spread from already expired to 3 years out,
+                        peaking around 8 months
+    request urgency     mostly normal/low, few immediate
+    images              donations and prescriptions point at a pool of
+                        placeholder blobs (with renditions and counted
+                        refs), optionally written to storage as files
+
+Documents are generated and inserted by --workers processes, each with
+its own MongoClient, in insert_many batches of --batch-size, so a 10M
+document dataset builds in minutes. Every value derives from --seed and
+the document's index: the same arguments build the same dataset.
+
+Indexes are left to the app, which creates them at startup; building
+them once after the load is faster than maintaining them during it.
+
+    python benchmarks/generate_dataset.py --uri mongodb://127.0.0.1:27017 --drop
+    python benchmarks/generate_dataset.py --scale 10 --workers 8 --json dataset.json
+
+The database (--db, default "med_system_dataset") is never the app's own
+med_system, and MONGO_URI is not read: --drop needs an explicit --uri.
+Point the app at the result with MONGO_DB=med_system_dataset.
+
+Every user's password is --password (default "password"), so any
+generated email can log in, e.g. donor0@example.com.
+"""
+import argparse
+import calendar
+import itertools
+import json
+import os
+import random
+import struct
+import sys
+import tempfile
+import time
+from bisect import bisect
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import datetime, timedelta
+
+import bcrypt
+from bson import ObjectId
+from pymongo import MongoClient
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from backend.images import RENDITIONS, rendition_name  # noqa: E402
+
+
+DEFAULT_COUNTS = {
+    "donar": 50_000,
+    "receiver": 100_000,
+    "admin": 20,
+    "donated_medicine": 600_000,
+    "requests_medicine": 400_000,
+}
+USER_COLLECTIONS = {"donar": "donor", "receiver": "receiver", "admin": "admin"}
+# Placeholder blobs, stored in the blobs collection
+BLOB_BUCKETS = ["medicine_images", "prescriptions"]
+# Byte 5 of generated ObjectIds, so ids never collide across collections
+ID_KIND = {"donar": 1, "receiver": 2, "admin": 3, "donated_medicine": 4, "requests_medicine": 5}
+
+GENERICS = [
+    "Paracetamol", "Ibuprofen", "Amoxicillin", "Cetirizine", "Metformin", "Omeprazole",
+    "Azithromycin", "Pantoprazole", "Amlodipine", "Atorvastatin", "Losartan", "Salbutamol",
+    "Montelukast", "Levothyroxine", "Ciprofloxacin", "Doxycycline", "Diclofenac", "Aspirin",
+    "Ranitidine", "Loratadine", "Prednisolone", "Metronidazole", "Fluconazole", "Clopidogrel",
+    "Telmisartan", "Glimepiride", "Insulin Glargine", "Vitamin D3", "Folic Acid", "Iron Sucrose",
+    "Ondansetron", "Domperidone", "Cefixime", "Levocetirizine", "Rosuvastatin", "Sitagliptin",
+    "Gabapentin", "Sertraline", "Escitalopram", "Alprazolam", "Tramadol", "Hydroxychloroquine",
+    "Ivermectin", "Albendazole", "Dexamethasone", "Furosemide", "Spironolactone", "Warfarin",
+    "Enalapril", "Bisoprolol", "Carvedilol", "Lisinopril", "Tamsulosin", "Allopurinol",
+    "Methotrexate", "Calcium Carbonate", "Zinc Sulfate", "ORS", "Cough Syrup", "Multivitamin",
+]
+STRENGTHS = ["", " 250mg", " 500mg", " 650mg", " 5mg", " 10mg", " 20mg", " 40mg"]
+MANUFACTURERS = [
+    "Cipla", "Sun Pharma", "Dr. Reddy's", "Lupin", "Zydus", "Mankind", "Torrent",
+    "Alkem", "Abbott", "GSK", "Pfizer", "Glenmark", "Intas", "Micro Labs", "Aurobindo",
+]
+LOCATIONS = [
+    "Pune", "Mumbai", "Nagpur", "Nashik", "Aurangabad", "Kolhapur", "Solapur", "Thane",
+    "Amravati", "Satara", "Sangli", "Latur", "Jalgaon", "Akola", "Ahmednagar",
+]
+CATEGORIES = [("tablets", 55), ("syrup", 15), ("injection", 8), ("ointment", 10), ("other", 12)]
+CONDITIONS = [("sealed", 50), ("good", 40), ("fair", 10)]
+CONDITION_PREFERENCES = [("any", 60), ("sealed", 25), ("good", 15)]
+DONATION_STATUSES = [("available", 55), ("completed", 15), ("pending", 9), ("approved", 7),
+                     ("collected", 4), ("delivered", 3), ("expired", 7)]
+REQUEST_STATUSES = [("pending", 35), ("approved", 22), ("completed", 20), ("rejected", 10), ("cancelled", 13)]
+URGENCIES = [("normal", 45), ("low", 30), ("urgent", 18), ("immediate", 7)]
+USER_STATUSES = [("active", 97), ("suspended", 2), ("blocked", 1)]
+
+IMAGE_SHARE = 0.85          # donations with a photo
+PRESCRIPTION_SHARE = 0.4    # requests with a prescription
+ZIPF_EXPONENT = 1.1
+# Fraction of users creating most records: index = count * random() ** USER_SKEW
+USER_SKEW = 3
+
+
+# ---------------------------------------------------------------------
+# DISTRIBUTIONS
+# ---------------------------------------------------------------------
+class Weighted:
+    """rng-driven choice from (value, weight) pairs"""
+
+    def __init__(self, pairs):
+        self.values = [value for value, _ in pairs]
+        self.cumulative = list(itertools.accumulate(weight for _, weight in pairs))
+
+    def pick(self, rng):
+        return self.values[bisect(self.cumulative, rng.random() * self.cumulative[-1])]
+
+
+def medicine_catalogue(seed):
+    """Names in popularity order, weighted by Zipf's law"""
+    names = [generic + strength for generic in GENERICS for strength in STRENGTHS[:4]]
+    random.Random(seed).shuffle(names)
+    return Weighted([(name, 1 / rank ** ZIPF_EXPONENT) for rank, name in enumerate(names, 1)])
+
+
+def skewed_index(rng, count):
+    return min(count - 1, int(count * rng.random() ** USER_SKEW))
+
+
+def make_id(kind, index, created_at):
+    """Deterministic ObjectId whose timestamp is created_at"""
+    return ObjectId(struct.pack(">IB", calendar.timegm(created_at.timetuple()), ID_KIND[kind]) + index.to_bytes(7, "big"))
+
+
+def blob_name(bucket, index, ext):
+    return f"{random.Random(f'{bucket}:{index}').getrandbits(256):064x}.{ext}"
+
+
+def prescription_ext(index):
+    return "pdf" if index % 10 < 3 else "jpg"
+
+
+# ---------------------------------------------------------------------
+# DOCUMENTS
+# ---------------------------------------------------------------------
+class Generator:
+    """Builds the documents of one collection, by index"""
+
+    def __init__(self, config):
+        self.config = config
+        self.counts = config["counts"]
+        self.now = datetime.fromisoformat(config["now"])
+        self.start = self.now - timedelta(days=config["days"])
+        self.catalogue = medicine_catalogue(config["seed"])
+        self.weighted = {name: Weighted(pairs) for name, pairs in [
+            ("category", CATEGORIES), ("condition", CONDITIONS), ("preference", CONDITION_PREFERENCES),
+            ("donation_status", DONATION_STATUSES), ("request_status", REQUEST_STATUSES),
+            ("urgency", URGENCIES), ("user_status", USER_STATUSES),
+        ]}
+
+    def user_created(self, collection, index):
+        # Sign-ups spread evenly over the window, in index order
+        span = (self.now - self.start).total_seconds()
+        return self.start + timedelta(seconds=span * index / max(1, self.counts[collection]))
+
+    def later(self, rng, after):
+        return after + (self.now - after) * rng.random()
+
+    def user(self, collection, index):
+        rng = random.Random(f"{self.config['seed']}:{collection}:{index}")
+        user_type = USER_COLLECTIONS[collection]
+        created_at = self.user_created(collection, index)
+        doc = {
+            "_id": make_id(collection, index, created_at),
+            "username": f"{user_type}{index}",
+            "email": f"{user_type}{index}@example.com",
+            "password": self.config["password_hash"],
+            "user_type": user_type,
+            "created_at": created_at,
+            "updated_at": self.later(rng, created_at),
+        }
+        if user_type != "admin":
+            doc["status"] = self.weighted["user_status"].pick(rng)
+            doc["verified"] = rng.random() < 0.3
+        return doc
+
+    def donation(self, index):
+        rng = random.Random(f"{self.config['seed']}:donation:{index}")
+        donor = skewed_index(rng, self.counts["donar"])
+        created_at = self.later(rng, self.user_created("donar", donor))
+        status = self.weighted["donation_status"].pick(rng)
+        if status == "expired":
+            expires_in = -rng.randint(1, 365)
+        else:
+            expires_in = int(rng.triangular(-30, 1095, 240))
+
+        doc = {
+            "_id": make_id("donated_medicine", index, created_at),
+            "username": f"donor{donor}",
+            "email": f"donor{donor}@example.com",
+            "medicineName": self.catalogue.pick(rng),
+            "manufacturer": rng.choice(MANUFACTURERS),
+            "expiryDate": (self.now + timedelta(days=expires_in)).strftime("%Y-%m-%d"),
+            "quantity": min(500, int(rng.paretovariate(1.2) * 5)),
+            "category": self.weighted["category"].pick(rng),
+            "condition": self.weighted["condition"].pick(rng),
+            "description": "",
+            "image": None,
+            "status": status,
+            "created_at": created_at,
+            "updated_at": created_at if status == "available" else self.later(rng, created_at),
+        }
+        if rng.random() < IMAGE_SHARE:
+            image = skewed_index(rng, self.config["images"])
+            doc["image"] = blob_name("medicine_images", image, "jpg")
+            doc["image_renditions"] = {rendition: rendition_name(doc["image"], rendition) for rendition in RENDITIONS}
+        return doc
+
+    def medicine_request(self, index):
+        rng = random.Random(f"{self.config['seed']}:request:{index}")
+        receiver = skewed_index(rng, self.counts["receiver"])
+        receiver_created = self.user_created("receiver", receiver)
+        created_at = self.later(rng, receiver_created)
+        status = self.weighted["request_status"].pick(rng)
+        medicine = self.catalogue.pick(rng)
+
+        doc = {
+            "_id": make_id("requests_medicine", index, created_at),
+            "medicine_name": medicine,
+            "dosage": medicine.rsplit(" ", 1)[1] if medicine.endswith("mg") else "as prescribed",
+            "quantity": rng.randint(1, 60),
+            "urgency": self.weighted["urgency"].pick(rng),
+            "preferred_location": rng.choice(LOCATIONS),
+            "condition_preference": self.weighted["preference"].pick(rng),
+            "additional_notes": "",
+            "prescription": None,
+            "receiver_id": str(make_id("receiver", receiver, receiver_created)),
+            "receiver_username": f"receiver{receiver}",
+            "receiver_email": f"receiver{receiver}@example.com",
+            "status": status,
+            "created_at": created_at,
+            "updated_at": created_at if status == "pending" else self.later(rng, created_at),
+        }
+        if rng.random() < PRESCRIPTION_SHARE:
+            prescription = rng.randrange(self.config["prescriptions"])
+            doc["prescription"] = blob_name("prescriptions", prescription, prescription_ext(prescription))
+            doc["prescription_renditions"] = {"preview": rendition_name(doc["prescription"], "preview")}
+        return doc
+
+    def blob(self, bucket, index):
+        ext = prescription_ext(index) if bucket == "prescriptions" else "jpg"
+        name = blob_name(bucket, index, ext)
+        renditions = ["preview"] if bucket == "prescriptions" else list(RENDITIONS)
+        return {
+            "_id": f"{bucket}/{name}",
+            "bucket": bucket,
+            "name": name,
+            "refs": 0,      # counted once the records exist
+            "size": random.Random(name).randint(40_000, 2_000_000),
+            "renditions": {rendition: rendition_name(name, rendition) for rendition in renditions},
+            "placeholder": True,
+            "created_at": self.start,
+            "updated_at": self.start,
+        }
+
+    def documents(self, collection, start, count):
+        indexes = range(start, start + count)
+        if collection in USER_COLLECTIONS:
+            return [self.user(collection, i) for i in indexes]
+        if collection == "donated_medicine":
+            return [self.donation(i) for i in indexes]
+        if collection == "requests_medicine":
+            return [self.medicine_request(i) for i in indexes]
+        return [self.blob(collection, i) for i in indexes]
+
+
+# ---------------------------------------------------------------------
+# WORKERS
+# ---------------------------------------------------------------------
+_worker = None
+
+
+def init_worker(config):
+    global _worker
+    # A client per process: MongoClient must not cross a fork
+    client = MongoClient(config["uri"], w=1)
+    _worker = (client[config["db"]], Generator(config))
+
+
+def insert_batch(target, collection, start, count):
+    db, generator = _worker
+    docs = generator.documents(collection, start, count)
+    db[target].insert_many(docs, ordered=False)
+    return target, len(docs)
+
+
+def batches(collection, count, batch_size):
+    target = "blobs" if collection in BLOB_BUCKETS else collection
+    for start in range(0, count, batch_size):
+        yield target, collection, start, min(batch_size, count - start)
+
+
+def count_refs(db, source, field, bucket):
+    """refs of the placeholder blobs = records pointing at them"""
+    db[source].aggregate([
+        {"$match": {field: {"$ne": None}}},
+        {"$group": {"_id": {"$concat": [f"{bucket}/", f"${field}"]}, "refs": {"$sum": 1}}},
+        {"$merge": {"into": "blobs", "on": "_id", "whenMatched": "merge", "whenNotMatched": "discard"}},
+    ])
+
+
+def write_placeholders(db):
+    """One small PNG per placeholder blob and rendition, in the configured storage"""
+    from backend.storage import get_storage
+    from journeys import random_png
+
+    storage = get_storage()
+    written = 0
+    for blob in db["blobs"].find({"placeholder": True}, {"bucket": 1, "name": 1, "renditions": 1}):
+        # Renditions get PNG bytes too; browsers sniff the format
+        for name in [blob["name"], *blob["renditions"].values()]:
+            fd, path = tempfile.mkstemp()
+            with os.fdopen(fd, "wb") as f:
+                f.write(random_png())
+            storage.upload_file(f"{blob['bucket']}/{name}", path)
+            written += 1
+    return written
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--uri", help="default mongodb://127.0.0.1:27017; required with --drop")
+    parser.add_argument("--db", default="med_system_dataset")
+    parser.add_argument("--scale", type=float, default=1.0, help="multiplies every collection's default count")
+    for collection, count in DEFAULT_COUNTS.items():
+        parser.add_argument(f"--{collection.replace('_', '-')}", type=int, dest=collection,
+                            help=f"documents in {collection} (default {count} x scale)")
+    parser.add_argument("--images", type=int, default=5000, help="placeholder medicine images")
+    parser.add_argument("--prescriptions", type=int, default=2000, help="placeholder prescriptions")
+    parser.add_argument("--days", type=int, default=730, help="history the records spread over")
+    parser.add_argument("--batch-size", type=int, default=5000)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 4)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--password", default="password")
+    parser.add_argument("--drop", action="store_true", help="drop the collections (and placeholder blobs) first")
+    parser.add_argument("--write-placeholders", action="store_true", help="also write placeholder files to storage")
+    parser.add_argument("--json", help="write the build report to this file")
+    args = parser.parse_args()
+    if args.db == "med_system":
+        raise SystemExit("--db is filled with synthetic data (and dropped with --drop); use a scratch database")
+    if args.drop and not args.uri:
+        raise SystemExit("--drop deletes collections: give the server explicitly with --uri")
+    args.uri = args.uri or "mongodb://127.0.0.1:27017"
+
+    counts = {collection: getattr(args, collection) if getattr(args, collection) is not None
+              else max(1, int(count * args.scale)) for collection, count in DEFAULT_COUNTS.items()}
+    config = {
+        "uri": args.uri,
+        "db": args.db,
+        "counts": counts,
+        "images": args.images,
+        "prescriptions": args.prescriptions,
+        "days": args.days,
+        "seed": args.seed,
+        "now": datetime.utcnow().replace(microsecond=0).isoformat(),
+        # One hash for everyone: bcrypt per user would take longer than the load
+        "password_hash": bcrypt.hashpw(args.password.encode("utf-8"), bcrypt.gensalt()),
+    }
+
+    db = MongoClient(args.uri)[args.db]
+    if args.drop:
+        for collection in DEFAULT_COUNTS:
+            db.drop_collection(collection)
+        db["blobs"].delete_many({"placeholder": True})
+
+    jobs = [
+        *batches("medicine_images", args.images, args.batch_size),
+        *batches("prescriptions", args.prescriptions, args.batch_size),
+        *itertools.chain.from_iterable(batches(c, n, args.batch_size) for c, n in counts.items()),
+    ]
+    inserted = {}
+    started = time.perf_counter()
+    with ProcessPoolExecutor(args.workers, initializer=init_worker, initargs=(config,)) as pool:
+        futures = [pool.submit(insert_batch, *job) for job in jobs]
+        for done, future in enumerate(as_completed(futures), 1):
+            target, count = future.result()
+            inserted[target] = inserted.get(target, 0) + count
+            if done % 20 == 0 or done == len(futures):
+                total = sum(inserted.values())
+                elapsed = time.perf_counter() - started
+                print(f"\r{total:,} documents, {total / elapsed:,.0f}/s", end="", flush=True)
+    print()
+
+    count_refs(db, "donated_medicine", "image", "medicine_images")
+    count_refs(db, "requests_medicine", "prescription", "prescriptions")
+    elapsed = time.perf_counter() - started
+
+    placeholders = write_placeholders(db) if args.write_placeholders else 0
+
+    report = {
+        "built_at": config["now"],
+        "db": args.db,
+        "seed": args.seed,
+        "workers": args.workers,
+        "batch_size": args.batch_size,
+        "inserted": inserted,
+        "seconds": round(elapsed, 1),
+        "docs_per_sec": round(sum(inserted.values()) / elapsed),
+        "placeholder_files": placeholders,
+    }
+    for collection, count in inserted.items():
+        print(f"{collection:<20}{count:>12,}")
+    print(f"{sum(inserted.values()):,} documents in {report['seconds']}s ({report['docs_per_sec']:,}/s)")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,388 @@
+"""
+Load test of the donor, receiver and admin journeys.
+
+Virtual users of each role register, log in and then loop over their
+journey until --duration runs out:
+
+    donor       submit_donation (with a generated image), get_donor_stats,
+                get_all_donations
+    receiver    get_available_medicines, request_medicine (1 in 4 loops),
+                get_receiver_requests
+    admin       get_admin_stats, get_all_requests_admin (polling with
+                If-None-Match, like the dashboard)
+
+Before the clock starts every donor submits --seed donations so receivers
+browse a non-empty catalogue. The report has throughput and
+p50/p95/p99 per endpoint; --json writes it for later runs to --compare
+against, which exits non-zero when an endpoint's p95 regressed by more
+than --max-regression.
+
+The run writes real users and donations: point it at a local server
+backed by a throwaway mongod.
+
+    # terminal 1: MONGO_URI=mongodb://127.0.0.1:27017 MONGO_TLS=false MONGO_DB=med_system_dataset \\
+    #     python -m gunicorn -c gunicorn.conf.py app:app
+    python benchmarks/journeys.py --url http://127.0.0.1:5000 \\
+        --mix donor=5,receiver=20,admin=2 --duration 60 --json run.json
+    python benchmarks/journeys.py ... --compare run.json
+"""
+import argparse
+import gzip
+import http.cookiejar
+import json
+import os
+import platform
+import random
+import statistics
+import struct
+import subprocess
+import sys
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+import uuid
+import zlib
+from datetime import datetime, timedelta
+
+
+MEDICINES = [
+    "Paracetamol", "Amoxicillin", "Ibuprofen", "Cetirizine", "Metformin",
+    "Omeprazole", "Azithromycin", "Salbutamol", "Losartan", "Atorvastatin",
+]
+CATEGORIES = ["tablet", "syrup", "capsule", "injection", "ointment", "other"]
+URGENCIES = ["low", "normal", "urgent", "immediate"]
+LOCAL_HOSTS = {"127.0.0.1", "localhost", "::1"}
+
+
+# ---------------------------------------------------------------------
+# HTTP CLIENT
+# ---------------------------------------------------------------------
+def random_png(size=64):
+    """A small PNG of random colour blocks, different every call"""
+    rows = []
+    block = [bytes(random.randrange(256) for _ in range(3)) for _ in range(8)]
+    for y in range(size):
+        row = b"".join(block[(x // 8 + y // 8) % 8] for x in range(size))
+        rows.append(b"\x00" + row)
+
+    def chunk(kind, data):
+        return struct.pack(">I", len(data)) + kind + data + struct.pack(">I", zlib.crc32(kind + data) & 0xFFFFFFFF)
+
+    header = struct.pack(">IIBBBBB", size, size, 8, 2, 0, 0, 0)
+    return (b"\x89PNG\r\n\x1a\n" + chunk(b"IHDR", header)
+            + chunk(b"IDAT", zlib.compress(b"".join(rows))) + chunk(b"IEND", b""))
+
+
+def multipart(fields, files):
+    """(body, content_type) for a multipart/form-data POST"""
+    boundary = uuid.uuid4().hex
+    parts = []
+    for name, value in fields.items():
+        parts.append(
+            f'--{boundary}\r\nContent-Disposition: form-data; name="{name}"\r\n\r\n{value}\r\n'.encode("utf-8")
+        )
+    for name, (filename, data, content_type) in files.items():
+        parts.append(
+            f'--{boundary}\r\nContent-Disposition: form-data; name="{name}"; filename="{filename}"\r\n'
+            f"Content-Type: {content_type}\r\n\r\n".encode("utf-8") + data + b"\r\n"
+        )
+    parts.append(f"--{boundary}--\r\n".encode("utf-8"))
+    return b"".join(parts), f"multipart/form-data; boundary={boundary}"
+
+
+class Stats:
+    """Latencies and outcomes per endpoint, shared by all virtual users"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.latencies = {}
+        self.errors = {}
+        self.not_modified = {}
+        self.recording = False
+
+    def add(self, endpoint, seconds, ok, status):
+        if not self.recording:
+            return
+        with self.lock:
+            self.latencies.setdefault(endpoint, [])
+            if ok:
+                self.latencies[endpoint].append(seconds)
+                if status == 304:
+                    self.not_modified[endpoint] = self.not_modified.get(endpoint, 0) + 1
+            else:
+                self.errors[endpoint] = self.errors.get(endpoint, 0) + 1
+
+
+class Client:
+    """One browser: a cookie jar, plus the ETags it has seen"""
+
+    def __init__(self, base_url, stats, use_etags=True):
+        self.base_url = base_url
+        self.stats = stats
+        self.use_etags = use_etags
+        self.etags = {}
+        self.opener = urllib.request.build_opener(
+            urllib.request.HTTPCookieProcessor(http.cookiejar.CookieJar())
+        )
+
+    def call(self, method, path, json_body=None, form=None, files=None):
+        headers = {"Accept-Encoding": "gzip"}
+        data = None
+        if json_body is not None:
+            data = json.dumps(json_body).encode("utf-8")
+            headers["Content-Type"] = "application/json"
+        elif form is not None:
+            data, headers["Content-Type"] = multipart(form, files or {})
+        if method == "GET" and self.use_etags and path in self.etags:
+            headers["If-None-Match"] = self.etags[path]
+
+        req = urllib.request.Request(self.base_url + path, data=data, headers=headers, method=method)
+        endpoint = f"{method} {urllib.parse.urlsplit(path).path}"
+        start = time.perf_counter()
+        try:
+            with self.opener.open(req, timeout=60) as response:
+                body = response.read()
+                status = response.status
+                etag = response.headers.get("ETag")
+                # Bodies over COMPRESS_MIN_SIZE come back gzipped (backend/http_cache.py)
+                if response.headers.get("Content-Encoding") == "gzip":
+                    body = gzip.decompress(body)
+        except urllib.error.HTTPError as e:
+            e.read()
+            status, body, etag = e.code, b"", None
+            if status != 304:
+                self.stats.add(endpoint, time.perf_counter() - start, False, status)
+                return status, None
+        except OSError:
+            self.stats.add(endpoint, time.perf_counter() - start, False, None)
+            return None, None
+
+        self.stats.add(endpoint, time.perf_counter() - start, True, status)
+        if etag and method == "GET":
+            self.etags[path] = etag
+        if status == 304 or not body:
+            return status, None
+        try:
+            return status, json.loads(body)
+        except ValueError:
+            return status, None
+
+
+# ---------------------------------------------------------------------
+# JOURNEYS
+# ---------------------------------------------------------------------
+def sign_up(client, role, run_id, index):
+    email = f"bench-{run_id}-{role}-{index}@example.com"
+    password = "bench-password"
+    client.call("POST", "/registration", json_body={
+        "username": f"{role}{index}", "email": email, "password": password, "user_type": role
+    })
+    status, data = client.call("POST", "/login", json_body={"email": email, "password": password})
+    if not data or not data.get("success"):
+        raise RuntimeError(f"could not log in as {email} (HTTP {status})")
+
+
+def submit_donation(client):
+    expiry = datetime.utcnow() + timedelta(days=random.randint(10, 700))
+    client.call("POST", "/submit_donation", form={
+        "medicineName": random.choice(MEDICINES),
+        "manufacturer": f"Manufacturer {random.randint(1, 40)}",
+        "expiryDate": expiry.strftime("%Y-%m-%d"),
+        "quantity": random.randint(1, 200),
+        "category": random.choice(CATEGORIES),
+        "condition": "good",
+        "description": "Load test donation",
+    }, files={"image": ("medicine.png", random_png(), "image/png")})
+
+
+def donor_loop(client, loop):
+    submit_donation(client)
+    client.call("GET", "/get_donor_stats")
+    client.call("GET", "/get_all_donations")
+
+
+def receiver_loop(client, loop):
+    client.call("GET", "/get_available_medicines")
+    if loop % 4 == 0:
+        client.call("POST", "/request_medicine", form={
+            "medicine_name": random.choice(MEDICINES),
+            "dosage": f"{random.choice([250, 500, 650])}mg",
+            "quantity": random.randint(1, 30),
+            "urgency": random.choice(URGENCIES),
+            "location": f"Ward {random.randint(1, 20)}",
+        })
+    client.call("GET", "/get_receiver_requests")
+
+
+def admin_loop(client, loop):
+    client.call("GET", "/get_admin_stats")
+    client.call("GET", "/get_all_requests_admin")
+
+
+JOURNEYS = {"donor": donor_loop, "receiver": receiver_loop, "admin": admin_loop}
+
+
+# ---------------------------------------------------------------------
+# RUN
+# ---------------------------------------------------------------------
+def parse_mix(spec):
+    mix = {}
+    for item in spec.split(","):
+        role, _, count = item.partition("=")
+        if role.strip() not in JOURNEYS:
+            raise SystemExit(f"unknown role in --mix: {role}")
+        mix[role.strip()] = int(count)
+    return mix
+
+
+def percentile(values, p):
+    if not values:
+        return None
+    return round(values[min(len(values) - 1, int(len(values) * p))] * 1000, 1)
+
+
+def run(args):
+    stats = Stats()
+    run_id = uuid.uuid4().hex[:8]
+    mix = parse_mix(args.mix)
+    random.seed(args.random_seed)
+
+    # Setup: sign everyone up (measured as its own journey step) and seed
+    stats.recording = True
+    clients = []
+    for role, count in mix.items():
+        for index in range(count):
+            client = Client(args.url, stats, use_etags=not args.no_etags)
+            sign_up(client, role, run_id, index)
+            clients.append((role, client))
+    setup = {endpoint: list(latencies) for endpoint, latencies in stats.latencies.items()}
+    stats.latencies.clear()
+    stats.recording = False
+
+    for role, client in clients:
+        if role == "donor":
+            for _ in range(args.seed):
+                submit_donation(client)
+
+    deadline = time.perf_counter() + args.duration
+
+    def virtual_user(role, client):
+        loop = 0
+        while time.perf_counter() < deadline:
+            JOURNEYS[role](client, loop)
+            loop += 1
+            if args.think_ms:
+                time.sleep(random.uniform(0.5, 1.5) * args.think_ms / 1000)
+
+    stats.recording = True
+    threads = [threading.Thread(target=virtual_user, args=(role, client), daemon=True) for role, client in clients]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+    stats.recording = False
+
+    endpoints = []
+    for endpoint, latencies in sorted({**stats.latencies, **setup}.items()):
+        latencies = sorted(latencies)
+        timed = endpoint not in setup
+        endpoints.append({
+            "endpoint": endpoint,
+            "requests": len(latencies),
+            "errors": stats.errors.get(endpoint, 0),
+            "not_modified": stats.not_modified.get(endpoint, 0),
+            "per_sec": round(len(latencies) / elapsed, 2) if timed else None,
+            "mean_ms": round(statistics.mean(latencies) * 1000, 1) if latencies else None,
+            "p50_ms": percentile(latencies, 0.50),
+            "p95_ms": percentile(latencies, 0.95),
+            "p99_ms": percentile(latencies, 0.99),
+        })
+
+    return {
+        "meta": {
+            "started_at": datetime.utcnow().isoformat(),
+            "url": args.url,
+            "mix": mix,
+            "duration_s": round(elapsed, 1),
+            "think_ms": args.think_ms,
+            "seed_donations_per_donor": args.seed,
+            "etags": not args.no_etags,
+            "commit": git_commit(),
+            "python": platform.python_version(),
+        },
+        "total_per_sec": round(sum(len(v) for v in stats.latencies.values()) / elapsed, 2),
+        "endpoints": endpoints,
+    }
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=os.path.dirname(os.path.abspath(__file__)), stderr=subprocess.DEVNULL
+        ).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(report, baseline, max_regression):
+    """Print p95 changes against a baseline; returns the regressed endpoints"""
+    before = {e["endpoint"]: e for e in baseline["endpoints"]}
+    regressed = []
+    print(f"\n{'endpoint':<36}{'p95 before':>12}{'p95 now':>10}{'change':>9}")
+    for entry in report["endpoints"]:
+        old = before.get(entry["endpoint"])
+        if not old or not old["p95_ms"] or entry["p95_ms"] is None:
+            continue
+        change = (entry["p95_ms"] - old["p95_ms"]) / old["p95_ms"]
+        flag = "  REGRESSED" if change > max_regression else ""
+        print(f"{entry['endpoint']:<36}{old['p95_ms']:>12}{entry['p95_ms']:>10}{change:>+9.0%}{flag}")
+        if flag:
+            regressed.append(entry["endpoint"])
+    return regressed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", default="http://127.0.0.1:5000")
+    parser.add_argument("--mix", default="donor=5,receiver=20,admin=2", help="virtual users per role")
+    parser.add_argument("--duration", type=float, default=60, help="seconds of timed load")
+    parser.add_argument("--think-ms", type=float, default=0, help="mean pause between journey loops")
+    parser.add_argument("--seed", type=int, default=5, help="donations each donor submits before the run")
+    parser.add_argument("--random-seed", type=int, default=1, help="makes the generated data repeatable")
+    parser.add_argument("--no-etags", action="store_true", help="never send If-None-Match")
+    parser.add_argument("--allow-remote", action="store_true", help="allow a non-local --url")
+    parser.add_argument("--json", help="write the report to this file")
+    parser.add_argument("--compare", help="baseline report to compare p95 against")
+    parser.add_argument("--max-regression", type=float, default=0.2, help="allowed p95 increase (0.2 = 20%%)")
+    args = parser.parse_args()
+    args.url = args.url.rstrip("/")
+
+    if urllib.parse.urlsplit(args.url).hostname not in LOCAL_HOSTS and not args.allow_remote:
+        raise SystemExit("This writes users and donations; use a local server or pass --allow-remote")
+
+    report = run(args)
+
+    print(f"{report['meta']['duration_s']}s, {report['total_per_sec']} req/s, mix {report['meta']['mix']}")
+    print(f"{'endpoint':<36}{'req':>7}{'req/s':>8}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'304':>6}{'err':>6}")
+    for e in report["endpoints"]:
+        print(f"{e['endpoint']:<36}{e['requests']:>7}{e['per_sec']!s:>8}{e['p50_ms']!s:>9}"
+              f"{e['p95_ms']!s:>9}{e['p99_ms']!s:>9}{e['not_modified']:>6}{e['errors']:>6}")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+
+    if args.compare:
+        with open(args.compare) as f:
+            regressed = compare(report, json.load(f), args.max_regression)
+        if regressed:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,127 @@
+"""
+JSON serialization cost of a list endpoint, per 10k rows.
+
+Builds synthetic donation documents shaped like donated_medicine (with
+ObjectId and datetime fields) and times three ways of turning them into
+a response body:
+
+    rows+stdlib     today's path: convert every field in Python
+                    (admin_donation_row), then Flask's default json.dumps
+    rows+provider   the same rows through FastJSONProvider
+    docs+provider   projected documents straight through FastJSONProvider,
+                    which encodes ObjectId/datetime itself
+
+    python benchmarks/json_serialization.py --rows 10000 --repeat 20
+"""
+import argparse
+import json
+import os
+import random
+import statistics
+import sys
+import time
+from datetime import datetime, timedelta
+
+from bson import ObjectId
+from flask import Flask
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from backend.json_provider import FastJSONProvider, orjson  # noqa: E402
+from backend.serializers import admin_donation_row  # noqa: E402
+
+
+CATEGORIES = ["tablet", "syrup", "capsule", "injection", "ointment", "other"]
+STATUSES = ["available", "pending", "approved", "completed", "expired"]
+
+# What a handler returning raw documents would project
+DONATION_FIELDS = [
+    "_id", "medicineName", "manufacturer", "quantity", "expiryDate", "category",
+    "condition", "status", "username", "email", "image", "created_at",
+]
+
+
+def make_donations(count):
+    now = datetime.utcnow()
+    donations = []
+    for i in range(count):
+        created_at = now - timedelta(minutes=random.randint(0, 60 * 24 * 90))
+        donations.append({
+            "_id": ObjectId(),
+            "medicineName": f"Medicine {i % 500}",
+            "manufacturer": f"Manufacturer {i % 40}",
+            "quantity": random.randint(1, 200),
+            "expiryDate": (now + timedelta(days=random.randint(-30, 700))).strftime("%Y-%m-%d"),
+            "category": random.choice(CATEGORIES),
+            "condition": "good",
+            "status": random.choice(STATUSES),
+            "username": f"donor{i % 300}",
+            "email": f"donor{i % 300}@example.com",
+            "image": f"{random.getrandbits(256):064x}.jpg",
+            "created_at": created_at,
+            "updated_at": created_at,
+        })
+    return donations
+
+
+def stdlib_dumps(obj):
+    # Flask's DefaultJSONProvider in production: sorted keys, compact
+    return json.dumps(obj, sort_keys=True, separators=(",", ":"), default=str)
+
+
+def time_it(fn, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        size = fn()
+        timings.append(time.perf_counter() - start)
+    return statistics.median(timings), size
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=10000)
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--json", help="also write the results to this file")
+    args = parser.parse_args()
+
+    provider = FastJSONProvider(Flask(__name__))
+    donations = make_donations(args.rows)
+    projected = [{field: doc[field] for field in DONATION_FIELDS} for doc in donations]
+    now = datetime.utcnow()
+
+    def rows_stdlib():
+        rows = [admin_donation_row(doc, now) for doc in donations]
+        return len(stdlib_dumps({"success": True, "donations": rows}))
+
+    def rows_provider():
+        rows = [admin_donation_row(doc, now) for doc in donations]
+        return len(provider.dumps({"success": True, "donations": rows}))
+
+    def docs_provider():
+        return len(provider.dumps({"success": True, "donations": projected}))
+
+    per_10k = 10000 / args.rows
+    results = []
+    for name, fn in [("rows+stdlib", rows_stdlib), ("rows+provider", rows_provider), ("docs+provider", docs_provider)]:
+        seconds, size = time_it(fn, args.repeat)
+        results.append({
+            "path": name,
+            "ms_per_10k_rows": round(seconds * 1000 * per_10k, 2),
+            "bytes": size,
+        })
+
+    baseline = results[0]["ms_per_10k_rows"]
+    print(f"encoder: {'orjson' if orjson else 'stdlib json'}, {args.rows} rows, median of {args.repeat}")
+    print(f"{'path':<16}{'ms/10k rows':>14}{'speedup':>10}{'KB':>10}")
+    for r in results:
+        r["speedup"] = round(baseline / r["ms_per_10k_rows"], 2) if r["ms_per_10k_rows"] else None
+        print(f"{r['path']:<16}{r['ms_per_10k_rows']:>14}{r['speedup']!s:>10}{r['bytes'] // 1024:>10}")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
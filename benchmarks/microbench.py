@@ -0,0 +1,194 @@
+"""
+Microbenchmarks of the per-row hot loops.
+
+The list endpoints run a transform from backend/serializers.py once per
+document per request. This times each of them, and the JSON encoding of
+their output, at several row counts:
+
+    expiry_info             expiry classification (get_available_medicines)
+    urgency_color           urgency colours (get_all_requests_admin)
+    time_ago / short_time_ago / registration_time_ago
+    available_medicine_row, receiver_request_row, donation_history_row,
+    admin_donation_row, admin_request_row
+    json:stdlib / json:provider
+                            admin_request_row output through Flask's
+                            default encoder and through FastJSONProvider
+
+Input documents come from the dataset generator (generate_dataset.py),
+so value distributions match a seeded database. Each case reports the
+median time per row over --repeat runs, then runs once more under
+tracemalloc for its peak allocation and allocated blocks per row.
+
+Results are appended to --results (one JSON line per case, tagged with
+the git commit and machine), so a refactor can be judged against the
+numbers of an earlier commit on the same machine:
+
+    python benchmarks/microbench.py                         # 1k, 10k, 100k rows
+    python benchmarks/microbench.py --sizes 10000 --filter time_ago
+    python benchmarks/microbench.py --compare 1272a97       # vs. a stored commit
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import sys
+import time
+import tracemalloc
+from datetime import datetime
+
+from flask import Flask
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from backend.json_provider import FastJSONProvider  # noqa: E402
+from backend.serializers import (  # noqa: E402
+    admin_donation_row, admin_request_row, available_medicine_row, donation_history_row,
+    expiry_info, receiver_request_row, registration_time_ago, short_time_ago, time_ago,
+    urgency_color,
+)
+from generate_dataset import DEFAULT_COUNTS, Generator  # noqa: E402
+from journeys import git_commit  # noqa: E402
+
+
+RESULTS_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "results", "microbench.jsonl")
+
+
+def make_documents(rows):
+    now = datetime.utcnow().replace(microsecond=0)
+    generator = Generator({
+        "counts": DEFAULT_COUNTS, "images": 5000, "prescriptions": 2000,
+        "days": 730, "seed": 1, "now": now.isoformat(), "password_hash": b"",
+    })
+    return (
+        generator.documents("donated_medicine", 0, rows),
+        generator.documents("requests_medicine", 0, rows),
+        now,
+    )
+
+
+def build_cases(donations, requests, now):
+    """name -> fn(rows) running the transform over the first rows documents"""
+    provider = FastJSONProvider(Flask(__name__))
+    today = datetime.now()
+
+    def stdlib_dumps(obj):
+        # Flask's DefaultJSONProvider: sorted keys, compact
+        return json.dumps(obj, sort_keys=True, separators=(",", ":"), default=str)
+
+    def request_rows(rows):
+        return {"success": True, "requests": [admin_request_row(req, now) for req in requests[:rows]]}
+
+    return {
+        "expiry_info": lambda rows: [expiry_info(d["expiryDate"], today) for d in donations[:rows]],
+        "urgency_color": lambda rows: [urgency_color(r["urgency"]) for r in requests[:rows]],
+        "time_ago": lambda rows: [time_ago(d["created_at"], now) for d in donations[:rows]],
+        "short_time_ago": lambda rows: [short_time_ago(d["created_at"], now) for d in donations[:rows]],
+        "registration_time_ago": lambda rows: [registration_time_ago(d["created_at"], now) for d in donations[:rows]],
+        "available_medicine_row": lambda rows: [available_medicine_row(d, today) for d in donations[:rows]],
+        "receiver_request_row": lambda rows: [receiver_request_row(r, now) for r in requests[:rows]],
+        "donation_history_row": lambda rows: [donation_history_row(d, now) for d in donations[:rows]],
+        "admin_donation_row": lambda rows: [admin_donation_row(d, now) for d in donations[:rows]],
+        "admin_request_row": lambda rows: [admin_request_row(r, now) for r in requests[:rows]],
+        "json:stdlib": lambda rows: stdlib_dumps(request_rows(rows)),
+        "json:provider": lambda rows: provider.dumps(request_rows(rows)),
+    }
+
+
+def measure(fn, rows, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn(rows)
+        timings.append(time.perf_counter() - start)
+
+    # Separate run: tracemalloc slows allocation down several times
+    tracemalloc.start()
+    try:
+        before = tracemalloc.take_snapshot()
+        tracemalloc.reset_peak()
+        result = fn(rows)
+        peak = tracemalloc.get_traced_memory()[1]
+        blocks = sum(stat.count_diff for stat in tracemalloc.take_snapshot().compare_to(before, "filename")
+                     if stat.count_diff > 0)
+        del result
+    finally:
+        tracemalloc.stop()
+
+    median = statistics.median(timings)
+    return {
+        "rows": rows,
+        "ns_per_row": round(median * 1e9 / rows, 1),
+        "ms_total": round(median * 1000, 2),
+        "peak_kb": round(peak / 1024, 1),
+        "bytes_per_row": round(peak / rows, 1),
+        "blocks_per_row": round(blocks / rows, 2),
+    }
+
+
+def load_results(path, commit):
+    """Latest stored result per (case, rows) for a commit prefix"""
+    results = {}
+    if not os.path.exists(path):
+        return results
+    with open(path) as f:
+        for line in f:
+            entry = json.loads(line)
+            if entry.get("commit") and entry["commit"].startswith(commit) and entry["machine"] == platform.node():
+                results[(entry["case"], entry["rows"])] = entry
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", default="1000,10000,100000", help="row counts, comma separated")
+    parser.add_argument("--repeat", type=int, default=5, help="timed runs per case (median)")
+    parser.add_argument("--filter", help="only cases whose name contains this")
+    parser.add_argument("--results", default=RESULTS_FILE, help="JSON lines file results are appended to")
+    parser.add_argument("--no-store", action="store_true", help="do not append to --results")
+    parser.add_argument("--compare", help="commit (prefix) whose stored results to compare against")
+    args = parser.parse_args()
+
+    sizes = [int(size) for size in args.sizes.split(",")]
+    donations, requests, now = make_documents(max(sizes))
+    cases = {name: fn for name, fn in build_cases(donations, requests, now).items()
+             if not args.filter or args.filter in name}
+
+    commit = git_commit()
+    baseline = load_results(args.results, args.compare) if args.compare else {}
+    run = {
+        "commit": commit,
+        "at": datetime.utcnow().isoformat(timespec="seconds"),
+        "machine": platform.node(),
+        "python": platform.python_version(),
+    }
+
+    print(f"commit {commit}, python {run['python']}, median of {args.repeat}")
+    print(f"{'case':<24}{'rows':>8}{'ns/row':>10}{'ms':>10}{'peak KB':>10}{'B/row':>8}{'blk/row':>9}"
+          + (f"{'vs ' + args.compare[:7]:>12}" if args.compare else ""))
+
+    entries = []
+    for name, fn in cases.items():
+        for rows in sizes:
+            entry = {**run, "case": name, **measure(fn, rows, args.repeat)}
+            entries.append(entry)
+
+            line = (f"{name:<24}{rows:>8}{entry['ns_per_row']:>10}{entry['ms_total']:>10}"
+                    f"{entry['peak_kb']:>10}{entry['bytes_per_row']:>8}{entry['blocks_per_row']:>9}")
+            old = baseline.get((name, rows))
+            if old:
+                line += f"{(entry['ns_per_row'] - old['ns_per_row']) / old['ns_per_row']:>+12.1%}"
+            print(line)
+
+    if args.compare and not baseline:
+        print(f"no stored results for {args.compare} on {run['machine']} in {args.results}")
+
+    if not args.no_store:
+        os.makedirs(os.path.dirname(args.results), exist_ok=True)
+        with open(args.results, "a") as f:
+            for entry in entries:
+                f.write(json.dumps(entry) + "\n")
+
+
+if __name__ == "__main__":
+    main()
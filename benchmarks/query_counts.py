@@ -0,0 +1,139 @@
+"""
+Query count regression check for the list and stats endpoints.
+
+Runs each GET endpoint below through Flask's test client against a
+scratch database on a local mongod, seeded with N documents per
+collection (dataset generator shapes), for each N in --sizes. The
+number of Mongo commands a request issues is read from its
+Server-Timing header (backend/telemetry.py). It must not grow with N:
+an endpoint whose count rises by more than --slack between the
+smallest and largest N is reported as an N+1 and the script exits 1,
+so CI fails.
+
+Sizes stay under the default cursor batch (101 documents), so a large
+find() does not add getMore round trips that are not N+1 queries.
+
+    mongod --dbpath /tmp/qc-db --port 27017 &
+    python benchmarks/query_counts.py
+    python benchmarks/query_counts.py --sizes 5,40,90 --json query_counts.json
+
+The scratch database (--db) is dropped afterwards unless --keep is
+given. MONGO_URI, MONGO_DB and MONGO_TLS are set before the app is
+imported, so the .env settings are never used.
+"""
+import argparse
+import json
+import os
+import re
+import sys
+from datetime import datetime
+
+
+# (role, path) of every endpoint checked; role picks the session user
+ENDPOINTS = [
+    ("donor", "/donor/dashboard"),
+    ("donor", "/get_donor_stats"),
+    ("donor", "/get_all_donations"),
+    ("donor", "/get_recent_activity"),
+    ("receiver", "/receiver/dashboard"),
+    ("receiver", "/get_available_medicines"),
+    ("receiver", "/get_receiver_stats"),
+    ("receiver", "/get_receiver_requests"),
+    ("receiver", "/get_medicines?keyword=para"),
+    ("admin", "/admin/dashboard"),
+    ("admin", "/get_admin_stats"),
+    ("admin", "/get_all_users"),
+    ("admin", "/get_all_donations_admin"),
+    ("admin", "/get_all_requests_admin"),
+    ("admin", "/get_recent_activity_admin"),
+    ("admin", "/get_user_details?user_id={donor_id}&user_type=donor"),
+    ("admin", "/get_user_details?user_id={receiver_id}&user_type=receiver"),
+]
+SEEDED_COLLECTIONS = ["donar", "receiver", "admin", "donated_medicine", "requests_medicine"]
+QUERIES = re.compile(r'desc="(\d+) queries"')
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--uri", default="mongodb://127.0.0.1:27017")
+    parser.add_argument("--db", default="query_count_check")
+    parser.add_argument("--sizes", default="5,50", help="documents per collection, comma separated")
+    parser.add_argument("--slack", type=int, default=0, help="allowed growth in commands between sizes")
+    parser.add_argument("--filter", help="only endpoints whose path contains this")
+    parser.add_argument("--keep", action="store_true", help="keep the scratch database")
+    parser.add_argument("--json", help="write the counts to this file")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    if args.db == "med_system":
+        raise SystemExit("--db is dropped and reseeded; use a scratch database")
+
+    # Before the app (and its load_dotenv) is imported
+    os.environ.update({"MONGO_URI": args.uri, "MONGO_DB": args.db, "MONGO_TLS": "false"})
+    root = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+    sys.path.insert(0, root)
+
+    import app as application
+    from generate_dataset import Generator
+
+    flask_app, db = application.app, application.db
+    sizes = sorted(int(size) for size in args.sizes.split(","))
+    endpoints = [(role, path) for role, path in ENDPOINTS if not args.filter or args.filter in path]
+    counts = {path: {} for _, path in endpoints}
+    failures = {}
+
+    try:
+        for size in sizes:
+            generator = Generator({
+                "counts": dict.fromkeys(SEEDED_COLLECTIONS, size), "images": 10, "prescriptions": 10,
+                "days": 90, "seed": 1, "now": datetime.utcnow().replace(microsecond=0).isoformat(),
+                "password_hash": b"",
+            })
+            for collection in SEEDED_COLLECTIONS:
+                db[collection].delete_many({})
+                db[collection].insert_many(generator.documents(collection, 0, size))
+
+            users = {role: generator.user(collection, 0)
+                     for collection, role in [("donar", "donor"), ("receiver", "receiver"), ("admin", "admin")]}
+            ids = {"donor_id": users["donor"]["_id"], "receiver_id": users["receiver"]["_id"]}
+
+            for role, path in endpoints:
+                client = flask_app.test_client()
+                with client.session_transaction() as session:
+                    user = users[role]
+                    session["user"] = {"_id": str(user["_id"]), "username": user["username"],
+                                       "email": user["email"], "user_type": role, "profile_image": None}
+                response = client.get(path.format(**ids))
+                match = QUERIES.search(response.headers.get("Server-Timing", ""))
+                if response.status_code != 200 or not match:
+                    failures[path] = f"HTTP {response.status_code} with {size} documents"
+                    continue
+                counts[path][size] = int(match.group(1))
+    finally:
+        if not args.keep:
+            application.client.drop_database(args.db)
+
+    report = []
+    print(f"{'endpoint':<60}" + "".join(f"{'N=' + str(size):>8}" for size in sizes))
+    for _, path in endpoints:
+        by_size = counts[path]
+        growth = by_size[sizes[-1]] - by_size[sizes[0]] if len(by_size) == len(sizes) else None
+        if growth is not None and growth > args.slack:
+            failures[path] = f"{by_size[sizes[0]]} -> {by_size[sizes[-1]]} commands, grows with N"
+        report.append({"endpoint": path, "commands": by_size, "failure": failures.get(path)})
+        print(f"{path:<60}" + "".join(f"{by_size.get(size, '-')!s:>8}" for size in sizes)
+              + (f"  FAIL: {failures[path]}" if path in failures else ""))
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"sizes": sizes, "slack": args.slack, "endpoints": report}, f, indent=2)
+
+    if failures:
+        print(f"\n{len(failures)} endpoint(s) failed")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
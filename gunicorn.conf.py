@@ -0,0 +1,16 @@
+# gunicorn -c gunicorn.conf.py app:app
+#
+# With several workers, set PROMETHEUS_MULTIPROC_DIR to an empty
+# directory (cleared on every start) so /metrics adds up all of them.
+import os
+
+from backend.metrics import mark_process_dead
+
+bind = os.getenv("BIND", "0.0.0.0:5000")
+workers = int(os.getenv("WEB_CONCURRENCY", "2"))
+worker_class = "gthread"
+threads = int(os.getenv("GUNICORN_THREADS", "8"))
+
+
+def child_exit(server, worker):
+    mark_process_dead(worker.pid)